@@ -1,3 +1,20 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import SlowQuery
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Requêtes SQL lentes relevées par api/slowqueries.py (lecture seule)"""
+    list_display = ['created_at', 'endpoint', 'method', 'database', 'duration_ms', 'user']
+    list_filter = ['database', 'method', 'created_at']
+    search_fields = ['endpoint', 'path', 'sql']
+    date_hierarchy = 'created_at'
+    list_select_related = ['user']
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,393 @@
+"""
+Archivage à froid des ventes anciennes.
+
+Les mois clos depuis plus de SALES_ARCHIVE_AFTER_MONTHS sont sortis des tables
+chaudes (Sale / SaleItem) vers un fichier par mois dans SALES_ARCHIVE_DIR:
+JSON en colonnes (une liste de valeurs par champ) compressé en gzip, ce qui se
+compresse bien et ne demande aucune dépendance supplémentaire.
+
+Le manifeste (manifest.json) liste les mois archivés avec leur empreinte et
+leurs totaux par pharmacie: les rapports sur des mois entiers n'ouvrent pas les
+fichiers, seuls les mois partiellement couverts par une période sont relus.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import partitions
+from .models import Sale, SaleItem
+
+try:
+    import fcntl
+except ImportError:
+    # Windows (développement): verrou limité au processus
+    fcntl = None
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+SALE_COLUMNS = (
+    'id', 'sale_number', 'branch_id', 'client_id', 'total_amount',
+    'payment_method', 'notes', 'sold_by_id', 'created_at',
+)
+ITEM_COLUMNS = (
+    'id', 'sale_id', 'medicine_id', 'medicine__name', 'quantity',
+    'unit_price', 'total_price', 'created_at',
+)
+
+
+class ArchiveError(Exception):
+    """Erreur d'archivage (mois non clos, fichier corrompu...)"""
+
+
+def archive_dir():
+    return Path(settings.SALES_ARCHIVE_DIR)
+
+
+def month_key(month):
+    return f'{month.year:04d}-{month.month:02d}'
+
+
+def parse_month(value):
+    """'AAAA-MM' -> date du premier jour du mois"""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        return date(year, month, 1)
+    except ValueError:
+        raise ArchiveError(f'Mois invalide: {value} (format AAAA-MM attendu)')
+
+
+def month_bounds(month):
+    """[début, fin) du mois en heure locale"""
+    return (
+        timezone.make_aware(datetime(month.year, month.month, 1)),
+        timezone.make_aware(datetime.combine(partitions.add_months(month, 1), datetime.min.time())),
+    )
+
+
+def archive_limit(today=None):
+    """Premier mois encore conservé en base"""
+    today = today or timezone.localdate()
+    return partitions.add_months(today, -settings.SALES_ARCHIVE_AFTER_MONTHS)
+
+
+def load_manifest():
+    path = archive_dir() / MANIFEST
+    if not path.exists():
+        return {'version': FORMAT_VERSION, 'months': {}}
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def _write_atomic(path, data):
+    """Écrit dans un fichier temporaire puis renomme: jamais de fichier à moitié écrit"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as handle:
+        handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp, path)
+
+
+_manifest_lock = threading.Lock()
+
+
+@contextmanager
+def manifest_lock():
+    """
+    Verrou exclusif sur le manifeste, entre threads et entre processus (flock
+    sur un fichier voisin): deux archivages ne lisent-modifient-écrivent
+    jamais le manifeste en même temps.
+    """
+    archive_dir().mkdir(parents=True, exist_ok=True)
+    with _manifest_lock, open(archive_dir() / f'{MANIFEST}.lock', 'a') as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def save_manifest(manifest):
+    archive_dir().mkdir(parents=True, exist_ok=True)
+    _write_atomic(archive_dir() / MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+
+def archived_months():
+    return sorted(load_manifest()['months'])
+
+
+def hot_data_start():
+    """Début des données encore en base: lendemain du dernier mois archivé (None sans archive)"""
+    months = archived_months()
+    if not months:
+        return None
+    return month_bounds(parse_month(months[-1]))[1]
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _columns(queryset, columns):
+    """Lit un queryset en colonnes {champ: [valeurs]} par lots"""
+    data = {column: [] for column in columns}
+    for row in queryset.order_by('id').values_list(*columns).iterator(chunk_size=2000):
+        for column, value in zip(columns, row):
+            data[column].append(_encode(value))
+    return data
+
+
+def _branch_key(branch_id):
+    return '' if branch_id is None else str(branch_id)
+
+
+def _month_totals(start, end):
+    """Totaux du mois par pharmacie, calculés en base avant archivage"""
+    totals = {}
+    sales = (
+        Sale.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values('branch_id').annotate(count=Count('id'), revenue=Sum('total_amount'))
+    )
+    for row in sales:
+        totals[_branch_key(row['branch_id'])] = {
+            'count': row['count'], 'revenue': str(row['revenue'] or 0), 'quantity': 0,
+        }
+    items = (
+        SaleItem.objects.filter(created_at__gte=start, created_at__lt=end)
+        .values('branch_id').annotate(quantity=Sum('quantity'))
+    )
+    for row in items:
+        key = _branch_key(row['branch_id'])
+        totals.setdefault(key, {'count': 0, 'revenue': '0', 'quantity': 0})['quantity'] = row['quantity'] or 0
+    return totals
+
+
+def _purge_month(month, start, end):
+    """
+    Supprime le mois des tables chaudes: sur PostgreSQL partitionné, la
+    partition du mois est détachée puis supprimée (opération de catalogue);
+    les lignes restantes (partition par défaut, SQLite) le sont par plage.
+    """
+    with connection.cursor() as cursor:
+        if partitions.is_supported():
+            for table in reversed(partitions.PARTITIONED_TABLES):
+                name = partitions.partition_name(table, month)
+                if partitions.is_partitioned(cursor, table) and name in partitions.list_partitions(cursor, table):
+                    cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                    cursor.execute(f'DROP TABLE "{name}"')
+        for model in (SaleItem, Sale):
+            cursor.execute(
+                f'DELETE FROM "{model._meta.db_table}" WHERE "created_at" >= %s AND "created_at" < %s',
+                [start, end],
+            )
+
+
+def archive_month(month, purge=True):
+    """
+    Archive un mois clos: écrit le fichier, le relit pour vérification,
+    retire le mois des tables chaudes puis, une fois la purge validée,
+    l'inscrit au manifeste. Le tout sous manifest_lock(): le manifeste est
+    relu sous le verrou, un second archivage du même mois échoue proprement.
+    Retourne l'entrée du manifeste.
+    """
+    month = partitions.month_start(month)
+    if month >= archive_limit():
+        raise ArchiveError(f'{month_key(month)} est dans la période de conservation en base.')
+    key = month_key(month)
+
+    start, end = month_bounds(month)
+    with manifest_lock():
+        manifest = load_manifest()
+        if key in manifest['months']:
+            raise ArchiveError(f'{key} est déjà archivé.')
+
+        with transaction.atomic():
+            # Verrouille le mois le temps de l'export et de la purge
+            list(Sale.objects.select_for_update().filter(created_at__gte=start, created_at__lt=end).values_list('id'))
+            payload = {
+                'version': FORMAT_VERSION,
+                'month': key,
+                'sales': _columns(Sale.objects.filter(created_at__gte=start, created_at__lt=end), SALE_COLUMNS),
+                'items': _columns(
+                    SaleItem.objects.filter(created_at__gte=start, created_at__lt=end), ITEM_COLUMNS
+                ),
+            }
+            sales_count, items_count = len(payload['sales']['id']), len(payload['items']['id'])
+            entry = {
+                'file': f'sales_{key.replace("-", "_")}.json.gz',
+                'sales': sales_count,
+                'items': items_count,
+                'totals': _month_totals(start, end),
+                'archived_at': timezone.now().isoformat(),
+            }
+
+            data = gzip.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), compresslevel=9)
+            entry['sha256'] = hashlib.sha256(data).hexdigest()
+            entry['size'] = len(data)
+            path = archive_dir() / entry['file']
+            _write_atomic(path, data)
+
+            check = read_month(month, entry)
+            if len(check['sales']['id']) != sales_count or len(check['items']['id']) != items_count:
+                raise ArchiveError(f'Vérification du fichier {entry["file"]} échouée.')
+
+            if purge:
+                _purge_month(month, start, end)
+
+        # Après la validation: un mois annulé avec la transaction n'est jamais compté deux fois
+        manifest['months'][key] = entry
+        save_manifest(manifest)
+    return entry
+
+
+def read_month(month, entry=None):
+    """Contenu en colonnes d'un mois archivé (empreinte vérifiée)"""
+    key = month_key(month)
+    entry = entry or load_manifest()['months'].get(key)
+    if entry is None:
+        raise ArchiveError(f'{key} n\'est pas archivé.')
+    with open(archive_dir() / entry['file'], 'rb') as handle:
+        data = handle.read()
+    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+        raise ArchiveError(f'Empreinte invalide pour {entry["file"]}.')
+    return json.loads(gzip.decompress(data))
+
+
+def _rows(columns):
+    names = list(columns)
+    return (dict(zip(names, values)) for values in zip(*columns.values()))
+
+
+def _months_between(start, end):
+    """Clés des mois touchés par [start, end); None = non borné"""
+    return lambda key: (
+        (start is None or key >= month_key(timezone.localtime(start).date()))
+        and (end is None or key <= month_key(timezone.localtime(end - timedelta(microseconds=1)).date()))
+    )
+
+
+def _in_period(moment, start, end):
+    return (start is None or moment >= start) and (end is None or moment < end)
+
+
+def _covers(month, start, end):
+    month_first, month_end = month_bounds(month)
+    return (start is None or start <= month_first) and (end is None or end >= month_end)
+
+
+def _hot_sales(branch_id=None, start=None, end=None):
+    """Querysets (ventes, lignes) des tables chaudes sur [start, end)"""
+    sales = Sale.objects.all()
+    items = SaleItem.objects.all()
+    if branch_id is not None:
+        sales = sales.filter(branch_id=branch_id)
+        items = items.filter(branch_id=branch_id)
+    if start is not None:
+        sales, items = sales.filter(created_at__gte=start), items.filter(created_at__gte=start)
+    if end is not None:
+        sales, items = sales.filter(created_at__lt=end), items.filter(created_at__lt=end)
+    return sales, items
+
+
+def _add_archived(summary, branch_id=None, start=None, end=None):
+    """Ajoute à `summary` les ventes archivées de [start, end)"""
+    touched = _months_between(start, end)
+    for key, entry in load_manifest()['months'].items():
+        if not touched(key):
+            continue
+        month = parse_month(key)
+        if _covers(month, start, end):
+            # Mois entier: totaux du manifeste, sans ouvrir le fichier
+            for branch_key, totals in entry['totals'].items():
+                if branch_id is None or branch_key == _branch_key(branch_id):
+                    summary['count'] += totals['count']
+                    summary['revenue'] += Decimal(totals['revenue'])
+                    summary['quantity'] += totals['quantity']
+            continue
+        data = read_month(month, entry)
+        sale_ids = set()
+        for sale in _rows(data['sales']):
+            if (branch_id is None or sale['branch_id'] == branch_id) and \
+                    _in_period(datetime.fromisoformat(sale['created_at']), start, end):
+                sale_ids.add(sale['id'])
+                summary['count'] += 1
+                summary['revenue'] += Decimal(sale['total_amount'])
+        summary['quantity'] += sum(item['quantity'] for item in _rows(data['items']) if item['sale_id'] in sale_ids)
+    return summary
+
+
+def sales_summary(branch_id=None, start=None, end=None):
+    """
+    Nombre de ventes, chiffre d'affaires et quantité vendue sur [start, end),
+    tables chaudes et archives confondues. branch_id=None: toutes pharmacies.
+    """
+    sales, items = _hot_sales(branch_id, start, end)
+    hot = sales.aggregate(count=Count('id'), revenue=Sum('total_amount'))
+    summary = {
+        'count': hot['count'],
+        'revenue': hot['revenue'] or Decimal('0'),
+        'quantity': items.aggregate(quantity=Sum('quantity'))['quantity'] or 0,
+    }
+    return _add_archived(summary, branch_id, start, end)
+
+
+async def asales_summary(branch_id=None, start=None, end=None):
+    """
+    Variante asynchrone de sales_summary (ORM asynchrone); la lecture des
+    archives, faite de fichiers, ne passe par un thread que s'il y en a.
+    """
+    sales, items = _hot_sales(branch_id, start, end)
+    hot = await sales.aaggregate(count=Count('id'), revenue=Sum('total_amount'))
+    quantity = (await items.aaggregate(quantity=Sum('quantity')))['quantity']
+    summary = {
+        'count': hot['count'],
+        'revenue': hot['revenue'] or Decimal('0'),
+        'quantity': quantity or 0,
+    }
+    if not (archive_dir() / MANIFEST).exists():
+        return summary
+    return await sync_to_async(_add_archived, thread_sensitive=False)(summary, branch_id, start, end)
+
+
+def iter_sales(branch_id=None, start=None, end=None):
+    """
+    Ventes de [start, end) par ordre chronologique, archives puis tables
+    chaudes, sous forme de dictionnaires (champs de SALE_COLUMNS).
+    """
+    touched = _months_between(start, end)
+    for key, entry in sorted(load_manifest()['months'].items()):
+        if not touched(key):
+            continue
+        for sale in _rows(read_month(parse_month(key), entry)['sales']):
+            if (branch_id is None or sale['branch_id'] == branch_id) and \
+                    _in_period(datetime.fromisoformat(sale['created_at']), start, end):
+                yield sale
+
+    sales = Sale.objects.all()
+    if branch_id is not None:
+        sales = sales.filter(branch_id=branch_id)
+    if start is not None:
+        sales = sales.filter(created_at__gte=start)
+    if end is not None:
+        sales = sales.filter(created_at__lt=end)
+    for row in sales.order_by('created_at').values_list(*SALE_COLUMNS).iterator(chunk_size=2000):
+        yield {column: _encode(value) for column, value in zip(SALE_COLUMNS, row)}
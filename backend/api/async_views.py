@@ -0,0 +1,324 @@
+"""
+Vues asynchrones des lectures les plus sollicitées (déploiement ASGI).
+
+Sous un serveur ASGI (uvicorn, daphne: `uvicorn config.asgi:application`),
+une vue DRF synchrone occupe un thread pendant toute la requête, y compris
+pendant l'envoi de la réponse à un client lent. Ces vues Django natives
+(async def) utilisent l'ORM asynchrone: la requête n'occupe un thread que le
+temps de ses requêtes SQL, l'attente réseau reste sur la boucle d'événements.
+
+Elles reprennent le comportement des actions DRF équivalentes (filtres,
+recherche, tri, pagination, cloisonnement par pharmacie, lectures sur le
+réplica, authentification JWT) avec une représentation allégée des
+médicaments, construite depuis .values() sans serializer:
+
+    /api/async/medicines/                  liste (search, ordering, page, filtres)
+    /api/async/medicines/<id>/             fiche
+    /api/async/medicines/code/<code>/      recherche par code médicament
+    /api/async/medicines/alerts/           stock faible, expiration proche, expirés
+    /api/async/sales/stats/                statistiques des ventes
+    /api/events/stream/                    événements en direct (SSE, api/events.py)
+"""
+import asyncio
+import re
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import models
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from config import db_router
+from users.authentication import CachedJWTAuthentication
+
+from . import events
+from .archive import asales_summary
+from .branches import user_branch_id, with_branch_stock
+from .models import Medicine, Sale
+from .views import day_bounds, parse_period
+
+MEDICINE_FIELDS = (
+    'id', 'name', 'medicine_id', 'group', 'group__name', 'supplier', 'supplier__name',
+    'stock_quantity', 'min_stock_alert', 'composition', 'manufacturer', 'consumption_type',
+    'expiration_date', 'pharmaceutical_form', 'purchase_price', 'selling_price',
+    'image', 'image_thumbnail', 'updated_at',
+)
+SEARCH_FIELDS = ('name', 'medicine_id', 'manufacturer', 'composition')
+FILTER_FIELDS = ('group', 'supplier', 'consumption_type', 'pharmaceutical_form')
+ORDERING_FIELDS = ('name', 'expiration_date', 'stock_quantity', 'selling_price', 'created_at')
+DEFAULT_ORDERING = ('name',)
+
+_SEARCH_TERMS = re.compile(r'[\s,]+')
+
+
+def json_response(data, status=200):
+    """JsonResponse avec l'encodeur de DRF (mêmes dates et nombres que les vues DRF)"""
+    return JsonResponse(data, status=status, encoder=JSONEncoder)
+
+
+def jwt_required(view):
+    """
+    Authentifie la requête par JWT (comme les vues DRF) et route ses lectures
+    vers le réplica; 401 au format DRF sinon.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        authentication = CachedJWTAuthentication()
+        try:
+            authenticated = await authentication.aauthenticate(request)
+        except APIException as exc:
+            return json_response({'detail': exc.detail}, status=exc.status_code)
+        if authenticated is None:
+            response = json_response(
+                {'detail': "Informations d'authentification non fournies."}, status=401
+            )
+            response['WWW-Authenticate'] = authentication.authenticate_header(request)
+            return response
+        request.user = authenticated[0]
+        with db_router.routing_context():
+            db_router.bind_user(request.user)
+            await db_router.ause_replica()
+            try:
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                # Compte sans pharmacie ni accès central (api/branches.py)
+                return json_response({'detail': exc.detail}, status=exc.status_code)
+    return require_safe(wrapper)
+
+
+def medicine_queryset(user):
+    queryset = Medicine.objects.all()
+    branch_id = user_branch_id(user)
+    if branch_id is not None:
+        queryset = with_branch_stock(queryset, branch_id)
+        return queryset.values(*MEDICINE_FIELDS, 'branch_stock_quantity', 'branch_min_stock_alert')
+    return queryset.values(*MEDICINE_FIELDS)
+
+
+def file_url(request, field_name, name):
+    if not name:
+        return None
+    return request.build_absolute_uri(Medicine._meta.get_field(field_name).storage.url(name))
+
+
+def is_low_stock(row):
+    """Comme Medicine.is_low_stock: stock de la pharmacie de l'utilisateur s'il est présent"""
+    if row.get('branch_stock_quantity') is not None:
+        return row['branch_stock_quantity'] <= row['branch_min_stock_alert']
+    return row['stock_quantity'] <= row['min_stock_alert']
+
+
+def medicine_data(request, row):
+    """Représentation d'un médicament (champs principaux de MedicineSerializer)"""
+    purchase, selling = row['purchase_price'], row['selling_price']
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'medicine_id': row['medicine_id'],
+        'group': row['group'],
+        'group_name': row['group__name'],
+        'supplier': row['supplier'],
+        'supplier_name': row['supplier__name'],
+        'stock_quantity': row['stock_quantity'],
+        'branch_stock_quantity': row.get('branch_stock_quantity'),
+        'min_stock_alert': row['min_stock_alert'],
+        'is_low_stock': is_low_stock(row),
+        'composition': row['composition'],
+        'manufacturer': row['manufacturer'],
+        'consumption_type': row['consumption_type'],
+        'expiration_date': row['expiration_date'],
+        'pharmaceutical_form': row['pharmaceutical_form'],
+        'purchase_price': str(purchase),
+        'selling_price': str(selling),
+        'profit_margin': (selling - purchase) / purchase * 100 if purchase > 0 else 0,
+        'image': file_url(request, 'image', row['image']),
+        'image_thumbnail': file_url(request, 'image_thumbnail', row['image_thumbnail']),
+        'updated_at': row['updated_at'],
+    }
+
+
+async def medicine_rows(request, queryset):
+    return [medicine_data(request, row) async for row in queryset]
+
+
+def search(queryset, params):
+    """Équivalent de SearchFilter: chaque terme doit apparaître dans l'un des champs"""
+    for term in _SEARCH_TERMS.split(params.get('search', '').strip()):
+        if term:
+            condition = models.Q()
+            for field in SEARCH_FIELDS:
+                condition |= models.Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+    return queryset
+
+
+def ordering(params):
+    """Équivalent de OrderingFilter: champs autorisés seulement, tri par défaut sinon"""
+    fields = [
+        field.strip() for field in params.get('ordering', '').split(',')
+        if field.strip().lstrip('-') in ORDERING_FIELDS
+    ]
+    return fields or list(DEFAULT_ORDERING)
+
+
+@jwt_required
+async def medicine_list(request):
+    """Liste paginée des médicaments (mêmes paramètres que /api/medicines/)"""
+    params = request.GET
+    queryset = search(medicine_queryset(request.user), params)
+    filters = {field: params[field] for field in FILTER_FIELDS if params.get(field)}
+    try:
+        queryset = queryset.filter(**filters).order_by(*ordering(params), 'pk')
+        count = await queryset.acount()
+    except (ValueError, TypeError):
+        return json_response({'error': 'Filtre invalide'}, status=400)
+
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        page = int(params.get('page', 1))
+    except ValueError:
+        page = 0
+    last_page = max(1, -(-count // page_size))
+    if not 1 <= page <= last_page:
+        return json_response({'detail': 'Page non valide.'}, status=404)
+
+    offset = (page - 1) * page_size
+    url = request.build_absolute_uri()
+    previous = None
+    if page > 1:
+        previous = replace_query_param(url, 'page', page - 1) if page > 2 else remove_query_param(url, 'page')
+    return json_response({
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if page < last_page else None,
+        'previous': previous,
+        'results': await medicine_rows(request, queryset[offset:offset + page_size]),
+    })
+
+
+async def medicine_response(request, **lookup):
+    row = await medicine_queryset(request.user).filter(**lookup).afirst()
+    if row is None:
+        return json_response({'detail': 'Pas trouvé.'}, status=404)
+    return json_response(medicine_data(request, row))
+
+
+@jwt_required
+async def medicine_detail(request, pk):
+    """Fiche d'un médicament"""
+    return await medicine_response(request, pk=pk)
+
+
+@jwt_required
+async def medicine_by_code(request, medicine_id):
+    """Médicament par son code (lecture de code-barres en caisse)"""
+    return await medicine_response(request, medicine_id=medicine_id)
+
+
+@jwt_required
+async def medicine_alerts(request):
+    """Stock faible, expiration dans les 30 jours et produits expirés, en une réponse"""
+    queryset = medicine_queryset(request.user).order_by('name')
+    if user_branch_id(request.user) is not None:
+        low_stock = queryset.filter(branch_stock_quantity__lte=models.F('branch_min_stock_alert'))
+    else:
+        low_stock = queryset.filter(stock_quantity__lte=models.F('min_stock_alert'))
+    today = timezone.now().date()
+    return json_response({
+        'low_stock': await medicine_rows(request, low_stock),
+        'expiring_soon': await medicine_rows(
+            request, queryset.filter(expiration_date__gte=today, expiration_date__lte=today + timedelta(days=30))
+        ),
+        'expired': await medicine_rows(request, queryset.filter(expiration_date__lt=today)),
+    })
+
+
+@jwt_required
+async def sale_stats(request):
+    """Statistiques des ventes (même réponse que /api/sales/stats/)"""
+    try:
+        period_start, period_end = parse_period(request.GET)
+    except ValueError:
+        return json_response({'error': 'Date invalide (format AAAA-MM-JJ)'}, status=400)
+
+    branch_id = user_branch_id(request.user)
+    start, end = day_bounds(timezone.localdate())
+    today_sales = Sale.objects.filter(created_at__gte=start, created_at__lt=end)
+    if branch_id is not None:
+        today_sales = today_sales.filter(branch_id=branch_id)
+    today = await today_sales.aaggregate(count=models.Count('id'), total=models.Sum('total_amount'))
+    summary = await asales_summary(branch_id, period_start, period_end)
+
+    return json_response({
+        'today': {
+            'count': today['count'],
+            'total': today['total'] or 0,
+        },
+        'total': {
+            'count': summary['count'],
+            'total': summary['revenue'],
+            'quantity': summary['quantity'],
+        },
+    })
+
+
+def query_token(view):
+    """
+    Accepte le jeton d'accès en paramètre ?token=: EventSource ne permet pas
+    d'envoyer l'en-tête Authorization.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        token = request.GET.get('token')
+        if token and 'HTTP_AUTHORIZATION' not in request.META:
+            request.META['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def event_frames(request, subscription):
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        last_event_id = request.headers.get('Last-Event-ID')
+        # Publiés entre l'abonnement et la relecture: déjà dans la file, à ne pas envoyer deux fois
+        replayed = set()
+        if last_event_id:
+            missed = events.broker.missed(last_event_id, subscription)
+            if missed is None:
+                yield 'event: reset\ndata: {}\n\n'
+            else:
+                for event in missed:
+                    replayed.add(event['id'])
+                    yield events.encode(event)
+        while True:
+            try:
+                event = await subscription.get(settings.EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Commentaire SSE: garde la connexion ouverte à travers les proxys
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            if replayed and event['id'] in replayed:
+                replayed.discard(event['id'])
+                continue
+            yield events.encode(event)
+    finally:
+        events.broker.unsubscribe(subscription)
+
+
+@query_token
+@jwt_required
+async def event_stream(request):
+    """Flux SSE des ventes et mouvements de stock de la pharmacie de l'utilisateur"""
+    subscription = events.broker.subscribe(user_branch_id(request.user), settings.EVENTS_QUEUE_SIZE)
+    response = StreamingHttpResponse(event_frames(request, subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Pas de mise en mémoire tampon par nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
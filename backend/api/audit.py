@@ -0,0 +1,327 @@
+"""
+Journal d'audit des médicaments, fournisseurs, clients et utilisateurs.
+
+Chaque création, modification ou suppression faite par save()/delete() donne
+une entrée AuditEntry avec les seuls champs modifiés ({champ: [avant, après]},
+mots de passe masqués), l'auteur (utilisateur de la requête HTTP en cours,
+fourni par AuditMiddleware) et la date. Les anciennes valeurs sont relues par
+une requête sur la clé primaire, limitée aux champs de update_fields.
+
+Rien n'est écrit pendant la requête: les entrées rejoignent un tampon du
+processus à la validation de la transaction (une écriture annulée n'est pas
+journalisée), puis un thread les insère par lots de AUDIT_BATCH_SIZE toutes
+les AUDIT_FLUSH_SECONDS secondes (bulk_create). Le reste du tampon est écrit à
+l'arrêt du processus; un arrêt brutal perd au plus les dernières secondes.
+
+Les mises à jour ensemblistes du catalogue (api/bulk_update.py) et l'import
+(api/catalog_import.py) sont journalisés ligne à ligne par record_update()
+et record_bulk(). Ces entrées, potentiellement des dizaines de milliers,
+ne passent pas par le tampon (borné à AUDIT_MAX_PENDING): elles sont écrites
+par lots dès la validation, dans le fil de la requête. Le stock, modifié en
+SQL ensembliste, a son propre historique (StockMovement).
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, close_old_connections, router, transaction
+from django.db.models.fields.files import FieldFile, FileField
+from django.utils import timezone
+
+from .models import AuditEntry
+
+logger = logging.getLogger('api.audit')
+
+# Champs jamais journalisés, en plus des champs non modifiables (dates automatiques, variantes d'images...)
+IGNORED_FIELDS = {'last_login', 'date_joined'}
+# Champs dont seule la modification est notée
+MASKED_FIELDS = {'password'}
+MASK = '***'
+# Tentatives d'écriture d'un lot avant abandon (base indisponible)
+MAX_ATTEMPTS = 3
+ITERATOR_CHUNK = 2000
+
+_request = ContextVar('audit_request', default=None)
+
+
+def object_type(model):
+    """Type d'objet journalisé du modèle, ou None s'il n'est pas suivi"""
+    return {
+        'api.medicine': 'medicine',
+        'api.supplier': 'supplier',
+        'api.client': 'client',
+        settings.AUTH_USER_MODEL.lower(): 'user',
+    }.get(model._meta.label_lower)
+
+
+@lru_cache(maxsize=None)
+def tracked_fields(model):
+    return tuple(
+        field for field in model._meta.concrete_fields
+        if field.editable and not field.primary_key and field.name not in IGNORED_FIELDS
+    )
+
+
+def encode(value, field=None):
+    if isinstance(value, FieldFile) or isinstance(field, FileField):
+        # Fichier absent: '' en base, FieldFile vide sur l'instance
+        return getattr(value, 'name', value) or None
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Decimal) and getattr(field, 'decimal_places', None) is not None:
+        # Même écriture que les valeurs lues en base (787.50, pas 787.5)
+        return str(value.quantize(Decimal(1).scaleb(-field.decimal_places)))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def diff(fields, before, after):
+    """{champ: [avant, après]} des champs dont la valeur a changé"""
+    changes = {}
+    for field in fields:
+        old, new = before.get(field.attname), after.get(field.attname)
+        if old == new or encode(old, field) == encode(new, field):
+            continue
+        changes[field.name] = [MASK, MASK] if field.name in MASKED_FIELDS else [encode(old, field), encode(new, field)]
+    return changes
+
+
+def values_of(instance, fields):
+    return {field.attname: field.value_from_object(instance) for field in fields}
+
+
+def current_actor_id():
+    """Utilisateur authentifié de la requête HTTP en cours (None hors requête ou anonyme)"""
+    user = getattr(_request.get(), 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
+def previous_values(instance, using, update_fields=None):
+    """Valeurs en base des champs suivis qui vont être enregistrés (None pour une création)"""
+    if instance._state.adding or instance.pk is None:
+        return None
+    fields = [
+        field for field in tracked_fields(type(instance))
+        if update_fields is None or field.name in update_fields or field.attname in update_fields
+    ]
+    if not fields:
+        return {}
+    return (
+        type(instance)._base_manager.using(using).filter(pk=instance.pk)
+        .values(*[field.attname for field in fields]).first()
+    )
+
+
+def entry(model, pk, action, changes, object_repr=''):
+    return AuditEntry(
+        object_type=object_type(model),
+        object_id=pk,
+        object_repr=str(object_repr)[:255],
+        action=action,
+        changes=changes,
+        actor_id=current_actor_id(),
+        created_at=timezone.now(),
+    )
+
+
+def enqueue(entries, using, immediate=False):
+    """
+    Ajoute les entrées au tampon une fois la transaction en cours validée, ou
+    les écrit aussitôt (immediate, opérations en masse).
+    """
+    if entries:
+        transaction.on_commit(lambda: (writer.write if immediate else writer.add)(entries), using=using)
+
+
+def record_save(instance, created, previous, using):
+    fields = tracked_fields(type(instance))
+    if created:
+        changes = diff(fields, {}, values_of(instance, fields))
+        action = 'create'
+    else:
+        if previous is None:
+            return
+        fields = [field for field in fields if field.attname in previous]
+        changes = diff(fields, previous, values_of(instance, fields))
+        action = 'update'
+        if not changes:
+            return
+    enqueue([entry(type(instance), instance.pk, action, changes, instance)], using)
+
+
+def record_delete(instance, using):
+    enqueue([entry(type(instance), instance.pk, 'delete', {}, instance)], using)
+
+
+def record_update(queryset, values):
+    """
+    Journalise une mise à jour ensembliste juste avant son exécution:
+    valeurs actuelles et nouvelles (expressions évaluées par la base) de
+    chaque ligne, en une requête parcourue par morceaux.
+    """
+    model = queryset.model
+    fields = [model._meta.get_field(name) for name in values]
+    constants, annotations = {}, {}
+    for field in fields:
+        value = values[field.name]
+        if hasattr(value, 'resolve_expression'):
+            annotations[f'audit_{field.attname}'] = value
+        else:
+            constants[field.attname] = getattr(value, 'pk', value)
+    label = 'name' if any(field.name == 'name' for field in model._meta.concrete_fields) else 'pk'
+
+    entries = []
+    columns = dict.fromkeys(['pk', label, *[field.attname for field in fields], *annotations])
+    rows = queryset.annotate(**annotations).values(*columns).order_by('pk')
+    for row in rows.iterator(chunk_size=ITERATOR_CHUNK):
+        after = {**constants, **{name[len('audit_'):]: row[name] for name in annotations}}
+        changes = diff(fields, row, after)
+        if changes:
+            entries.append(entry(model, row['pk'], 'bulk_update', changes, row[label]))
+    enqueue(entries, queryset.db, immediate=True)
+    return len(entries)
+
+
+def record_bulk(instances, previous, using):
+    """
+    Journalise des instances écrites par bulk_create/bulk_update (sans
+    signaux): previous donne, par clé primaire, les valeurs en base avant
+    l'écriture des seuls champs modifiés; une instance absente est une création.
+    """
+    if not instances:
+        return 0
+    model = type(instances[0])
+    fields = tracked_fields(model)
+    entries = []
+    for instance in instances:
+        before = previous.get(instance.pk)
+        if before is None:
+            entries.append(entry(model, instance.pk, 'create', diff(fields, {}, values_of(instance, fields)), instance))
+            continue
+        changed = [field for field in fields if field.attname in before]
+        changes = diff(changed, before, values_of(instance, changed))
+        if changes:
+            entries.append(entry(model, instance.pk, 'bulk_update', changes, instance))
+    enqueue(entries, using, immediate=True)
+    return len(entries)
+
+
+class AuditWriter:
+    """Tampon des entrées validées, inséré par lots par un thread du processus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._failures = 0
+
+    def add(self, entries):
+        with self._lock:
+            overflow = min(len(self._pending) + len(entries) - settings.AUDIT_MAX_PENDING, len(self._pending))
+            for _ in range(max(overflow, 0)):
+                self._pending.popleft()
+            if overflow > 0:
+                logger.error('Tampon du journal d\'audit plein: %d entrée(s) perdue(s)', overflow)
+            self._pending.extend(entries)
+            pending = len(self._pending)
+            self._start()
+        if pending >= settings.AUDIT_BATCH_SIZE:
+            self._wakeup.set()
+
+    def _start(self):
+        # Le thread d'un processus parent n'existe pas dans ses enfants (fork des workers)
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.AUDIT_FLUSH_SECONDS)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+    def write(self, entries):
+        """Écrit des entrées par lots sans passer par le tampon (jamais écartées faute de place)"""
+        try:
+            AuditEntry.objects.using(router.db_for_write(AuditEntry)).bulk_create(
+                entries, batch_size=settings.AUDIT_BATCH_SIZE
+            )
+        except DatabaseError:
+            logger.exception('Journal d\'audit: %d entrée(s) non écrite(s)', len(entries))
+
+    def _take(self, count):
+        with self._lock:
+            return [self._pending.popleft() for _ in range(min(count, len(self._pending)))]
+
+    def flush(self):
+        """Écrit le tampon par lots; retourne le nombre d'entrées écrites"""
+        written = 0
+        while True:
+            batch = self._take(settings.AUDIT_BATCH_SIZE)
+            if not batch:
+                return written
+            try:
+                AuditEntry.objects.using(router.db_for_write(AuditEntry)).bulk_create(batch)
+            except DatabaseError:
+                self._failures += 1
+                if self._failures < MAX_ATTEMPTS:
+                    logger.warning('Écriture du journal d\'audit reportée (%d entrée(s))', len(batch), exc_info=True)
+                    with self._lock:
+                        self._pending.extendleft(reversed(batch))
+                else:
+                    logger.exception('Journal d\'audit: %d entrée(s) abandonnée(s)', len(batch))
+                    self._failures = 0
+                return written
+            self._failures = 0
+            written += len(batch)
+
+
+writer = AuditWriter()
+atexit.register(writer.flush)
+
+
+class AuditMiddleware:
+    """Rend la requête en cours (et son utilisateur authentifié) visible du journal d'audit"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.AUDIT_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
@@ -0,0 +1,69 @@
+"""
+Cloisonnement des données par pharmacie.
+
+Un utilisateur rattaché à une pharmacie ne voit et ne crée que les données de
+celle-ci. L'accès à toutes les pharmacies (administration centrale) est
+explicite: case all_branches du compte, ou superutilisateur. Un compte sans
+pharmacie ni accès central (inscription pas encore validée par le personnel)
+n'accède à aucune donnée cloisonnée: 403.
+"""
+from django.db import models
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import PermissionDenied
+
+from .models import BranchStock
+
+
+def has_central_access(user):
+    """Accès à toutes les pharmacies, accordé explicitement par le personnel"""
+    return bool(getattr(user, 'all_branches', False) or getattr(user, 'is_superuser', False))
+
+
+def user_branch_id(user):
+    """
+    Pharmacie de l'utilisateur (None pour un utilisateur central);
+    PermissionDenied pour un compte sans pharmacie ni accès central
+    """
+    branch_id = getattr(user, 'branch_id', None)
+    if branch_id is None and not has_central_access(user):
+        raise PermissionDenied("Ce compte n'est rattaché à aucune pharmacie.")
+    return branch_id
+
+
+def user_branch(user):
+    if user_branch_id(user) is None:
+        return None
+    return user.branch
+
+
+def scope_to_branch(queryset, user, branch_field='branch'):
+    """Filtre un queryset sur la pharmacie de l'utilisateur, s'il en a une"""
+    branch_id = user_branch_id(user)
+    if branch_id is None:
+        return queryset
+    return queryset.filter(**{branch_field: branch_id})
+
+
+def with_branch_stock(queryset, branch_id):
+    """Annote des médicaments avec le stock et le seuil d'alerte d'une pharmacie (catalogue commun)"""
+    stock = BranchStock.objects.filter(branch_id=branch_id, medicine=models.OuterRef('pk'))
+    return queryset.annotate(
+        branch_stock_quantity=Coalesce(models.Subquery(stock.values('stock_quantity')[:1]), 0),
+        branch_min_stock_alert=Coalesce(
+            models.Subquery(stock.values('min_stock_alert')[:1]), models.F('min_stock_alert')
+        ),
+    )
+
+
+class BranchScopedMixin:
+    """
+    Mixin de ViewSet: restreint le queryset à la pharmacie de l'utilisateur et
+    rattache les objets créés à cette pharmacie.
+    """
+    branch_field = 'branch'
+
+    def get_queryset(self):
+        return scope_to_branch(super().get_queryset(), self.request.user, self.branch_field)
+
+    def perform_create(self, serializer):
+        serializer.save(branch=user_branch(self.request.user))
@@ -0,0 +1,169 @@
+"""
+Mises à jour en masse du catalogue (changements de tarif fournisseur, réaffectations).
+
+Les médicaments sélectionnés sont modifiés par un seul UPDATE: la nouvelle
+valeur du prix est une expression SQL (pourcentage ou montant, éventuellement
+différent par groupe ou par fournisseur via CASE), arrondie au centime ou au
+pas demandé. Aucune instance n'est chargée en mémoire; le résumé (lignes
+visées, prix avant/après) est calculé par une requête d'agrégation dans la
+même transaction. En simulation (dry_run), seuls le résumé et un échantillon
+sont renvoyés; sinon chaque ligne modifiée est journalisée (api/audit.py).
+
+Comme toutes les expressions d'un UPDATE sont évaluées sur la ligne avant
+modification, les règles par groupe ou fournisseur portent sur le groupe ou le
+fournisseur actuels, même si `set` les change dans la même opération.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Avg, Case, Count, DecimalField, ExpressionWrapper, F, Max, Min, Q, Value, When
+from django.db.models.functions import Round
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+from django.utils import timezone
+
+from . import audit, changes
+from .models import Medicine
+
+SAMPLE_SIZE = 20
+# Plafond de Medicine.*_price (max_digits=10, decimal_places=2)
+PRICE_LIMIT = Decimal('100000000')
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+class BulkUpdateError(Exception):
+    """Mise à jour refusée (prix négatifs ou hors limites)"""
+
+
+def selection(criteria):
+    """Médicaments répondant à tous les critères (aucun critère avec all=true: tout le catalogue)"""
+    queryset = Medicine.objects.all()
+    if criteria.get('ids'):
+        queryset = queryset.filter(pk__in=criteria['ids'])
+    for name in ('group', 'supplier', 'consumption_type', 'pharmaceutical_form'):
+        if name in criteria:
+            queryset = queryset.filter(**{name: criteria[name]})
+    return queryset
+
+
+def price_expression(price):
+    """Expression SQL du nouveau prix (colonne price['field'] de la ligne courante)"""
+    current = F(price['field'])
+    round_to = price.get('round_to')
+
+    def changed(value):
+        if price['mode'] == 'percent':
+            expression = current * Value(1 + value / 100)
+        else:
+            expression = current + Value(value)
+        if round_to:
+            expression = Round(expression / Value(round_to)) * Value(round_to)
+        else:
+            expression = Round(expression, 2)
+        return ExpressionWrapper(expression, output_field=PRICE_FIELD)
+
+    default = changed(price['value']) if price.get('value') is not None else current
+    rules = price.get('rules') or []
+    if not rules:
+        return default
+    return Case(
+        *[
+            When(**({'group': rule['group']} if 'group' in rule else {'supplier': rule['supplier']}),
+                 then=changed(rule['value']))
+            for rule in rules
+        ],
+        default=default,
+        output_field=PRICE_FIELD,
+    )
+
+
+def money(value):
+    if value is None:
+        return None
+    return str(Decimal(str(value)).quantize(CENT))
+
+
+def price_summary(queryset, price, expression):
+    """Nombre de lignes visées et statistiques du prix avant/après, en une requête"""
+    field = price['field']
+    # Prix de vente sous le prix d'achat après l'opération
+    other = 'purchase_price' if field == 'selling_price' else 'selling_price'
+    below_cost = (
+        LessThan(expression, F(other)) if field == 'selling_price' else LessThan(F(other), expression)
+    )
+    stats = queryset.aggregate(
+        matched=Count('pk'),
+        changed=Count('pk', filter=~Q(**{field: expression})),
+        negative=Count('pk', filter=LessThan(expression, Value(0))),
+        overflow=Count('pk', filter=GreaterThanOrEqual(expression, Value(PRICE_LIMIT))),
+        below_cost=Count('pk', filter=below_cost),
+        before_min=Min(field), before_max=Max(field), before_avg=Avg(field),
+        after_min=Min(expression), after_max=Max(expression), after_avg=Avg(expression),
+    )
+    if stats['negative']:
+        raise BulkUpdateError(f"{stats['negative']} médicament(s) auraient un prix négatif.")
+    if stats['overflow']:
+        raise BulkUpdateError(f"{stats['overflow']} médicament(s) dépasseraient le prix maximal.")
+    return stats['matched'], {
+        'field': field,
+        'changed': stats['changed'],
+        'below_purchase_price': stats['below_cost'],
+        'before': {key: money(stats[f'before_{key}']) for key in ('min', 'max', 'avg')},
+        'after': {key: money(stats[f'after_{key}']) for key in ('min', 'max', 'avg')},
+    }
+
+
+def sample(queryset, price, expression):
+    """Quelques lignes avec leur prix avant/après (aperçu de la simulation)"""
+    rows = queryset.order_by('pk')
+    if price is None:
+        return list(rows.values('id', 'medicine_id', 'name')[:SAMPLE_SIZE])
+    field = price['field']
+    return [
+        {'id': pk, 'medicine_id': medicine_id, 'name': name, 'before': money(before), 'after': money(after)}
+        for pk, medicine_id, name, before, after in rows.annotate(new_price=expression)
+        .values_list('pk', 'medicine_id', 'name', field, 'new_price')[:SAMPLE_SIZE]
+    ]
+
+
+def bulk_update_medicines(data):
+    """
+    Applique data (MedicineBulkUpdateSerializer validé) aux médicaments
+    sélectionnés par un seul UPDATE et retourne le résumé de l'opération.
+    """
+    price, attributes = data.get('price'), data.get('set') or {}
+    dry_run = data['dry_run']
+    using = router.db_for_write(Medicine)
+
+    with transaction.atomic(using=using):
+        queryset = selection(data['filter']).using(using)
+        values = dict(attributes)
+        expression = None
+        if price is not None:
+            expression = price_expression(price)
+            matched, summary = price_summary(queryset, price, expression)
+            values[price['field']] = expression
+        else:
+            matched, summary = queryset.count(), None
+
+        result = {
+            'dry_run': dry_run,
+            'matched': matched,
+            'updated': 0,
+            'price': summary,
+            'set': {name: getattr(value, 'pk', value) for name, value in attributes.items()},
+            'sample': sample(queryset, price, expression),
+        }
+        if dry_run or not matched:
+            return result
+
+        # Bases sans séquence de modifications: renumérotation explicite (api/changes.py)
+        pks = None if changes.uses_sequence(using) else list(queryset.values_list('pk', flat=True))
+        if settings.AUDIT_ENABLED:
+            audit.record_update(queryset, values)
+        # auto_now n'est pas appliqué par update()
+        result['updated'] = queryset.update(**values, updated_at=timezone.now())
+        if pks:
+            changes.touch(Medicine, pks)
+    return result
@@ -0,0 +1,343 @@
+"""
+Import du catalogue (reprise d'une nouvelle pharmacie) depuis un fichier CSV ou XLSX.
+
+Le fichier est lu au fil de l'eau (csv.DictReader, openpyxl en lecture seule)
+et traité par lots de BATCH_SIZE lignes: chaque colonne du lot est convertie
+et validée d'un bloc par les champs du modèle (mêmes règles et messages que
+les formulaires), les codes déjà connus sont lus en une requête, puis le lot
+est écrit en deux requêtes ensemblistes: bulk_create des nouveaux codes,
+bulk_update des codes existants. Groupes et fournisseurs sont résolus par
+leur nom dans des dictionnaires chargés une fois. Une ligne invalide est
+écartée et signalée (numéro de ligne du fichier, erreurs par colonne) sans
+bloquer les autres; un lot refusé par la base (code créé entre-temps par un
+autre utilisateur...) est signalé ligne à ligne et annulé seul.
+
+Seules les colonnes présentes dans le fichier sont écrites: un fichier
+`medicine_id;selling_price` ne modifie que les prix (un UPDATE de ces seules
+colonnes, qui ne propose jamais de ligne incomplète). Une cellule vide vaut
+valeur vide (ou valeur par défaut du champ). Le stock n'est pas importé: le
+stock initial se saisit par un inventaire (api/stocktake.py).
+
+L'import est atomique: en simulation (dry_run), il est entièrement exécuté
+puis annulé, le rapport restant identique. Chaque médicament créé ou modifié
+est journalisé avec ses seuls champs changés (api/audit.py).
+"""
+import re
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, router, transaction
+from django.utils import timezone
+
+from . import audit, changes
+from .models import Medicine, MedicineGroup, Supplier
+from .stocktake import read_csv
+
+BATCH_SIZE = 2000
+# Lignes par UPDATE de bulk_update (un CASE par colonne, paramètres limités)
+UPDATE_BATCH_SIZE = 500
+# Erreurs détaillées renvoyées au plus (le total reste compté)
+MAX_ERRORS = 1000
+
+IMPORT_FIELDS = (
+    'medicine_id', 'name', 'group', 'supplier', 'min_stock_alert', 'composition', 'manufacturer',
+    'consumption_type', 'expiration_date', 'description', 'dosage_info', 'active_ingredients',
+    'side_effects', 'pharmaceutical_form', 'purchase_price', 'selling_price',
+)
+COLUMN_ALIASES = {
+    'code': 'medicine_id',
+    'nom': 'name',
+    'groupe': 'group',
+    'fournisseur': 'supplier',
+    'fabricant': 'manufacturer',
+    'forme': 'pharmaceutical_form',
+    'seuil_alerte': 'min_stock_alert',
+    'date_expiration': 'expiration_date',
+    'prix_achat': 'purchase_price',
+    'prix_vente': 'selling_price',
+}
+FRENCH_DATE = re.compile(r'^\d{1,2}/\d{1,2}/\d{4}$')
+
+
+class CatalogImportError(Exception):
+    """Fichier inexploitable (format, colonne medicine_id absente...)"""
+
+
+def read_xlsx(uploaded_file):
+    """Lignes de la première feuille en dictionnaires (lecture en flux)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise CatalogImportError("Import XLSX indisponible (openpyxl n'est pas installé).")
+    try:
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    except Exception as e:
+        raise CatalogImportError(f'Fichier XLSX illisible: {e}')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        names = ['' if name is None else str(name) for name in header]
+        for values in rows:
+            yield dict(zip(names, values))
+    finally:
+        workbook.close()
+
+
+def read_rows(uploaded_file, name):
+    """Lignes d'un fichier CSV (séparateur , ; ou tabulation) ou XLSX selon son extension"""
+    if name.lower().endswith('.xlsx'):
+        return read_xlsx(uploaded_file)
+    return read_csv(uploaded_file)
+
+
+def column_mapping(header):
+    """{champ: colonne du fichier} et colonnes ignorées"""
+    mapping, ignored = {}, []
+    for column in header:
+        key = str(column or '').strip().lower().replace(' ', '_').replace('-', '_')
+        field_name = COLUMN_ALIASES.get(key, key)
+        if field_name in IMPORT_FIELDS and field_name not in mapping:
+            mapping[field_name] = column
+        elif column:
+            ignored.append(column)
+    if 'medicine_id' not in mapping:
+        raise CatalogImportError('Colonne medicine_id (ou code) introuvable.')
+    return mapping, ignored
+
+
+def empty_value(field):
+    if field.null:
+        return None
+    if field.has_default():
+        return field.get_default()
+    if field.blank:
+        return ''
+    raise ValidationError('Valeur obligatoire.')
+
+
+def cell(value):
+    if isinstance(value, float) and value.is_integer():
+        # Codes et quantités saisis en nombres dans un tableur
+        value = int(value)
+    if isinstance(value, str):
+        value = value.strip()
+    return value
+
+
+def is_required(field):
+    try:
+        empty_value(field)
+    except ValidationError:
+        return True
+    return False
+
+
+class CatalogImport:
+    """Import d'un fichier: dictionnaires de résolution et rapport cumulés sur tous les lots"""
+
+    def __init__(self, user=None, create_groups=False, using=None):
+        self.user = user
+        self.create_groups = create_groups
+        self.using = using or router.db_for_write(Medicine)
+        self.groups = self.names(MedicineGroup)
+        self.suppliers = self.names(Supplier)
+        self.mapping = None
+        self.seen = {}
+        self.report = {
+            'rows': 0, 'created': 0, 'updated': 0, 'rejected': 0, 'groups_created': [],
+            'ignored_columns': [], 'errors': [], 'errors_truncated': False,
+        }
+
+    def names(self, model):
+        """{nom en minuscules: pk}; à nom égal, le plus ancien"""
+        names = {}
+        for pk, name in model.objects.using(self.using).order_by('pk').values_list('pk', 'name'):
+            names.setdefault(name.strip().casefold(), pk)
+        return names
+
+    def converter(self, field_name):
+        """Fonction valeur de cellule -> valeur du modèle (ValidationError sinon)"""
+        field = Medicine._meta.get_field(field_name)
+        if field_name in ('group', 'supplier'):
+            names = self.groups if field_name == 'group' else self.suppliers
+            label = field.verbose_name
+
+            def resolve(value):
+                if value in (None, ''):
+                    return None
+                pk = names.get(str(value).strip().casefold())
+                if pk is None:
+                    raise ValidationError(f'{label} inconnu: {value}')
+                return pk
+            return resolve
+
+        choices = {}
+        for value, label in field.choices or []:
+            choices[value.casefold()] = value
+            choices[str(label).casefold()] = value
+
+        def convert(value):
+            value = cell(value)
+            if value in (None, ''):
+                return empty_value(field)
+            if isinstance(value, float) or (isinstance(value, int) and not isinstance(field, models.IntegerField)):
+                # Écriture décimale la plus courte (12.35, pas 12.3499999...)
+                value = str(value)
+            if isinstance(field, models.DecimalField):
+                value = value.replace('\u00a0', '').replace(' ', '').replace(',', '.')
+            elif isinstance(field, models.DateField) and isinstance(value, str) and FRENCH_DATE.match(value):
+                try:
+                    value = datetime.strptime(value, '%d/%m/%Y').date()
+                except ValueError:
+                    raise ValidationError(f'Date invalide: {value}')
+            elif choices and isinstance(value, str):
+                value = choices.get(value.casefold(), value)
+            return field.clean(value, None)
+        return convert
+
+    def start(self, header):
+        self.mapping, self.report['ignored_columns'] = column_mapping(header)
+        self.converters = {name: self.converter(name) for name in self.mapping}
+        self.update_fields = [name for name in self.mapping if name != 'medicine_id'] + ['updated_at']
+        if not changes.uses_sequence(self.using):
+            self.update_fields += ['change_seq', 'change_xid']
+        # Anciennes valeurs lues pour le journal d'audit
+        self.audited = [
+            field.attname for field in audit.tracked_fields(Medicine)
+            if settings.AUDIT_ENABLED and field.name in self.update_fields
+        ]
+        self.missing_required = [
+            name for name in IMPORT_FIELDS
+            if name not in self.mapping and is_required(Medicine._meta.get_field(name))
+        ]
+
+    def add_groups(self, column):
+        """Crée en une requête les groupes inconnus d'une colonne"""
+        missing = {}
+        for value in column:
+            value = cell(value)
+            if value not in (None, '') and str(value).casefold() not in self.groups:
+                missing.setdefault(str(value).casefold(), str(value))
+        new_groups = [
+            MedicineGroup(name=name) for name in missing.values()
+            if len(name) <= MedicineGroup._meta.get_field('name').max_length
+        ]
+        if not new_groups:
+            return
+        changes.stamp(new_groups)
+        MedicineGroup.objects.using(self.using).bulk_create(new_groups)
+        self.groups.update(self.names(MedicineGroup))
+        self.report['groups_created'].extend(group.name for group in new_groups)
+
+    def reject(self, line, code, errors):
+        self.report['rejected'] += 1
+        if len(self.report['errors']) < MAX_ERRORS:
+            self.report['errors'].append({'line': line, 'medicine_id': code, 'errors': errors})
+        else:
+            self.report['errors_truncated'] = True
+
+    def import_batch(self, batch):
+        """batch: [(numéro de ligne, {colonne: cellule})]"""
+        if self.mapping is None:
+            self.start(batch[0][1].keys())
+        self.report['rows'] += len(batch)
+        values = [{} for _ in batch]
+        errors = [{} for _ in batch]
+
+        # Validation colonne par colonne
+        for field_name, column_name in self.mapping.items():
+            column = [row.get(column_name) for _, row in batch]
+            if field_name == 'group' and self.create_groups:
+                self.add_groups(column)
+            convert = self.converters[field_name]
+            for index, value in enumerate(column):
+                try:
+                    values[index][field_name] = convert(value)
+                except ValidationError as e:
+                    errors[index][field_name] = ' '.join(e.messages)
+
+        existing = {
+            row['medicine_id']: row for row in Medicine.objects.using(self.using)
+            .filter(medicine_id__in=[row['medicine_id'] for row in values if 'medicine_id' in row])
+            .values('pk', 'medicine_id', *self.audited)
+        }
+
+        created, updated, lines = [], [], []
+        for (line, _), row, row_errors in zip(batch, values, errors):
+            code = row.get('medicine_id')
+            if code is not None and code in self.seen:
+                row_errors['medicine_id'] = f'Code en double (ligne {self.seen[code]}).'
+            elif code is not None:
+                self.seen[code] = line
+            if code is not None and self.missing_required and code not in existing:
+                row_errors.setdefault(
+                    '__all__', f'Nouveau médicament: colonnes requises {", ".join(self.missing_required)}.'
+                )
+            if row_errors:
+                self.reject(line, code, row_errors)
+                continue
+            row['group_id'] = row.pop('group', None)
+            row['supplier_id'] = row.pop('supplier', None)
+            if code in existing:
+                updated.append(Medicine(pk=existing[code]['pk'], **row, updated_at=timezone.now()))
+            else:
+                created.append(Medicine(**row, created_by=self.user))
+            lines.append((line, code))
+        if not lines:
+            return
+
+        try:
+            with transaction.atomic(using=self.using):
+                self.write(created, updated)
+        except IntegrityError as e:
+            message = f"Lot refusé par la base: {(str(e).splitlines() or [''])[0]}"
+            for line, code in lines:
+                self.reject(line, code, {'__all__': message})
+            return
+        self.report['updated'] += len(updated)
+        self.report['created'] += len(created)
+        if settings.AUDIT_ENABLED:
+            previous = {row['pk']: {name: row[name] for name in self.audited} for row in existing.values()}
+            audit.record_bulk(created + updated, previous, self.using)
+
+    def write(self, created, updated):
+        """Nouveaux codes insérés, codes existants modifiés sur les seules colonnes du fichier"""
+        manager = Medicine.objects.using(self.using)
+        if created:
+            changes.stamp(created)
+            manager.bulk_create(created)
+        if updated:
+            changes.stamp(updated)
+            manager.bulk_update(updated, self.update_fields, batch_size=UPDATE_BATCH_SIZE)
+
+
+def batches(rows, size=BATCH_SIZE):
+    """[(numéro de ligne, ligne)] par lots, sans les lignes vides (l'en-tête est la ligne 1)"""
+    numbered = (
+        (line, row) for line, row in enumerate(rows, start=2)
+        if any(cell(value) not in (None, '') for value in row.values())
+    )
+    while True:
+        batch = list(islice(numbered, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_catalog(rows, user=None, create_groups=False, dry_run=False):
+    """
+    Importe des lignes {colonne: valeur} (read_rows) et retourne le rapport:
+    lignes lues, créées, mises à jour, rejetées (avec leurs erreurs).
+    """
+    using = router.db_for_write(Medicine)
+    catalog_import = CatalogImport(user=user, create_groups=create_groups, using=using)
+    with transaction.atomic(using=using):
+        for batch in batches(rows):
+            catalog_import.import_batch(batch)
+        if dry_run:
+            transaction.set_rollback(True, using=using)
+    return {'dry_run': dry_run, **catalog_import.report}
@@ -0,0 +1,223 @@
+"""
+Flux de modifications du catalogue (synchronisation différentielle des caisses).
+
+Chaque ligne de Medicine, MedicineGroup et Supplier porte, à chaque
+insertion ou mise à jour, la transaction qui l'a écrite (change_xid) et un
+numéro tiré d'une séquence commune (change_seq); une suppression laisse une
+trace (CatalogDeletion) marquée de la même façon. Le flux est ordonné par
+(change_xid, change_seq) et un client garde la position reçue (version, plus
+after en cours de pagination): il ne redemande que les lignes situées
+au-delà. Après une heure sans modification, l'appel se résume à la lecture
+de l'instantané de transactions.
+
+PostgreSQL: les deux valeurs sont posées par des triggers (toutes les
+écritures sont couvertes: save(), bulk_create, update(), SQL brut de
+api/stock.py, SET_NULL en cascade), change_xid valant pg_current_xact_id().
+La version renvoyée est le xmin de l'instantané du lecteur: toute transaction
+de numéro inférieur est terminée, si bien qu'aucune ligne encore invisible ne
+peut se trouver avant la position d'un client (sinon il la sauterait pour
+toujours). Rien n'est verrouillé: une longue transaction (import, ou toute
+autre écriture de l'instance) retient seulement la version jusqu'à sa fin,
+les modifications déjà validées au-delà attendant l'appel suivant.
+
+Autres bases (développement): un compteur en table (ChangeCounter) est tiré
+par des signaux et par les mises à jour ensemblistes et sert aux deux
+champs; les écritures y sont de toute façon sérialisées.
+"""
+from django.db import connections, models, router, transaction
+from django.db.models import Q
+
+from .models import CatalogDeletion, ChangeCounter, Medicine, MedicineGroup, Supplier
+
+SEQUENCE = 'api_catalog_change_seq'
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 5000
+
+# Table -> type de ligne dans le flux
+TRACKED_TABLES = {
+    'api_medicine': 'medicine',
+    'api_medicinegroup': 'group',
+    'api_supplier': 'supplier',
+}
+
+FEEDS = {
+    'medicines': (Medicine, (
+        'id', 'medicine_id', 'name', 'group', 'supplier', 'stock_quantity', 'min_stock_alert',
+        'purchase_price', 'selling_price', 'expiration_date', 'pharmaceutical_form', 'consumption_type',
+        'composition', 'manufacturer', 'image_thumbnail', 'updated_at',
+    )),
+    'groups': (MedicineGroup, ('id', 'name', 'description', 'updated_at')),
+    'suppliers': (Supplier, ('id', 'name', 'phone', 'email', 'address', 'updated_at')),
+}
+DELETION_KINDS = {'medicine': 'medicines', 'group': 'groups', 'supplier': 'suppliers'}
+
+
+def install_sql():
+    """Séquence, fonctions et triggers PostgreSQL (migration 0015)"""
+    statements = [
+        f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE}',
+        f"""
+        CREATE OR REPLACE FUNCTION api_catalog_stamp() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_seq := nextval('{SEQUENCE}');
+            NEW.change_xid := pg_current_xact_id()::text::bigint;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION api_catalog_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO api_catalogdeletion (kind, object_id, change_seq, change_xid, deleted_at)
+            VALUES (TG_ARGV[0], OLD.id, nextval('{SEQUENCE}'), pg_current_xact_id()::text::bigint, now());
+            RETURN OLD;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+    ]
+    for table, kind in TRACKED_TABLES.items():
+        statements += [
+            f'CREATE TRIGGER {table}_change_seq BEFORE INSERT OR UPDATE ON {table} '
+            f'FOR EACH ROW EXECUTE FUNCTION api_catalog_stamp()',
+            f'CREATE TRIGGER {table}_tombstone AFTER DELETE ON {table} '
+            f"FOR EACH ROW EXECUTE FUNCTION api_catalog_tombstone('{kind}')",
+            # Numérote les lignes existantes (par le trigger)
+            f'UPDATE {table} SET change_seq = 0',
+        ]
+    return statements
+
+
+def uninstall_sql():
+    statements = []
+    for table in TRACKED_TABLES:
+        statements += [
+            f'DROP TRIGGER IF EXISTS {table}_change_seq ON {table}',
+            f'DROP TRIGGER IF EXISTS {table}_tombstone ON {table}',
+        ]
+    return statements + [
+        'DROP FUNCTION IF EXISTS api_catalog_stamp()',
+        'DROP FUNCTION IF EXISTS api_catalog_tombstone()',
+        f'DROP SEQUENCE IF EXISTS {SEQUENCE}',
+    ]
+
+
+def uses_sequence(using=None):
+    return connections[using or router.db_for_write(Medicine)].vendor == 'postgresql'
+
+
+def is_tracked(model):
+    return model._meta.db_table in TRACKED_TABLES
+
+
+def allocate(count, using=None):
+    """Réserve `count` numéros consécutifs du compteur (bases sans séquence)"""
+    using = using or router.db_for_write(ChangeCounter)
+    with transaction.atomic(using=using):
+        counter, _ = ChangeCounter.objects.using(using).select_for_update().get_or_create(pk=1)
+        counter.value += count
+        counter.save(using=using, update_fields=['value'])
+    return range(counter.value - count + 1, counter.value + 1)
+
+
+def stamp(objects):
+    """Numérote des instances avant un bulk_create (bases sans séquence; triggers sinon)"""
+    objects = list(objects)
+    if objects and not uses_sequence() and is_tracked(type(objects[0])):
+        for instance, value in zip(objects, allocate(len(objects))):
+            instance.change_seq = instance.change_xid = value
+
+
+def touch(model, pks):
+    """Renumérote des lignes modifiées par une mise à jour ensembliste (bases sans séquence)"""
+    pks = list(pks)
+    if not pks or uses_sequence() or not is_tracked(model):
+        return
+    values = allocate(len(pks))
+    number = models.Case(
+        *[models.When(pk=pk, then=models.Value(value)) for pk, value in zip(pks, values)],
+        output_field=models.BigIntegerField(),
+    )
+    model.objects.filter(pk__in=pks).update(change_seq=number, change_xid=number)
+
+
+def current_version(using):
+    """
+    Version courante: toute écriture du catalogue de change_xid inférieur est
+    terminée (validée ou annulée). Ne prend aucun verrou.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        counter = ChangeCounter.objects.using(using).filter(pk=1).values_list('value', flat=True).first()
+        return (counter or 0) + 1
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def changed_since(version, using):
+    """Vrai si une ligne ou une suppression du catalogue a été écrite depuis `version`"""
+    tables = [model for model, _ in FEEDS.values()] + [CatalogDeletion]
+    return any(model.objects.using(using).filter(change_xid__gte=version).exists() for model in tables)
+
+
+def encode_value(model, field_name, value):
+    if value is None:
+        return None
+    field = model._meta.get_field(field_name)
+    if isinstance(field, models.DecimalField):
+        return str(value)
+    if isinstance(field, models.FileField):
+        return field.storage.url(value) if value else None
+    return value
+
+
+def changes_since(since, after=0, limit=DEFAULT_LIMIT):
+    """
+    Lignes modifiées et supprimées depuis la position (since, after), en
+    forme compacte (colonnes + lignes), par ordre de (transaction, numéro);
+    au plus `limit` éléments, has_more indiquant qu'il faut rappeler avec la
+    version et le after renvoyés.
+    """
+    using = router.db_for_write(Medicine)
+    version = current_version(using)
+    empty = {
+        'changes': {name: {'fields': list(fields), 'rows': []} for name, (_, fields) in FEEDS.items()},
+        'deleted': {name: [] for name in FEEDS},
+    }
+    if version < since:
+        # Version inconnue de cette base (restauration, autre serveur): tout recharger
+        return {'version': 0, 'after': 0, 'has_more': True, 'reset': True, **empty}
+    if version == since:
+        return {'version': version, 'after': 0, 'has_more': False, 'reset': False, **empty}
+
+    # Au-delà de la position du client, en deçà des transactions pas encore terminées
+    window = (Q(change_xid__gt=since) | Q(change_xid=since, change_seq__gt=after)) & Q(change_xid__lt=version)
+    order = ('change_xid', 'change_seq')
+    entries = []
+    for name, (model, fields) in FEEDS.items():
+        rows = model.objects.using(using).filter(window).order_by(*order).values_list(*order, *fields)
+        entries.extend((row[:2], name, row[2:]) for row in rows[:limit + 1])
+    deletions = CatalogDeletion.objects.using(using).filter(window).order_by(*order)
+    entries.extend(
+        ((xid, seq), 'deleted', (kind, object_id))
+        for xid, seq, kind, object_id in deletions.values_list(*order, 'kind', 'object_id')[:limit + 1]
+    )
+    entries.sort(key=lambda entry: entry[0])
+
+    has_more = len(entries) > limit
+    after = 0
+    if has_more:
+        entries = entries[:limit]
+        version, after = entries[-1][0]
+
+    result = {'version': version, 'after': after, 'has_more': has_more, 'reset': False, **empty}
+    for _, name, row in entries:
+        if name == 'deleted':
+            kind, object_id = row
+            result['deleted'][DELETION_KINDS[kind]].append(object_id)
+            continue
+        model, fields = FEEDS[name]
+        result['changes'][name]['rows'].append(
+            [encode_value(model, field_name, value) for field_name, value in zip(fields, row)]
+        )
+    return result
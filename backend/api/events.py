@@ -0,0 +1,193 @@
+"""
+Événements en direct (ventes, stock) diffusés en Server-Sent Events.
+
+Les écritures publient des événements compacts une fois leur transaction
+validée (transaction.on_commit): une vente annulée n'est jamais annoncée.
+
+    sale.created     {id, sale_number, branch, client, total_amount, payment_method,
+                      items_count, quantity, sold_by, created_at}
+    stock.changed    {branch, medicines: [{id, stock_quantity, branch_stock_quantity?}]}
+
+Le courtier est local au processus (aucun service externe): un abonné ne
+reçoit que les événements des écritures faites par son propre processus. Le
+flux (/api/events/stream/, vue asynchrone) demande un déploiement ASGI; avec
+plusieurs workers, les écritures et les abonnés doivent partager le même.
+
+Chaque événement porte un identifiant croissant; les EVENTS_HISTORY derniers
+sont gardés pour qu'un client reconnecté (en-tête Last-Event-ID, envoyé
+automatiquement par EventSource) reçoive ceux qu'il a manqués. S'ils ne sont
+plus disponibles, ou si le client ne suit pas le rythme, un événement `reset`
+lui demande de recharger ses données.
+
+Sans abonné, les événements ne sont pas construits (aucune requête): un
+`reset` prend leur place dans l'historique, si bien qu'un client qui se
+reconnecte après coup recharge ses données au lieu de manquer ces écritures.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.db import router, transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import BranchStock, Medicine
+
+# Identifiants propres au processus: un client reconnecté à un autre processus reçoit un reset
+_EPOCH = uuid.uuid4().hex[:8]
+# Médicaments par requête de relecture du stock
+CHUNK_SIZE = 1000
+# Événement demandant au client de recharger ses données
+RESET = 'reset'
+
+
+class Subscription:
+    """File d'événements d'un client, alimentée depuis n'importe quel thread"""
+
+    def __init__(self, branch_id, loop, size):
+        self.branch_id = branch_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def accepts(self, event):
+        return self.branch_id is None or event['branch'] in (None, self.branch_id)
+
+    def put(self, event):
+        """Appelé dans la boucle d'événements de l'abonné"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client trop lent: il recevra un reset plutôt qu'un flux troué
+            self.overflowed = True
+
+    async def get(self, timeout):
+        if self.overflowed:
+            return None
+        event = await asyncio.wait_for(self.queue.get(), timeout)
+        return None if self.overflowed else event
+
+
+class Broker:
+    def __init__(self, history):
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, branch_id, size):
+        subscription = Subscription(branch_id, asyncio.get_running_loop(), size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type, branch_id, data):
+        """Ajoute l'événement à l'historique et le transmet aux abonnés concernés"""
+        with self._lock:
+            event = {'id': f'{_EPOCH}-{next(self._counter)}', 'type': event_type, 'branch': branch_id, 'data': data}
+            self._history.append(event)
+            subscribers = [subscription for subscription in self._subscribers if subscription.accepts(event)]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # Boucle fermée: client parti sans désabonnement
+                self.unsubscribe(subscription)
+        return event
+
+    def missed(self, last_event_id, subscription):
+        """
+        Événements postérieurs à last_event_id encore en mémoire, ou None si le
+        client doit tout recharger (identifiant inconnu ou trop ancien).
+        """
+        with self._lock:
+            history = list(self._history)
+        ids = [event['id'] for event in history]
+        if last_event_id not in ids:
+            return None
+        missed = [event for event in history[ids.index(last_event_id) + 1:] if subscription.accepts(event)]
+        if any(event['type'] == RESET for event in missed):
+            # Événements non construits faute d'abonné
+            return None
+        return missed
+
+
+broker = Broker(settings.EVENTS_HISTORY)
+
+
+def encode(event):
+    """Trame SSE d'un événement"""
+    data = json.dumps(event['data'], cls=JSONEncoder, separators=(',', ':'))
+    return f'id: {event["id"]}\nevent: {event["type"]}\ndata: {data}\n\n'
+
+
+def publish_on_commit(event_type, branch_id, build):
+    """Publie l'événement construit par build() après la validation de la transaction courante"""
+    def send():
+        if not broker.has_subscribers:
+            broker.publish(RESET, branch_id, {})
+            return
+        data = build()
+        if data is not None:
+            broker.publish(event_type, branch_id, data)
+    transaction.on_commit(send, using=router.db_for_write(Medicine))
+
+
+def sale_created(sale, items):
+    """Annonce une vente; items: lignes validées ({'medicine', 'quantity', ...})"""
+    data = {
+        'id': sale.pk,
+        'sale_number': sale.sale_number,
+        'branch': sale.branch_id,
+        'client': sale.client_id,
+        'total_amount': str(sale.total_amount),
+        'payment_method': sale.payment_method,
+        'items_count': len(items),
+        'quantity': sum(item['quantity'] for item in items),
+        'sold_by': sale.sold_by_id,
+        'created_at': sale.created_at,
+    }
+    publish_on_commit('sale.created', sale.branch_id, lambda: data)
+
+
+def stock_changed(medicine_pks, branch=None):
+    """
+    Annonce les nouveaux niveaux de stock des médicaments donnés, lus après
+    validation sur la base d'écriture (aucune requête sans abonné).
+    """
+    medicine_pks = list(medicine_pks)
+    if not medicine_pks:
+        return
+    branch_id = branch.pk if branch is not None else None
+
+    def build():
+        alias = router.db_for_write(Medicine)
+        medicines, local = [], {}
+        for start in range(0, len(medicine_pks), CHUNK_SIZE):
+            chunk = medicine_pks[start:start + CHUNK_SIZE]
+            medicines.extend(
+                {'id': pk, 'stock_quantity': quantity}
+                for pk, quantity in Medicine.objects.using(alias).filter(pk__in=chunk)
+                .values_list('pk', 'stock_quantity').order_by('pk')
+            )
+            if branch_id is not None:
+                local.update(
+                    BranchStock.objects.using(alias).filter(branch_id=branch_id, medicine_id__in=chunk)
+                    .values_list('medicine_id', 'stock_quantity')
+                )
+        if branch_id is not None:
+            for medicine in medicines:
+                medicine['branch_stock_quantity'] = local.get(medicine['id'], 0)
+        return {'branch': branch_id, 'medicines': medicines}
+    publish_on_commit('stock.changed', branch_id, build)
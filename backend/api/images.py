@@ -0,0 +1,146 @@
+"""
+Variantes d'images générées à l'envoi.
+
+À l'enregistrement d'un modèle dont l'image vient d'être envoyée ou remplacée,
+l'original est redimensionné et recompressé en WebP dans des champs dédiés
+(miniature pour les listes, détail pour les fiches). Le nom de l'image lu en
+base est mémorisé au chargement (remember_source): un enregistrement qui ne
+touche pas à l'image (prix, stock, update_fields sans l'image) ne régénère rien. Les serializers exposent leurs URL
+comme celle de l'original: storage.url() construit l'adresse sans appel au
+stockage, aucune requête n'est faite par ligne.
+
+Pillow n'est importé qu'au premier traitement d'image: le module est chargé
+avec les modèles, à chaque démarrage.
+"""
+import io
+from pathlib import PurePath
+
+from django.core.files.base import ContentFile
+from django.db import router, transaction
+
+WEBP_QUALITY = 80
+
+MEDICINE_IMAGE_VARIANTS = {
+    'image_thumbnail': (200, 200),
+    'image_detail': (800, 800),
+}
+AVATAR_VARIANTS = {
+    'avatar_thumbnail': (128, 128),
+}
+
+
+def render_variant(image, size):
+    """Copie réduite (proportions conservées, jamais agrandie) encodée en WebP"""
+    from PIL import Image
+
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    variant.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def open_source(field_file):
+    """Ouvre l'image (fichier envoyé ou déjà stocké), orientée selon l'EXIF"""
+    from PIL import Image, ImageOps
+
+    if field_file._committed:
+        field_file.open('rb')
+    source = field_file.file
+    source.seek(0)
+    try:
+        image = Image.open(source)
+        image.load()
+    finally:
+        source.seek(0)
+    image = ImageOps.exif_transpose(image)
+    return image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+
+def delete_replaced(instance, previous):
+    """
+    Supprime du stockage les anciennes variantes ({champ: nom}) une fois
+    l'enregistrement validé; rien n'est supprimé si la transaction est annulée.
+    """
+    replaced = [
+        (getattr(instance, field_name).storage, name) for field_name, name in previous.items()
+        if name and name != getattr(instance, field_name).name
+    ]
+    if not replaced:
+        return
+
+    def delete():
+        for storage, name in replaced:
+            storage.delete(name)
+    transaction.on_commit(delete, using=router.db_for_write(type(instance), instance=instance))
+
+
+def remember_source(instance, source_field):
+    """Mémorise le nom de l'image tel qu'en base (à appeler au chargement et après enregistrement)"""
+    if source_field not in instance.__dict__:
+        # Champ différé: pas de requête pour le lire
+        return
+    value = instance.__dict__[source_field]
+    instance.__dict__.setdefault('_variant_sources', {})[source_field] = getattr(value, 'name', value) or ''
+
+
+def source_changed(instance, source_field):
+    """L'image diffère-t-elle de celle lue en base (envoi, remplacement, retrait)?"""
+    source = getattr(instance, source_field)
+    stored = instance.__dict__.get('_variant_sources', {}).get(source_field)
+    if stored is None:
+        # Instance pas encore enregistrée ni chargée: seul un fichier envoyé compte
+        return bool(source) and not source._committed
+    return not source._committed or (source.name or '') != stored
+
+
+def refresh_variants(instance, source_field, variants, force=False):
+    """
+    Régénère les variantes d'un modèle avant son enregistrement: seulement si
+    l'image a changé (ou force=True); les vide si elle est retirée.
+    Une image illisible laisse les variantes vides (les clients retombent sur
+    l'original). Les fichiers des variantes remplacées sont supprimés.
+    Retourne True si les champs des variantes ont été modifiés.
+    """
+    if not force and not source_changed(instance, source_field):
+        return False
+    source = getattr(instance, source_field)
+    previous = {field_name: getattr(instance, field_name).name for field_name in variants}
+    if not source:
+        for field_name in variants:
+            setattr(instance, field_name, None)
+        delete_replaced(instance, previous)
+        return True
+
+    from PIL import Image
+
+    try:
+        image = open_source(source)
+    except (OSError, Image.DecompressionBombError):
+        for field_name in variants:
+            setattr(instance, field_name, None)
+        delete_replaced(instance, previous)
+        return True
+
+    stem = PurePath(source.name).stem
+    for field_name, size in variants.items():
+        suffix = field_name.rsplit('_', 1)[-1]
+        getattr(instance, field_name).save(
+            f'{stem}_{suffix}.webp', ContentFile(render_variant(image, size)), save=False
+        )
+    delete_replaced(instance, previous)
+    return True
+
+
+def save_with_variants(instance, save, source_field, variants, *args, **kwargs):
+    """
+    Enregistrement d'un modèle à variantes: régénération si l'image a changé
+    (jamais si update_fields l'exclut), variantes ajoutées à update_fields,
+    puis mémorisation du nom enregistré.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or source_field in update_fields:
+        if refresh_variants(instance, source_field, variants) and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *variants}
+    save(*args, **kwargs)
+    remember_source(instance, source_field)
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import TruncMonth
+
+from api.archive import ArchiveError, archive_limit, archive_month, month_bounds, month_key, parse_month
+from api.models import Sale
+
+
+class Command(BaseCommand):
+    help = 'Archive les ventes des mois clos hors période de conservation vers des fichiers compressés'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Archive uniquement ce mois (AAAA-MM)')
+        parser.add_argument('--dry-run', action='store_true', help='Liste les mois à archiver sans rien modifier')
+
+    def handle(self, *args, **options):
+        try:
+            if options['month']:
+                months = [parse_month(options['month'])]
+            else:
+                # Mois ayant des ventes, antérieurs à la période de conservation
+                months = [
+                    moment.date() for moment in
+                    Sale.objects.filter(created_at__lt=month_bounds(archive_limit())[0])
+                    .annotate(month=TruncMonth('created_at'))
+                    .order_by('month').values_list('month', flat=True).distinct()
+                ]
+        except ArchiveError as exc:
+            raise CommandError(str(exc))
+
+        if not months:
+            self.stdout.write(self.style.SUCCESS('Aucun mois à archiver.'))
+            return
+
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f'  - {month_key(month)}')
+                continue
+            try:
+                entry = archive_month(month)
+            except ArchiveError as exc:
+                self.stdout.write(self.style.WARNING(f'  ! {exc}'))
+                continue
+            self.stdout.write(
+                f'  ✓ {month_key(month)}: {entry["sales"]} vente(s), {entry["items"]} ligne(s) -> {entry["file"]}'
+            )
+        self.stdout.write(self.style.SUCCESS('Archivage terminé'))
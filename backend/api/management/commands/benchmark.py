@@ -0,0 +1,225 @@
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api import audit
+from api.models import Client, Medicine, Sale, SaleItem
+from api.querylog import QueryRecorder
+
+User = get_user_model()
+
+# Palier = nombre de ventes; médicaments et clients en proportion
+TIERS = {
+    '1k': 1000,
+    '10k': 10000,
+    '100k': 100000,
+    '1m': 1000000,
+}
+
+
+def endpoints(medicine):
+    """(nom, méthode, chemin, corps) des points d'accès mesurés"""
+    search = medicine.name.split()[0]
+    return [
+        ('medicine_list', 'get', '/api/medicines/', None),
+        ('medicine_search', 'get', f'/api/medicines/?search={search}', None),
+        ('sale_stats', 'get', '/api/sales/stats/', None),
+        ('sale_item_by_medicine', 'get', f'/api/sale-items/by_medicine/?medicine_id={medicine.pk}', None),
+        ('dashboard_report', 'get', '/api/reports/dashboard/', None),
+        ('sale_create', 'post', '/api/sales/', {
+            'payment_method': 'cash',
+            'items': [{'medicine': medicine.pk, 'quantity': 1, 'unit_price': str(medicine.selling_price)}],
+        }),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesure latence et nombre de requêtes SQL des principaux points d\'accès sur des jeux de données '
+        'de tailles croissantes (base de test dédiée), résultats en JSON comparables d\'une exécution à l\'autre'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tiers', default='1k,100k', help=f'Paliers à mesurer parmi {", ".join(TIERS)} (défaut: 1k,100k)')
+        parser.add_argument('--runs', type=int, default=20, help='Mesures par point d\'accès (défaut: 20)')
+        parser.add_argument('--warmup', type=int, default=2, help='Appels de chauffe non mesurés (défaut: 2)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Fichier JSON de résultats (défaut: benchmarks/benchmark_<date>.json)')
+        parser.add_argument('--compare', help='Résultats précédents à comparer (JSON)')
+        parser.add_argument('--tolerance', type=float, default=20.0,
+                            help='Hausse de p50 tolérée en %% avant de signaler une régression (défaut: 20)')
+        parser.add_argument('--keepdb', action='store_true', help='Conserve la base de test entre deux exécutions')
+        parser.add_argument('--no-migrate', action='store_true',
+                            help='Crée la base de test depuis les modèles plutôt que par les migrations')
+
+    def handle(self, *args, **options):
+        tiers = [tier.strip().lower() for tier in options['tiers'].split(',') if tier.strip()]
+        unknown = [tier for tier in tiers if tier not in TIERS]
+        if unknown:
+            raise CommandError(f'Palier(s) inconnu(s): {", ".join(unknown)}')
+        if options['no_migrate']:
+            for alias in connections:
+                connections[alias].settings_dict.setdefault('TEST', {})['MIGRATE'] = False
+
+        # Environnement du client de test (ALLOWED_HOSTS accepte 'testserver')
+        setup_test_environment()
+        # Jamais sur la base réelle: base de test créée (et détruite) pour l'occasion
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            results = []
+            for tier in tiers:
+                self.seed(tier, options['seed'])
+                results.extend(self.measure(tier, options['runs'], options['warmup']))
+        finally:
+            # Entrées d'audit en attente écrites tant que la base de test existe
+            audit.writer.flush()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'seed': options['seed'],
+                'runs': options['runs'],
+            },
+            'results': results,
+        }
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' /
+                      f'benchmark_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Résultats écrits dans {output}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results, options['tolerance'])
+
+    def seed(self, tier, seed):
+        sales = TIERS[tier]
+        self.stdout.write(f'\nPalier {tier}: génération des données...')
+        call_command('flush', interactive=False, verbosity=0)
+        call_command(
+            'generate_data',
+            sales=sales, medicines=max(100, sales // 10), clients=max(100, sales // 5),
+            seed=seed, chunk_size=10000, stdout=io.StringIO(),
+        )
+        Medicine.objects.update(stock_quantity=10 ** 6)
+
+    def measure(self, tier, runs, warmup):
+        # Accès central: les vues cloisonnées par pharmacie refusent un compte sans rattachement
+        user = User.objects.create_user(
+            email='benchmark@fadjma.sn', first_name='Bench', last_name='Mark', password=None,
+            is_staff=True, all_branches=True,
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        # Médicament le plus vendu: cas le plus coûteux pour by_medicine
+        top = SaleItem.objects.values('medicine').annotate(lines=Count('id')).order_by('-lines').first()
+        medicine = Medicine.objects.get(pk=top['medicine'])
+        rows = {
+            'medicines': Medicine.objects.count(),
+            'clients': Client.objects.count(),
+            'sales': Sale.objects.count(),
+            'sale_items': SaleItem.objects.count(),
+        }
+
+        results = []
+        for name, method, path, body in endpoints(medicine):
+            call = getattr(client, method)
+            for _ in range(warmup):
+                self.check_status(name, call(path, body, format='json'))
+            latencies, queries, status = [], [], None
+            for _ in range(runs):
+                with QueryRecorder() as recorder:
+                    started = time.perf_counter()
+                    response = call(path, body, format='json')
+                    if getattr(response, 'streaming', False):
+                        b''.join(response.streaming_content)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(recorder.count)
+                status = self.check_status(name, response)
+            result = {
+                'tier': tier,
+                'rows': rows,
+                'endpoint': name,
+                'method': method.upper(),
+                'path': path,
+                'status': status,
+                'latency_ms': {
+                    'min': round(min(latencies), 3),
+                    'p50': round(statistics.median(latencies), 3),
+                    'p95': round(percentile(latencies, 0.95), 3),
+                    'max': round(max(latencies), 3),
+                    'mean': round(statistics.fmean(latencies), 3),
+                },
+                'queries': max(queries),
+            }
+            results.append(result)
+            self.stdout.write(
+                f'  {name:<24} {status}  p50 {result["latency_ms"]["p50"]:>9.2f} ms  '
+                f'p95 {result["latency_ms"]["p95"]:>9.2f} ms  {result["queries"]:>4} requête(s)'
+            )
+        return results
+
+    @staticmethod
+    def check_status(name, response):
+        """Une réponse d'erreur fausserait les mesures: arrêt immédiat"""
+        if not 200 <= response.status_code < 300:
+            content = b'' if getattr(response, 'streaming', False) else response.content[:300]
+            raise CommandError(f'{name}: réponse {response.status_code} {content.decode("utf-8", "replace")}')
+        return response.status_code
+
+    def compare(self, path, results, tolerance):
+        with open(path, encoding='utf-8') as handle:
+            previous = {(row['tier'], row['endpoint']): row for row in json.load(handle)['results']}
+        regressions = []
+        self.stdout.write(f'\nComparaison avec {path}:')
+        for row in results:
+            before = previous.get((row['tier'], row['endpoint']))
+            if before is None:
+                continue
+            old, new = before['latency_ms']['p50'], row['latency_ms']['p50']
+            change = (new - old) / old * 100 if old else 0
+            queries_change = row['queries'] - before['queries']
+            flag = ''
+            if change > tolerance or queries_change > 0:
+                flag = '  <- régression'
+                regressions.append(row)
+            self.stdout.write(
+                f'  {row["tier"]:<5} {row["endpoint"]:<24} p50 {old:>9.2f} -> {new:>9.2f} ms ({change:+.1f}%)  '
+                f'requêtes {before["queries"]} -> {row["queries"]}{flag}'
+            )
+        if regressions:
+            raise CommandError(f'{len(regressions)} régression(s) au-delà de {tolerance}% ou requêtes en plus')
@@ -0,0 +1,155 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark import git_revision, percentile
+
+# Exécuté dans un interpréteur neuf: durées de chaque étape du démarrage
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urlconf = time.perf_counter()
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+client = Client(raise_request_exception=False)
+requested = time.perf_counter()
+response = client.get(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({
+    'setup': (setup - started) * 1000,
+    'urlconf': (urlconf - setup) * 1000,
+    'first_request': (done - requested) * 1000,
+    'status': response.status_code,
+}))
+'''
+
+PHASES = ('process', 'setup', 'urlconf', 'first_request')
+TOP_IMPORTS = 15
+
+
+def run_child(path, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', CHILD, path]
+    started = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy())
+    elapsed = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise CommandError(f'Échec du démarrage:\n{completed.stderr[-2000:]}')
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings['process'] = elapsed
+    return timings, completed.stderr
+
+
+def heaviest_imports(stderr, limit=TOP_IMPORTS):
+    """Modules de premier niveau les plus coûteux (temps cumulé de -X importtime)"""
+    imports = []
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3:
+            continue
+        cumulative, name = parts[1].strip(), parts[2]
+        # Un seul espace: module importé directement (pas une dépendance d'un autre)
+        if cumulative.isdigit() and not name.startswith('  '):
+            imports.append({'module': name.strip(), 'cumulative_ms': round(int(cumulative) / 1000, 3)})
+    return sorted(imports, key=lambda item: item['cumulative_ms'], reverse=True)[:limit]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesure le temps de démarrage (django.setup, chargement des URL, première requête) dans des '
+        'interpréteurs neufs, résultats en JSON comparables d\'une exécution à l\'autre'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10, help='Démarrages mesurés (défaut: 10)')
+        parser.add_argument('--path', default='/api/schema/', help='Première requête servie (défaut: /api/schema/)')
+        parser.add_argument('--output', help='Fichier JSON de résultats (défaut: benchmarks/startup_<date>.json)')
+        parser.add_argument('--compare', help='Résultats précédents à comparer (JSON)')
+        parser.add_argument('--tolerance', type=float, default=20.0,
+                            help='Hausse de p50 tolérée en %% avant de signaler une régression (défaut: 20)')
+
+    def handle(self, *args, **options):
+        # Premier démarrage non mesuré: fichiers .pyc et cache disque chauds
+        run_child(options['path'])
+        samples, status = [], None
+        for _ in range(options['runs']):
+            timings, _ = run_child(options['path'])
+            samples.append(timings)
+            status = timings['status']
+        _, stderr = run_child(options['path'], importtime=True)
+
+        results = []
+        for phase in PHASES:
+            values = [sample[phase] for sample in samples]
+            results.append({
+                'phase': phase,
+                'latency_ms': {
+                    'min': round(min(values), 3),
+                    'p50': round(statistics.median(values), 3),
+                    'p95': round(percentile(values, 0.95), 3),
+                    'max': round(max(values), 3),
+                },
+            })
+            self.stdout.write(
+                f'  {phase:<14} p50 {results[-1]["latency_ms"]["p50"]:>9.2f} ms  '
+                f'p95 {results[-1]["latency_ms"]["p95"]:>9.2f} ms'
+            )
+
+        report = {
+            'meta': {
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'path': options['path'],
+                'status': status,
+                'runs': options['runs'],
+            },
+            'results': results,
+            'imports': heaviest_imports(stderr),
+        }
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmarks' /
+                      f'startup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f'Résultats écrits dans {output}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results, options['tolerance'])
+
+    def compare(self, path, results, tolerance):
+        with open(path, encoding='utf-8') as handle:
+            previous = {row['phase']: row for row in json.load(handle)['results']}
+        regressions = []
+        self.stdout.write(f'\nComparaison avec {path}:')
+        for row in results:
+            before = previous.get(row['phase'])
+            if before is None:
+                continue
+            old, new = before['latency_ms']['p50'], row['latency_ms']['p50']
+            change = (new - old) / old * 100 if old else 0
+            flag = ''
+            if change > tolerance:
+                flag = '  <- régression'
+                regressions.append(row)
+            self.stdout.write(f'  {row["phase"]:<14} p50 {old:>9.2f} -> {new:>9.2f} ms ({change:+.1f}%){flag}')
+        if regressions:
+            raise CommandError(f'{len(regressions)} régression(s) du démarrage au-delà de {tolerance}%')
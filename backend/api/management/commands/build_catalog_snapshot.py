@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Construit l\'instantané compressé du catalogue servi par /api/catalog/snapshot/ (au déploiement ou par cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Reconstruit même si la version courante existe déjà')
+
+    def handle(self, *args, **options):
+        version, path = build_snapshot(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Instantané version {version} dans {path} ({path.stat().st_size / 1024:.0f} Ko)'
+        ))
@@ -0,0 +1,23 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from config.schema import FORMATS, generate_schema, schema_path
+
+
+class Command(BaseCommand):
+    help = (
+        'Génère le schéma OpenAPI (YAML et JSON) dans OPENAPI_SCHEMA_DIR; '
+        'à lancer au déploiement, /api/schema/ sert ensuite ces fichiers sans régénération'
+    )
+
+    def handle(self, *args, **options):
+        Path(settings.OPENAPI_SCHEMA_DIR).mkdir(parents=True, exist_ok=True)
+        for fmt in FORMATS:
+            path = schema_path(fmt)
+            # Remplacement atomique: un processus en cours ne lit jamais un fichier partiel
+            temporary = path.with_name(f'{path.name}.tmp')
+            temporary.write_bytes(generate_schema(fmt))
+            temporary.replace(path)
+            self.stdout.write(self.style.SUCCESS(f'Schéma écrit dans {path}'))
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.partitions import add_months, detach_partitions_before, ensure_partitions, is_supported, month_start
+
+
+class Command(BaseCommand):
+    help = 'Crée à l\'avance les partitions mensuelles des ventes (PostgreSQL) et détache les mois anciens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3, help='Nombre de mois à venir à préparer (défaut: 3)')
+        parser.add_argument('--detach-before', help='Détache les partitions antérieures à ce mois (AAAA-MM)')
+
+    def handle(self, *args, **options):
+        if not is_supported(connection):
+            self.stdout.write(self.style.WARNING('Partitionnement disponible uniquement sur PostgreSQL, rien à faire.'))
+            return
+
+        today = timezone.localdate()
+        created = ensure_partitions(month_start(today), add_months(today, options['months']))
+        for name in created:
+            self.stdout.write(f'  ✓ Partition créée: {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partition(s) créée(s)'))
+
+        if options['detach_before']:
+            try:
+                year, month = (int(part) for part in options['detach_before'].split('-'))
+                limit = date(year, month, 1)
+            except ValueError:
+                raise CommandError('--detach-before attend un mois au format AAAA-MM')
+            detached = detach_partitions_before(limit)
+            for name in detached:
+                self.stdout.write(f'  ✓ Partition détachée: {name}')
+            self.stdout.write(self.style.SUCCESS(f'{len(detached)} partition(s) détachée(s)'))
@@ -0,0 +1,301 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api import changes, partitions
+from api.models import Branch, BranchStock, Client, Medicine, MedicineGroup, Sale, SaleItem, Supplier
+
+User = get_user_model()
+
+GROUPS = [
+    'Antibiotiques', 'Antalgiques', 'Antipaludéens', 'Antidiabétiques', 'Vitamines et Compléments',
+    'Médicaments cardiovasculaires', 'Antihistaminiques', 'Antiseptiques', 'Dermatologie', 'Gastro-entérologie',
+    'Pédiatrie', 'Ophtalmologie',
+]
+SUBSTANCES = [
+    'Paracétamol', 'Ibuprofène', 'Amoxicilline', 'Azithromycine', 'Métronidazole', 'Artéméther', 'Quinine',
+    'Metformine', 'Glibenclamide', 'Amlodipine', 'Losartan', 'Oméprazole', 'Cétirizine', 'Loratadine',
+    'Diclofénac', 'Ciprofloxacine', 'Doxycycline', 'Acide ascorbique', 'Fer', 'Zinc', 'Salbutamol',
+    'Prednisolone', 'Hydrocortisone', 'Chlorhexidine', 'Povidone iodée', 'Dompéridone', 'Lopéramide',
+]
+DOSAGES = ['5mg', '10mg', '20mg', '100mg', '250mg', '500mg', '850mg', '1g', '125mg/5ml', '1%']
+FORMS = [code for code, _ in Medicine.PHARMACEUTICAL_FORMS]
+MANUFACTURERS = ['Sanofi', 'Novartis', 'Pfizer', 'GSK', 'Bayer', 'Teva', 'Laboratoires Afrique Pharma', 'Cipla']
+FIRST_NAMES = {
+    'M': ['Moussa', 'Ibrahima', 'Cheikh', 'Mamadou', 'Ousmane', 'Abdoulaye', 'Modou', 'Babacar', 'Pape', 'Alioune'],
+    'F': ['Fatou', 'Awa', 'Mariama', 'Aminata', 'Khady', 'Ndeye', 'Aissatou', 'Coumba', 'Sokhna', 'Rokhaya'],
+}
+LAST_NAMES = ['Ndiaye', 'Diop', 'Fall', 'Sall', 'Ba', 'Sy', 'Kane', 'Gueye', 'Faye', 'Sarr', 'Mbaye', 'Diallo', 'Cisse']
+AREAS = ['Plateau', 'Médina', 'Ouakam', 'Grand Yoff', 'Mermoz', 'Sacré Coeur', 'HLM', 'Parcelles', 'Pikine', 'Rufisque']
+PAYMENT_METHODS = ['cash', 'mobile', 'card', 'check']
+# Activité par heure d'ouverture (8h-21h) et par jour de la semaine (lundi = 0)
+HOUR_WEIGHTS = [3, 6, 8, 8, 7, 5, 5, 6, 7, 8, 8, 6, 4, 2]
+WEEKDAY_WEIGHTS = [10, 10, 10, 10, 11, 9, 5]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Désactive auto_now_add sur created_at le temps de la génération, pour que
+    bulk_create conserve les dates historiques fournies.
+    """
+    fields = [model._meta.get_field('created_at') for model in models]
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+def cumulative(weights):
+    total, result = 0, []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Génère des données synthétiques en volume (médicaments, clients, ventes) pour les tests de charge: '
+        'bulk_create par lots, graine fixe, aucun accès réseau'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--medicines', type=int, default=1000, help='Nombre de médicaments (défaut: 1000)')
+        parser.add_argument('--clients', type=int, default=1000, help='Nombre de clients (défaut: 1000)')
+        parser.add_argument('--sales', type=int, default=10000, help='Nombre de ventes (défaut: 10000)')
+        parser.add_argument('--suppliers', type=int, default=50, help='Nombre de fournisseurs (défaut: 50)')
+        parser.add_argument('--branches', type=int, default=0, help='Nombre de pharmacies (défaut: 0, sans cloisonnement)')
+        parser.add_argument('--days', type=int, default=365, help='Profondeur de l\'historique des ventes en jours')
+        parser.add_argument('--items-per-sale', type=float, default=2.5, help='Nombre moyen de lignes par vente')
+        parser.add_argument('--anonymous-ratio', type=float, default=0.6, help='Part des ventes sans client')
+        parser.add_argument(
+            '--popularity-skew', type=float, default=1.1,
+            help='Exposant de la loi de Zipf des ventes par médicament (0 = uniforme)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Graine du générateur (défaut: 42)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Taille des lots bulk_create')
+        parser.add_argument('--prefix', default='SYN', help='Préfixe des codes générés (médicaments, ventes)')
+
+    def handle(self, *args, **options):
+        if options['items_per_sale'] < 1:
+            raise CommandError('--items-per-sale doit être au moins 1')
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.prefix = options['prefix']
+        started = time.monotonic()
+
+        user = User.objects.filter(is_staff=True).first() or User.objects.first()
+        if user is None:
+            user = User.objects.create_user(
+                email='generateur@fadjma.sn', first_name='Générateur', last_name='Données', password=None
+            )
+
+        with explicit_timestamps(Medicine, Client, Sale, SaleItem):
+            branches = self.create_branches(options['branches'])
+            groups = [MedicineGroup.objects.get_or_create(name=name)[0] for name in GROUPS]
+            suppliers = self.create_suppliers(options['suppliers'])
+            medicines = self.create_medicines(options['medicines'], groups, suppliers, user)
+            if branches:
+                self.create_branch_stocks(branches, medicines)
+            clients = self.create_clients(options['clients'], branches)
+            self.create_sales(options, medicines, clients, branches, user)
+
+        self.stdout.write(self.style.SUCCESS(f'Génération terminée en {time.monotonic() - started:.1f}s'))
+
+    def bulk(self, model, objects):
+        """bulk_create par lots, chaque lot dans sa transaction"""
+        created = []
+        for start in range(0, len(objects), self.chunk_size):
+            with transaction.atomic():
+                chunk = objects[start:start + self.chunk_size]
+                changes.stamp(chunk)
+                created.extend(model.objects.bulk_create(chunk))
+        return created
+
+    def phone(self):
+        return f'{self.rng.choice(["77", "78", "76", "70"])}{self.rng.randrange(10 ** 7):07d}'
+
+    def create_branches(self, count):
+        existing = Branch.objects.filter(code__startswith=self.prefix).count()
+        branches = self.bulk(Branch, [
+            Branch(name=f'Pharmacie {self.prefix} {existing + i + 1}', code=f'{self.prefix}{existing + i + 1:03d}',
+                   address=f'{self.rng.choice(AREAS)}, Dakar', phone=self.phone())
+            for i in range(count)
+        ])
+        if count:
+            self.stdout.write(f'  ✓ {count} pharmacie(s)')
+        return branches
+
+    def create_suppliers(self, count):
+        suppliers = self.bulk(Supplier, [
+            Supplier(
+                name=f'{self.rng.choice(["Laboratoires", "Distribution", "Pharma", "Groupe"])} '
+                     f'{self.rng.choice(LAST_NAMES)} {self.rng.choice(AREAS)}',
+                phone=self.phone(),
+                email=f'contact{i + 1}@fournisseur-{self.prefix.lower()}.sn',
+                address=f'{self.rng.choice(AREAS)}, Dakar',
+            )
+            for i in range(count)
+        ])
+        self.stdout.write(f'  ✓ {count} fournisseur(s)')
+        return suppliers
+
+    def create_medicines(self, count, groups, suppliers, user):
+        offset = Medicine.objects.filter(medicine_id__startswith=f'{self.prefix}-MED-').count()
+        today = timezone.localdate()
+        now = timezone.now()
+        objects = []
+        for i in range(count):
+            substance = self.rng.choice(SUBSTANCES)
+            # Prix d'achat log-normal (médiane ~2000 FCFA), marge de 15 à 50%
+            purchase = Decimal(min(200000, max(100, round(self.rng.lognormvariate(7.6, 0.8), -1))))
+            selling = (purchase * Decimal(1 + self.rng.uniform(0.15, 0.5))).quantize(Decimal('1'))
+            objects.append(Medicine(
+                name=f'{substance} {self.rng.choice(DOSAGES)}',
+                medicine_id=f'{self.prefix}-MED-{offset + i + 1:08d}',
+                group=self.rng.choice(groups),
+                supplier=self.rng.choice(suppliers) if suppliers else None,
+                stock_quantity=self.rng.randint(0, 500),
+                min_stock_alert=self.rng.choice([5, 10, 20, 50]),
+                composition=substance,
+                manufacturer=self.rng.choice(MANUFACTURERS),
+                consumption_type=self.rng.choices(['oral', 'injection', 'topique', 'inhalation'], [80, 8, 10, 2])[0],
+                expiration_date=today + timedelta(days=self.rng.randint(-60, 1500)),
+                description=f'{substance} - données synthétiques',
+                active_ingredients=substance,
+                pharmaceutical_form=self.rng.choice(FORMS),
+                purchase_price=purchase,
+                selling_price=selling,
+                created_by=user,
+                created_at=now,
+            ))
+        medicines = self.bulk(Medicine, objects)
+        self.stdout.write(f'  ✓ {count} médicament(s)')
+        return medicines
+
+    def create_branch_stocks(self, branches, medicines):
+        objects = [
+            BranchStock(branch=branch, medicine=medicine, stock_quantity=self.rng.randint(0, 200),
+                        min_stock_alert=medicine.min_stock_alert)
+            for branch in branches for medicine in medicines
+        ]
+        self.bulk(BranchStock, objects)
+        self.stdout.write(f'  ✓ {len(objects)} stock(s) par pharmacie')
+
+    def create_clients(self, count, branches):
+        now = timezone.now()
+        pks = []
+        for start in range(0, count, self.chunk_size):
+            objects = []
+            for i in range(start, min(count, start + self.chunk_size)):
+                gender = self.rng.choice('MF')
+                first_name, last_name = self.rng.choice(FIRST_NAMES[gender]), self.rng.choice(LAST_NAMES)
+                objects.append(Client(
+                    branch=self.rng.choice(branches) if branches else None,
+                    first_name=first_name,
+                    last_name=last_name,
+                    gender=gender,
+                    birth_date=date(self.rng.randint(1940, 2010), self.rng.randint(1, 12), self.rng.randint(1, 28)),
+                    phone=self.phone(),
+                    email=f'{first_name}.{last_name}.{i + 1}@exemple.sn'.lower().replace(' ', ''),
+                    address=f'{self.rng.choice(AREAS)}, Dakar',
+                    created_at=now,
+                ))
+            with transaction.atomic():
+                pks.extend(client.pk for client in Client.objects.bulk_create(objects))
+        self.stdout.write(f'  ✓ {count} client(s)')
+        return pks
+
+    def sale_moments(self, days):
+        """Dates de vente: jour uniforme sur la période, pondéré par jour de semaine et heure"""
+        today = timezone.localdate()
+        busiest = max(WEEKDAY_WEIGHTS)
+        hour_cum = cumulative(HOUR_WEIGHTS)
+        while True:
+            day = today - timedelta(days=self.rng.randrange(days))
+            # Rejet pondéré: les jours creux (dimanche) sont moins représentés
+            if self.rng.random() * busiest > WEEKDAY_WEIGHTS[day.weekday()]:
+                continue
+            hour = 8 + self.rng.choices(range(len(HOUR_WEIGHTS)), cum_weights=hour_cum)[0]
+            yield timezone.make_aware(datetime(day.year, day.month, day.day, hour,
+                                               self.rng.randrange(60), self.rng.randrange(60)))
+
+    def create_sales(self, options, medicines, clients, branches, user):
+        count, days = options['sales'], max(1, options['days'])
+        if not count or not medicines:
+            return
+        if partitions.is_supported():
+            today = timezone.localdate()
+            partitions.ensure_partitions(today - timedelta(days=days), partitions.add_months(today, 1))
+
+        skew = options['popularity_skew']
+        popularity = cumulative([1 / (rank + 1) ** skew for rank in range(len(medicines))])
+        self.rng.shuffle(medicines)
+        prices = [medicine.selling_price for medicine in medicines]
+        payment_cum = cumulative([55, 30, 12, 3])
+        extra_items = options['items_per_sale'] - 1
+        offset = Sale.objects.filter(sale_number__startswith=f'{self.prefix}-VNT-').count()
+        moments = self.sale_moments(days)
+        branch_ids = [branch.pk for branch in branches]
+
+        items_total = 0
+        for start in range(0, count, self.chunk_size):
+            sales, lines = [], []
+            for i in range(start, min(count, start + self.chunk_size)):
+                # Nombre de lignes: 1 + loi géométrique de moyenne extra_items
+                n_items = 1
+                while extra_items and self.rng.random() < extra_items / (1 + extra_items):
+                    n_items += 1
+                picked = {}
+                for index in self.rng.choices(range(len(medicines)), cum_weights=popularity, k=n_items):
+                    picked[index] = picked.get(index, 0) + self.rng.choices([1, 1, 1, 2, 2, 3, 5])[0]
+                total = sum(prices[index] * quantity for index, quantity in picked.items())
+                client = None
+                if clients and self.rng.random() >= options['anonymous_ratio']:
+                    client = self.rng.choice(clients)
+                moment = next(moments)
+                sales.append(Sale(
+                    sale_number=f'{self.prefix}-VNT-{offset + i + 1:010d}',
+                    branch_id=self.rng.choice(branch_ids) if branch_ids else None,
+                    client_id=client,
+                    total_amount=total,
+                    payment_method=PAYMENT_METHODS[
+                        self.rng.choices(range(len(PAYMENT_METHODS)), cum_weights=payment_cum)[0]
+                    ],
+                    sold_by=user,
+                    created_at=moment,
+                ))
+                lines.append(picked)
+
+            with transaction.atomic():
+                Sale.objects.bulk_create(sales)
+                items = [
+                    SaleItem(
+                        sale_id=sale.pk,
+                        branch_id=sale.branch_id,
+                        medicine=medicines[index],
+                        quantity=quantity,
+                        unit_price=prices[index],
+                        total_price=prices[index] * quantity,
+                        created_at=sale.created_at,
+                    )
+                    for sale, picked in zip(sales, lines)
+                    for index, quantity in picked.items()
+                ]
+                SaleItem.objects.bulk_create(items, batch_size=self.chunk_size)
+            items_total += len(items)
+            self.stdout.write(f'  … {min(count, start + self.chunk_size)}/{count} vente(s)')
+
+        self.stdout.write(f'  ✓ {count} vente(s), {items_total} ligne(s) de vente')
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.images import AVATAR_VARIANTS, MEDICINE_IMAGE_VARIANTS, refresh_variants
+from api.models import Medicine
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Génère les variantes WebP des images déjà envoyées (médicaments, photos de profil)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Régénère aussi les variantes existantes')
+
+    def handle(self, *args, **options):
+        targets = [
+            (Medicine, 'image', MEDICINE_IMAGE_VARIANTS),
+            (User, 'avatar', AVATAR_VARIANTS),
+        ]
+        for model, source_field, variants in targets:
+            queryset = model.objects.exclude(**{source_field: ''}).exclude(**{f'{source_field}__isnull': True})
+            if not options['all']:
+                queryset = queryset.filter(**{f'{next(iter(variants))}__in': ['', None]})
+            done = 0
+            for instance in queryset.iterator(chunk_size=200):
+                refresh_variants(instance, source_field, variants, force=True)
+                instance.save(update_fields=list(variants))
+                done += 1
+            self.stdout.write(f'  ✓ {model._meta.verbose_name_plural}: {done} image(s) traitée(s)')
+        self.stdout.write(self.style.SUCCESS('Variantes générées'))
@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog_import import CatalogImportError, import_catalog, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Importe ou met à jour le catalogue des médicaments depuis un fichier CSV ou XLSX '
+        '(clé medicine_id, groupes et fournisseurs par leur nom)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier CSV (séparateur , ou ;) ou XLSX')
+        parser.add_argument('--create-groups', action='store_true', help='Crée les groupes inconnus')
+        parser.add_argument('--dry-run', action='store_true', help='Valide le fichier sans rien enregistrer')
+        parser.add_argument('--user', help='Email du créateur des nouveaux médicaments')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f'Utilisateur introuvable: {options["user"]}')
+        try:
+            with open(options['path'], 'rb') as handle:
+                report = import_catalog(
+                    read_rows(handle, options['path']),
+                    user=user,
+                    create_groups=options['create_groups'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, CatalogImportError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+        for error in report['errors']:
+            details = '; '.join(f'{field}: {message}' for field, message in error['errors'].items())
+            self.stdout.write(self.style.WARNING(f'  ligne {error["line"]} ({error["medicine_id"]}): {details}'))
+        if report['errors_truncated']:
+            self.stdout.write(self.style.WARNING('  ... (erreurs suivantes non détaillées)'))
+        if report['groups_created']:
+            self.stdout.write(f'  ✓ {len(report["groups_created"])} groupe(s) créé(s)')
+        prefix = 'Simulation: ' if report['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{report["rows"]} ligne(s) lue(s), {report["created"]} créée(s), '
+            f'{report["updated"]} mise(s) à jour, {report["rejected"]} rejetée(s)'
+        ))
@@ -0,0 +1,215 @@
+"""
+Métriques par point d'accès au format Prometheus.
+
+MetricsMiddleware mesure chaque requête (durée, nombre de requêtes SQL, temps
+en base) et l'impute à la vue résolue et à son action DRF (list, retrieve,
+low_stock...). Une même forme de requête répétée au moins
+METRICS_NPLUS1_THRESHOLD fois dans une requête HTTP est comptée comme N+1
+probable et journalisée (logger 'api.metrics').
+
+Les compteurs sont tenus en mémoire par processus: chaque worker expose les
+siens sur /api/metrics (Prometheus agrège par instance), avec le jeton
+METRICS_TOKEN ou, sans jeton configuré, pour le personnel seulement.
+Désactivé (METRICS_ENABLED=False), le middleware est retiré de la chaîne au
+démarrage et /api/metrics répond 404.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from config.postgresql_pool.pool import pool_stats
+
+from .profiling import staff_user
+from .querylog import QueryRecorder
+
+logger = logging.getLogger('api.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulated = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulated += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulated}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.total}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.total}'
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.nplus1 = 0
+
+
+class MetricsRegistry:
+    """Statistiques par (vue, action, méthode, classe de statut), protégées par un verrou"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(EndpointStats)
+
+    def record(self, key, duration, queries, db_seconds, nplus1):
+        with self._lock:
+            stats = self._endpoints[key]
+            stats.latency.observe(duration)
+            stats.queries.observe(queries)
+            stats.db_seconds += db_seconds
+            stats.nplus1 += nplus1
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def render(self):
+        """Exposition au format texte Prometheus (version 0.0.4)"""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            sections = {
+                'latency': ['# HELP fadjma_request_duration_seconds Durée des requêtes HTTP',
+                            '# TYPE fadjma_request_duration_seconds histogram'],
+                'queries': ['# HELP fadjma_db_queries_per_request Requêtes SQL par requête HTTP',
+                            '# TYPE fadjma_db_queries_per_request histogram'],
+                'db': ['# HELP fadjma_db_duration_seconds_total Temps cumulé passé en base',
+                       '# TYPE fadjma_db_duration_seconds_total counter'],
+                'nplus1': ['# HELP fadjma_nplus1_suspected_total Requêtes HTTP avec une forme SQL répétée (N+1)',
+                           '# TYPE fadjma_nplus1_suspected_total counter'],
+            }
+            for (view, action, method, status), stats in endpoints:
+                labels = f'view="{view}",action="{action}",method="{method}",status="{status}"'
+                sections['latency'].extend(stats.latency.lines('fadjma_request_duration_seconds', labels))
+                sections['queries'].extend(stats.queries.lines('fadjma_db_queries_per_request', labels))
+                sections['db'].append(f'fadjma_db_duration_seconds_total{{{labels}}} {stats.db_seconds}')
+                sections['nplus1'].append(f'fadjma_nplus1_suspected_total{{{labels}}} {stats.nplus1}')
+        sections['pool'] = list(render_pool_stats(pool_stats()))
+        return '\n'.join(line for section in sections.values() for line in section) + '\n'
+
+
+POOL_GAUGES = (
+    ('size', 'Connexions ouvertes par le pool'),
+    ('in_use', 'Connexions empruntées'),
+    ('idle', 'Connexions disponibles'),
+    ('waiting', 'Demandes en attente d\'une connexion'),
+    ('max_size', 'Taille maximale du pool'),
+    ('max_wait_seconds', 'Plus longue attente d\'une connexion'),
+)
+POOL_COUNTERS = (
+    ('checkouts', 'Connexions empruntées au pool'),
+    ('waits', 'Emprunts ayant dû attendre une connexion libre'),
+    ('wait_seconds', 'Temps cumulé d\'attente d\'une connexion'),
+    ('timeouts', 'Demandes abandonnées faute de connexion libre'),
+    ('health_check_failures', 'Connexions inactives trouvées hors service'),
+    ('opened', 'Connexions ouvertes'),
+    ('closed', 'Connexions fermées'),
+)
+
+
+def render_pool_stats(stats):
+    """Jauges et compteurs des pools de connexions (config/postgresql_pool)"""
+    if not stats:
+        return
+    for kind, metrics, suffix in (('gauge', POOL_GAUGES, ''), ('counter', POOL_COUNTERS, '_total')):
+        for key, description in metrics:
+            name = f'fadjma_db_pool_{key}{suffix}'
+            yield f'# HELP {name} {description}'
+            yield f'# TYPE {name} {kind}'
+            for alias, values in sorted(stats.items()):
+                yield f'{name}{{database="{alias}"}} {values[key]}'
+
+
+registry = MetricsRegistry()
+
+
+def endpoint_labels(request):
+    """(vue, action) de la requête: nom de route et action DRF du ViewSet, s'il y en a une"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved', ''
+    view = match.view_name or match.route
+    actions = getattr(match.func, 'actions', None)
+    action = actions.get(request.method.lower(), '') if actions else ''
+    return view, action
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.METRICS_NPLUS1_THRESHOLD
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.record(request, response, recorder, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        async with QueryRecorder() as recorder:
+            response = await self.get_response(request)
+        return self.record(request, response, recorder, time.perf_counter() - started)
+
+    def record(self, request, response, recorder, duration):
+        if getattr(request.resolver_match, 'func', None) is metrics_view:
+            return response
+        view, action = endpoint_labels(request)
+        repeated = recorder.repeated(self.threshold)
+        for shape, occurrences in repeated[:3]:
+            logger.warning('N+1 probable sur %s %s (%s): %d x %s', request.method, view, action, occurrences, shape)
+        registry.record(
+            (view, action, request.method, f'{response.status_code // 100}xx'),
+            duration, recorder.count, recorder.duration, 1 if repeated else 0,
+        )
+        return response
+
+
+def metrics_view(request):
+    """
+    Exposition Prometheus: en-tête Authorization: Bearer <METRICS_TOKEN> si le
+    jeton est défini, sinon jeton JWT d'un membre du personnel; 404 si désactivée
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = staff_user(request) is not None
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
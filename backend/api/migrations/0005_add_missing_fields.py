@@ -8,7 +8,9 @@ class Migration(migrations.Migration):
         ('api', '0004_alter_medicine_composition_and_more'),
     ]
 
-    operations = [
+    # Colonnes déjà créées par 0001/0002: seul l'état des modèles est mis à jour,
+    # sinon la migration échoue sur une base neuve (colonne déjà existante)
+    operations = [migrations.SeparateDatabaseAndState(state_operations=[
         migrations.AddField(
             model_name='medicine',
             name='composition',
@@ -49,4 +51,4 @@ class Migration(migrations.Migration):
             name='supplier',
             field=models.ForeignKey(null=True, blank=True, on_delete=django.db.models.deletion.SET_NULL, to='api.supplier', related_name='medicines', verbose_name='Fournisseur'),
         ),
-    ]
\ No newline at end of file
+    ])]
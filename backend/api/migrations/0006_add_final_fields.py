@@ -6,7 +6,9 @@ class Migration(migrations.Migration):
         ('api', '0005_add_missing_fields'),
     ]
 
-    operations = [
+    # Colonnes déjà créées par 0001/0002: seul l'état des modèles est mis à jour,
+    # sinon la migration échoue sur une base neuve (colonne déjà existante)
+    operations = [migrations.SeparateDatabaseAndState(state_operations=[
 
         migrations.AddField(
             model_name='medicine',
@@ -18,4 +20,4 @@ class Migration(migrations.Migration):
             name='side_effects',
             field=models.TextField(blank=True, default='', verbose_name='Effets secondaires'),
         ),
-    ]
\ No newline at end of file
+    ])]
@@ -0,0 +1,121 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:31
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_add_final_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='medicine',
+            name='active_ingredients',
+            field=models.TextField(blank=True, verbose_name='Ingrédients actifs'),
+        ),
+        migrations.AlterField(
+            model_name='medicine',
+            name='consumption_type',
+            field=models.CharField(blank=True, choices=[('oral', 'Oral'), ('injection', 'Injection'), ('topique', 'Topique'), ('inhalation', 'Inhalation')], default='oral', max_length=20, verbose_name='Type de consommation'),
+        ),
+        migrations.AlterField(
+            model_name='medicine',
+            name='pharmaceutical_form',
+            field=models.CharField(blank=True, choices=[('comprime', 'Comprimé'), ('gelule', 'Gélule'), ('sirop', 'Sirop'), ('creme', 'Crème'), ('pommade', 'Pommade'), ('injection', 'Injection'), ('gouttes', 'Gouttes'), ('suppositoire', 'Suppositoire'), ('autre', 'Autre')], default='comprime', max_length=20, verbose_name='Forme pharmaceutique'),
+        ),
+        migrations.AlterField(
+            model_name='medicine',
+            name='side_effects',
+            field=models.TextField(blank=True, verbose_name='Effets secondaires'),
+        ),
+        migrations.CreateModel(
+            name='PurchaseOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_number', models.CharField(max_length=50, unique=True, verbose_name='Numéro de commande')),
+                ('status', models.CharField(choices=[('draft', 'Brouillon'), ('ordered', 'Commandé'), ('partial', 'Partiellement reçu'), ('received', 'Reçu'), ('cancelled', 'Annulé')], default='draft', max_length=20, verbose_name='Statut')),
+                ('expected_date', models.DateField(blank=True, null=True, verbose_name='Date de livraison prévue')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchase_orders', to=settings.AUTH_USER_MODEL, verbose_name='Créé par')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='purchase_orders', to='api.supplier', verbose_name='Fournisseur')),
+            ],
+            options={
+                'verbose_name': 'Bon de commande',
+                'verbose_name_plural': 'Bons de commande',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GoodsReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('receipt_number', models.CharField(max_length=50, unique=True, verbose_name='Numéro de réception')),
+                ('delivery_reference', models.CharField(blank=True, max_length=100, verbose_name='Référence du bon de livraison')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de réception')),
+                ('received_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='goods_receipts', to=settings.AUTH_USER_MODEL, verbose_name='Reçu par')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='goods_receipts', to='api.supplier', verbose_name='Fournisseur')),
+                ('purchase_order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='receipts', to='api.purchaseorder', verbose_name='Commande')),
+            ],
+            options={
+                'verbose_name': 'Réception',
+                'verbose_name_plural': 'Réceptions',
+                'ordering': ['-received_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PurchaseOrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_ordered', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Quantité commandée')),
+                ('quantity_received', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Quantité reçue')),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))], verbose_name='Coût unitaire (FCFA)')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='purchase_order_items', to='api.medicine', verbose_name='Médicament')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.purchaseorder', verbose_name='Commande')),
+            ],
+            options={
+                'verbose_name': 'Ligne de commande',
+                'verbose_name_plural': 'Lignes de commande',
+            },
+        ),
+        migrations.CreateModel(
+            name='GoodsReceiptItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Quantité reçue')),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))], verbose_name='Coût unitaire (FCFA)')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='receipt_items', to='api.medicine', verbose_name='Médicament')),
+                ('receipt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.goodsreceipt', verbose_name='Réception')),
+            ],
+            options={
+                'verbose_name': 'Ligne de réception',
+                'verbose_name_plural': 'Lignes de réception',
+                'indexes': [models.Index(fields=['medicine', 'receipt'], name='api_goodsre_medicin_15e589_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['supplier', 'status'], name='api_purchas_supplie_820afe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['-created_at'], name='api_purchas_created_77521f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goodsreceipt',
+            index=models.Index(fields=['supplier', '-received_at'], name='api_goodsre_supplie_50ff73_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='purchaseorderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'medicine'), name='unique_order_medicine'),
+        ),
+    ]
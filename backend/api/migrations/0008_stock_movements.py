@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_purchase_orders_goods_receipts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movement_type', models.CharField(choices=[('receipt', 'Réception'), ('sale', 'Vente'), ('adjustment', 'Ajustement')], max_length=20, verbose_name='Type de mouvement')),
+                ('quantity', models.IntegerField(verbose_name='Quantité (signée)')),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Coût unitaire (FCFA)')),
+                ('reference', models.CharField(blank=True, max_length=50, verbose_name='Référence')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date du mouvement')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to=settings.AUTH_USER_MODEL, verbose_name='Effectué par')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='api.medicine', verbose_name='Médicament')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de stock',
+                'verbose_name_plural': 'Mouvements de stock',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['medicine', 'created_at'], name='api_stockmo_medicin_2bc58e_idx'), models.Index(fields=['movement_type', 'created_at'], name='api_stockmo_movemen_16555f_idx')],
+            },
+        ),
+    ]
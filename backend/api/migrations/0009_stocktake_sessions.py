@@ -0,0 +1,54 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:34
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_stock_movements'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StocktakeSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=50, unique=True, verbose_name='Référence')),
+                ('status', models.CharField(choices=[('open', 'En cours'), ('approved', 'Validé'), ('cancelled', 'Annulé')], default='open', max_length=20, verbose_name='Statut')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name="Date d'ouverture")),
+                ('approved_at', models.DateTimeField(blank=True, null=True, verbose_name='Date de validation')),
+                ('approved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approved_stocktakes', to=settings.AUTH_USER_MODEL, verbose_name='Validé par')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stocktakes', to=settings.AUTH_USER_MODEL, verbose_name='Ouvert par')),
+            ],
+            options={
+                'verbose_name': 'Inventaire',
+                'verbose_name_plural': 'Inventaires',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StocktakeCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counted_quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(0)], verbose_name='Quantité comptée')),
+                ('expected_quantity', models.IntegerField(blank=True, null=True, verbose_name='Quantité théorique à la validation')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocktake_counts', to='api.medicine', verbose_name='Médicament')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counts', to='api.stocktakesession', verbose_name='Inventaire')),
+            ],
+            options={
+                'verbose_name': "Comptage d'inventaire",
+                'verbose_name_plural': "Comptages d'inventaire",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stocktakecount',
+            constraint=models.UniqueConstraint(fields=('session', 'medicine'), name='unique_stocktake_medicine'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:37
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_stocktake_sessions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Nom de la pharmacie')),
+                ('code', models.CharField(max_length=20, unique=True, verbose_name='Code')),
+                ('address', models.TextField(blank=True, verbose_name='Adresse')),
+                ('phone', models.CharField(blank=True, max_length=20, verbose_name='Téléphone')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Active')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+            ],
+            options={
+                'verbose_name': 'Pharmacie',
+                'verbose_name_plural': 'Pharmacies',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BranchStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_quantity', models.IntegerField(default=0, verbose_name='Quantité en stock')),
+                ('min_stock_alert', models.IntegerField(default=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name="Seuil d'alerte stock")),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Dernière mise à jour')),
+            ],
+            options={
+                'verbose_name': 'Stock par pharmacie',
+                'verbose_name_plural': 'Stocks par pharmacie',
+            },
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='clients', to='api.branch', verbose_name='Pharmacie'),
+        ),
+        migrations.AddField(
+            model_name='goodsreceipt',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='goods_receipts', to='api.branch', verbose_name='Pharmacie'),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='purchase_orders', to='api.branch', verbose_name='Pharmacie'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='api.branch', verbose_name='Pharmacie'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_movements', to='api.branch', verbose_name='Pharmacie'),
+        ),
+        migrations.AddField(
+            model_name='stocktakesession',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stocktakes', to='api.branch', verbose_name='Pharmacie'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['branch', 'last_name', 'first_name'], name='api_client_branch__06283a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['branch', 'phone'], name='api_client_branch__6a211a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goodsreceipt',
+            index=models.Index(fields=['branch', '-received_at'], name='api_goodsre_branch__bdca6e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['branch', '-created_at'], name='api_purchas_branch__b35a6d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['branch', '-created_at'], name='api_sale_branch__ad875a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['branch', 'medicine', 'created_at'], name='api_stockmo_branch__798e2b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktakesession',
+            index=models.Index(fields=['branch', '-created_at'], name='api_stockta_branch__8bb065_idx'),
+        ),
+        migrations.AddField(
+            model_name='branchstock',
+            name='branch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stocks', to='api.branch', verbose_name='Pharmacie'),
+        ),
+        migrations.AddField(
+            model_name='branchstock',
+            name='medicine',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='branch_stocks', to='api.medicine', verbose_name='Médicament'),
+        ),
+        migrations.AddConstraint(
+            model_name='branchstock',
+            constraint=models.UniqueConstraint(fields=('branch', 'medicine'), name='unique_branch_medicine'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_branches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date de vente'),
+        ),
+        # Les lignes existantes prennent la date de leur vente
+        migrations.RunSQL(
+            'UPDATE api_saleitem SET created_at = '
+            '(SELECT s.created_at FROM api_sale s WHERE s.id = api_saleitem.sale_id)',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='saleitem',
+            name='sale',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.sale', verbose_name='Vente'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['-created_at'], name='api_saleite_created_5f4ed5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['medicine', 'created_at'], name='api_saleite_medicin_2bad93_idx'),
+        ),
+    ]
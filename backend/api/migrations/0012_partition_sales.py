@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from api.partitions import PARTITIONED_TABLES, partition_table
+
+
+def partition_sales(apps, schema_editor):
+    """Partitionnement mensuel des ventes (PostgreSQL uniquement)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            partition_table(cursor, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_sale_item_created_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_sales, migrations.RunPython.noop),
+    ]
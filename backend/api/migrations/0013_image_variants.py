@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_partition_sales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='image_detail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='medicines/variants/', verbose_name='Image détaillée'),
+        ),
+        migrations.AddField(
+            model_name='medicine',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='medicines/variants/', verbose_name='Miniature'),
+        ),
+    ]
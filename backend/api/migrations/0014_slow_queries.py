@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=200, verbose_name="Point d'accès")),
+                ('method', models.CharField(max_length=10, verbose_name='Méthode HTTP')),
+                ('path', models.CharField(max_length=500, verbose_name='Chemin')),
+                ('query_params', models.JSONField(blank=True, default=dict, verbose_name='Paramètres de la requête HTTP')),
+                ('database', models.CharField(max_length=50, verbose_name='Base de données')),
+                ('sql', models.TextField(verbose_name='Requête SQL')),
+                ('params', models.TextField(blank=True, verbose_name='Paramètres SQL')),
+                ('duration_ms', models.FloatField(verbose_name='Durée (ms)')),
+                ('plan', models.TextField(blank=True, verbose_name="Plan d'exécution (EXPLAIN)")),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slow_queries', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Requête lente',
+                'verbose_name_plural': 'Requêtes lentes',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='api_slowque_created_4231d3_idx'), models.Index(fields=['endpoint', 'created_at'], name='api_slowque_endpoin_d27a78_idx'), models.Index(fields=['duration_ms'], name='api_slowque_duratio_fd3754_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.0.1 on 2026-10-19 18:12
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+from api.changes import install_sql, uninstall_sql
+
+
+def number_rows(apps, schema_editor):
+    """
+    PostgreSQL: séquence et triggers (qui numérotent aussi les lignes
+    existantes). Ailleurs: lignes existantes numérotées depuis le compteur.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in install_sql():
+            schema_editor.execute(statement)
+        return
+    offset = 0
+    for name in ('MedicineGroup', 'Supplier', 'Medicine'):
+        model = apps.get_model('api', name)
+        model.objects.update(change_seq=models.F('id') + offset, change_xid=models.F('id') + offset)
+        offset += model.objects.aggregate(last=models.Max('id'))['last'] or 0
+    apps.get_model('api', 'ChangeCounter').objects.create(pk=1, value=offset)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in uninstall_sql():
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_slow_queries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('medicine', 'Médicament'), ('group', 'Groupe de médicaments'), ('supplier', 'Fournisseur')], max_length=20, verbose_name='Type')),
+                ('object_id', models.BigIntegerField(verbose_name='Identifiant supprimé')),
+                ('change_seq', models.BigIntegerField(verbose_name='Numéro de modification')),
+                ('change_xid', models.BigIntegerField(default=0, verbose_name='Transaction de modification')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date de suppression')),
+            ],
+            options={
+                'verbose_name': 'Suppression du catalogue',
+                'verbose_name_plural': 'Suppressions du catalogue',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Dernier numéro attribué')),
+            ],
+            options={
+                'verbose_name': 'Compteur de modifications',
+                'verbose_name_plural': 'Compteurs de modifications',
+            },
+        ),
+        migrations.AddField(
+            model_name='medicine',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Numéro de modification'),
+        ),
+        migrations.AddField(
+            model_name='medicine',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Transaction de modification'),
+        ),
+        migrations.AddField(
+            model_name='medicinegroup',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Numéro de modification'),
+        ),
+        migrations.AddField(
+            model_name='medicinegroup',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Transaction de modification'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Numéro de modification'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Transaction de modification'),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['change_xid', 'change_seq'], name='api_medicin_change__0b87d1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicinegroup',
+            index=models.Index(fields=['change_xid', 'change_seq'], name='api_medicin_change__24d32d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['change_xid', 'change_seq'], name='api_supplie_change__733762_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogdeletion',
+            index=models.Index(fields=['change_xid', 'change_seq'], name='api_catalog_change__5f73b8_idx'),
+        ),
+        migrations.RunPython(number_rows, drop_triggers),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-19 18:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_catalog_changes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('medicine', 'Médicament'), ('supplier', 'Fournisseur'), ('client', 'Client'), ('user', 'Utilisateur')], max_length=20, verbose_name="Type d'objet")),
+                ('object_id', models.BigIntegerField(verbose_name="Identifiant de l'objet")),
+                ('object_repr', models.CharField(blank=True, max_length=255, verbose_name="Libellé de l'objet")),
+                ('action', models.CharField(choices=[('create', 'Création'), ('update', 'Modification'), ('delete', 'Suppression'), ('bulk_update', 'Modification en masse')], max_length=20, verbose_name='Action')),
+                ('changes', models.JSONField(blank=True, default=dict, verbose_name='Modifications')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date de la modification')),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_entries', to=settings.AUTH_USER_MODEL, verbose_name='Auteur')),
+            ],
+            options={
+                'verbose_name': "Entrée du journal d'audit",
+                'verbose_name_plural': "Journal d'audit",
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['object_type', 'object_id', 'created_at'], name='api_auditen_object__f891fc_idx'), models.Index(fields=['actor', 'created_at'], name='api_auditen_actor_i_cfc13a_idx'), models.Index(fields=['created_at'], name='api_auditen_created_f351f9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.1 on 2026-10-19 19:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def allocate_branch_stock(apps, schema_editor):
+    """
+    Stock par pharmacie à partir du stock courant: avant le multi-pharmacies, tout
+    le stock était celui de la pharmacie d'origine (la plus ancienne). Elle reçoit
+    la part du stock total qui n'est encore attribuée à aucune pharmacie.
+    """
+    Branch = apps.get_model('api', 'Branch')
+    BranchStock = apps.get_model('api', 'BranchStock')
+    Medicine = apps.get_model('api', 'Medicine')
+    alias = schema_editor.connection.alias
+
+    origin = Branch.objects.using(alias).order_by('pk').first()
+    if origin is None:
+        return
+    allocated = dict(
+        BranchStock.objects.using(alias).values('medicine_id')
+        .annotate(total=models.Sum('stock_quantity')).values_list('medicine_id', 'total')
+    )
+    present = set(BranchStock.objects.using(alias).filter(branch=origin).values_list('medicine_id', flat=True))
+    rows = []
+    for pk, stock, alert in Medicine.objects.using(alias).values_list('pk', 'stock_quantity', 'min_stock_alert').iterator():
+        remainder = stock - allocated.get(pk, 0)
+        if remainder > 0 and pk not in present:
+            rows.append(BranchStock(branch=origin, medicine_id=pk, stock_quantity=remainder, min_stock_alert=alert))
+    BranchStock.objects.using(alias).bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_audit_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sale_items', to='api.branch', verbose_name='Pharmacie'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['branch', '-created_at'], name='api_saleite_branch__d9c064_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['branch', 'medicine', 'created_at'], name='api_saleite_branch__1be375_idx'),
+        ),
+        # Les lignes existantes prennent la pharmacie de leur vente
+        migrations.RunSQL(
+            'UPDATE api_saleitem SET branch_id = '
+            '(SELECT s.branch_id FROM api_sale s WHERE s.id = api_saleitem.sale_id) '
+            'WHERE sale_id IN (SELECT id FROM api_sale WHERE branch_id IS NOT NULL)',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunPython(allocate_branch_stock, migrations.RunPython.noop),
+    ]
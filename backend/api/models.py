@@ -1,8 +1,55 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator,RegexValidator
 from decimal import Decimal
 
+from .images import MEDICINE_IMAGE_VARIANTS, remember_source, save_with_variants
+
+
+class Branch(models.Model):
+    """Pharmacie (succursale) d'un même déploiement"""
+
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name="Nom de la pharmacie"
+    )
+    code = models.CharField(
+        max_length=20,
+        unique=True,
+        verbose_name="Code"
+    )
+    address = models.TextField(
+        blank=True,
+        verbose_name="Adresse"
+    )
+    phone = models.CharField(
+        max_length=20,
+        blank=True,
+        verbose_name="Téléphone"
+    )
+    is_active = models.BooleanField(
+        default=True,
+        verbose_name="Active"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Date de création"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Dernière mise à jour"
+    )
+
+    class Meta:
+        verbose_name = "Pharmacie"
+        verbose_name_plural = "Pharmacies"
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
 
 class MedicineGroup(models.Model):
     """Groupe/Catégorie de médicaments"""
@@ -25,10 +72,25 @@ class MedicineGroup(models.Model):
         verbose_name="Dernière mise à jour"
     )
 
+    # Numéro de modification et transaction qui l'a écrit (api/changes.py), tirés à chaque écriture
+    change_seq = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Numéro de modification"
+    )
+    change_xid = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Transaction de modification"
+    )
+
     class Meta:
         verbose_name = "Groupe de médicaments"
         verbose_name_plural = "Groupes de médicaments"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['change_xid', 'change_seq']),
+        ]
 
     def __str__(self):
         return self.name
@@ -75,10 +137,25 @@ class Supplier(models.Model):
         verbose_name="Dernière mise à jour"
     )
 
+    # Numéro de modification et transaction qui l'a écrit (api/changes.py), tirés à chaque écriture
+    change_seq = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Numéro de modification"
+    )
+    change_xid = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Transaction de modification"
+    )
+
     class Meta:
         verbose_name = "Fournisseur"
         verbose_name_plural = "Fournisseurs"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['change_xid', 'change_seq']),
+        ]
 
     def __str__(self):
         return self.name
@@ -206,6 +283,21 @@ class Medicine(models.Model):
         null=True,
         verbose_name="Image"
     )
+    # Variantes WebP générées à l'envoi de l'image (api/images.py)
+    image_thumbnail = models.ImageField(
+        upload_to='medicines/variants/',
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Miniature"
+    )
+    image_detail = models.ImageField(
+        upload_to='medicines/variants/',
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Image détaillée"
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name="Date de création"
@@ -221,6 +313,17 @@ class Medicine(models.Model):
         related_name='created_medicines',
         verbose_name="Créé par"
     )
+    # Numéro de modification et transaction qui l'a écrit (api/changes.py), tirés à chaque écriture
+    change_seq = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Numéro de modification"
+    )
+    change_xid = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Transaction de modification"
+    )
 
     class Meta:
         verbose_name = "Médicament"
@@ -230,6 +333,7 @@ class Medicine(models.Model):
             models.Index(fields=['medicine_id']),
             models.Index(fields=['name']),
             models.Index(fields=['expiration_date']),
+            models.Index(fields=['change_xid', 'change_seq']),
         ]
 
     def save(self, *args, **kwargs):
@@ -237,12 +341,22 @@ class Medicine(models.Model):
             import time
             timestamp = str(int(time.time() * 1000))[-9:]
             self.medicine_id = f"D06ID{timestamp}"
-        super(Medicine, self).save(*args, **kwargs)
+        save_with_variants(self, super(Medicine, self).save, 'image', MEDICINE_IMAGE_VARIANTS, *args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        remember_source(instance, 'image')
+        return instance
+
     def __str__(self):
         return f"{self.name} ({self.medicine_id})"
 
     @property
     def is_low_stock(self):
+        # Stock de la pharmacie de l'utilisateur quand il est annoté (api/branches.with_branch_stock)
+        if getattr(self, 'branch_stock_quantity', None) is not None:
+            return self.branch_stock_quantity <= self.branch_min_stock_alert
         return self.stock_quantity <= self.min_stock_alert
 
     @property
@@ -252,6 +366,50 @@ class Medicine(models.Model):
         return 0
 
 
+class BranchStock(models.Model):
+    """Stock d'un médicament dans une pharmacie"""
+
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.CASCADE,
+        related_name='stocks',
+        verbose_name="Pharmacie"
+    )
+    medicine = models.ForeignKey(
+        Medicine,
+        on_delete=models.CASCADE,
+        related_name='branch_stocks',
+        verbose_name="Médicament"
+    )
+    stock_quantity = models.IntegerField(
+        default=0,
+        verbose_name="Quantité en stock"
+    )
+    min_stock_alert = models.IntegerField(
+        default=10,
+        validators=[MinValueValidator(0)],
+        verbose_name="Seuil d'alerte stock"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Dernière mise à jour"
+    )
+
+    class Meta:
+        verbose_name = "Stock par pharmacie"
+        verbose_name_plural = "Stocks par pharmacie"
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'medicine'], name='unique_branch_medicine'),
+        ]
+
+    def __str__(self):
+        return f"{self.branch.code} - {self.medicine_id}: {self.stock_quantity}"
+
+    @property
+    def is_low_stock(self):
+        return self.stock_quantity <= self.min_stock_alert
+
+
 class Client(models.Model):
     """Client de la pharmacie"""
     phone_regex = RegexValidator(
@@ -271,6 +429,14 @@ class Client(models.Model):
         ('F', 'Femme'),
     ]
 
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='clients',
+        verbose_name="Pharmacie"
+    )
     first_name = models.CharField(
         max_length=100,
         validators=[name_regex],
@@ -321,6 +487,8 @@ class Client(models.Model):
         indexes = [
             models.Index(fields=['phone']),
             models.Index(fields=['email']),
+            models.Index(fields=['branch', 'last_name', 'first_name']),
+            models.Index(fields=['branch', 'phone']),
         ]
 
     def __str__(self):
@@ -346,6 +514,14 @@ class Sale(models.Model):
         unique=True,
         verbose_name="Numéro de vente"
     )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='sales',
+        verbose_name="Pharmacie"
+    )
     client = models.ForeignKey(
         Client,
         on_delete=models.SET_NULL,
@@ -388,6 +564,7 @@ class Sale(models.Model):
         indexes = [
             models.Index(fields=['sale_number']),
             models.Index(fields=['-created_at']),
+            models.Index(fields=['branch', '-created_at']),
         ]
 
     def __str__(self):
@@ -396,7 +573,8 @@ class Sale(models.Model):
     def save(self, *args, **kwargs):
         if not self.sale_number:
             from django.utils import timezone
-            timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
+            # Microsecondes: plusieurs ventes dans la même seconde restent distinctes
+            timestamp = timezone.now().strftime('%Y%m%d%H%M%S%f')
             self.sale_number = f"VNT-{timestamp}"
         super().save(*args, **kwargs)
 
@@ -408,8 +586,21 @@ class SaleItem(models.Model):
         Sale,
         on_delete=models.CASCADE,
         related_name='items',
+        # Pas de contrainte en base: api_sale est partitionnée (clé primaire (id, created_at))
+        db_constraint=False,
         verbose_name="Vente"
     )
+    # Copie de sale.branch: les rapports par pharmacie filtrent les lignes sans jointure
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='sale_items',
+        # Couvert par les index (branch, ...) ci-dessous
+        db_index=False,
+        verbose_name="Pharmacie"
+    )
     medicine = models.ForeignKey(
         Medicine,
         on_delete=models.PROTECT,
@@ -432,16 +623,646 @@ class SaleItem(models.Model):
         validators=[MinValueValidator(Decimal('0.00'))],
         verbose_name="Prix total (FCFA)"
     )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Date de vente"
+    )
 
     class Meta:
         verbose_name = "Ligne de vente"
         verbose_name_plural = "Lignes de vente"
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['medicine', 'created_at']),
+            models.Index(fields=['branch', '-created_at']),
+            models.Index(fields=['branch', 'medicine', 'created_at']),
+        ]
 
     def __str__(self):
         return f"{self.medicine.name} x {self.quantity}"
 
     def save(self, *args, **kwargs):
+        # Le stock n'est pas touché ici: les ventes passent par stock.decrement_stock
+        # (stock total et stock de la pharmacie, mouvements)
         self.total_price = self.quantity * self.unit_price
+        # Clé de partitionnement et pharmacie: celles de la vente
+        self.created_at = self.sale.created_at
+        self.branch_id = self.sale.branch_id
+        super().save(*args, **kwargs)
+
+class PurchaseOrder(models.Model):
+    """Bon de commande fournisseur"""
+
+    STATUS_CHOICES = [
+        ('draft', 'Brouillon'),
+        ('ordered', 'Commandé'),
+        ('partial', 'Partiellement reçu'),
+        ('received', 'Reçu'),
+        ('cancelled', 'Annulé'),
+    ]
+    # Changements de statut permis à la main; 'partial' et 'received' sont fixés par les réceptions
+    MANUAL_TRANSITIONS = {
+        'draft': {'ordered', 'cancelled'},
+        'ordered': {'draft', 'cancelled'},
+    }
+
+    order_number = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name="Numéro de commande"
+    )
+    supplier = models.ForeignKey(
+        Supplier,
+        on_delete=models.PROTECT,
+        related_name='purchase_orders',
+        verbose_name="Fournisseur"
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='purchase_orders',
+        verbose_name="Pharmacie"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='draft',
+        verbose_name="Statut"
+    )
+    expected_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Date de livraison prévue"
+    )
+    notes = models.TextField(
+        blank=True,
+        verbose_name="Notes"
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='purchase_orders',
+        verbose_name="Créé par"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Date de création"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Dernière mise à jour"
+    )
+
+    class Meta:
+        verbose_name = "Bon de commande"
+        verbose_name_plural = "Bons de commande"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['supplier', 'status']),
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['branch', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Commande {self.order_number} - {self.supplier}"
+
+    def save(self, *args, **kwargs):
+        if not self.order_number:
+            from django.utils import timezone
+            timestamp = timezone.now().strftime('%Y%m%d%H%M%S%f')[:-3]
+            self.order_number = f"CMD-{timestamp}"
+        super().save(*args, **kwargs)
+
+
+class PurchaseOrderItem(models.Model):
+    """Ligne d'un bon de commande"""
+
+    order = models.ForeignKey(
+        PurchaseOrder,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name="Commande"
+    )
+    medicine = models.ForeignKey(
+        Medicine,
+        on_delete=models.PROTECT,
+        related_name='purchase_order_items',
+        verbose_name="Médicament"
+    )
+    quantity_ordered = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        verbose_name="Quantité commandée"
+    )
+    quantity_received = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        verbose_name="Quantité reçue"
+    )
+    unit_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.00'))],
+        verbose_name="Coût unitaire (FCFA)"
+    )
+
+    class Meta:
+        verbose_name = "Ligne de commande"
+        verbose_name_plural = "Lignes de commande"
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'medicine'], name='unique_order_medicine'),
+        ]
+
+    def __str__(self):
+        return f"{self.medicine.name} x {self.quantity_ordered}"
+
+    @property
+    def quantity_pending(self):
+        return max(self.quantity_ordered - self.quantity_received, 0)
+
+
+class GoodsReceipt(models.Model):
+    """Réception de marchandises"""
+
+    receipt_number = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name="Numéro de réception"
+    )
+    supplier = models.ForeignKey(
+        Supplier,
+        on_delete=models.PROTECT,
+        related_name='goods_receipts',
+        verbose_name="Fournisseur"
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='goods_receipts',
+        verbose_name="Pharmacie"
+    )
+    purchase_order = models.ForeignKey(
+        PurchaseOrder,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='receipts',
+        verbose_name="Commande"
+    )
+    delivery_reference = models.CharField(
+        max_length=100,
+        blank=True,
+        verbose_name="Référence du bon de livraison"
+    )
+    notes = models.TextField(
+        blank=True,
+        verbose_name="Notes"
+    )
+    received_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='goods_receipts',
+        verbose_name="Reçu par"
+    )
+    received_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Date de réception"
+    )
+
+    class Meta:
+        verbose_name = "Réception"
+        verbose_name_plural = "Réceptions"
+        ordering = ['-received_at']
+        indexes = [
+            models.Index(fields=['supplier', '-received_at']),
+            models.Index(fields=['branch', '-received_at']),
+        ]
+
+    def __str__(self):
+        return f"Réception {self.receipt_number} - {self.supplier}"
+
+    def save(self, *args, **kwargs):
+        if not self.receipt_number:
+            from django.utils import timezone
+            timestamp = timezone.now().strftime('%Y%m%d%H%M%S%f')[:-3]
+            self.receipt_number = f"REC-{timestamp}"
+        super().save(*args, **kwargs)
+
+
+class GoodsReceiptItem(models.Model):
+    """Ligne de réception"""
+
+    receipt = models.ForeignKey(
+        GoodsReceipt,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name="Réception"
+    )
+    medicine = models.ForeignKey(
+        Medicine,
+        on_delete=models.PROTECT,
+        related_name='receipt_items',
+        verbose_name="Médicament"
+    )
+    quantity = models.IntegerField(
+        validators=[MinValueValidator(1)],
+        verbose_name="Quantité reçue"
+    )
+    unit_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.00'))],
+        verbose_name="Coût unitaire (FCFA)"
+    )
+
+    class Meta:
+        verbose_name = "Ligne de réception"
+        verbose_name_plural = "Lignes de réception"
+        indexes = [
+            models.Index(fields=['medicine', 'receipt']),
+        ]
+
+    def __str__(self):
+        return f"{self.medicine.name} x {self.quantity}"
+
+
+class StockMovement(models.Model):
+    """Mouvement de stock (historique servant à la valorisation)"""
+
+    MOVEMENT_TYPES = [
+        ('receipt', 'Réception'),
+        ('sale', 'Vente'),
+        ('adjustment', 'Ajustement'),
+    ]
+
+    medicine = models.ForeignKey(
+        Medicine,
+        on_delete=models.CASCADE,
+        related_name='stock_movements',
+        verbose_name="Médicament"
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='stock_movements',
+        verbose_name="Pharmacie"
+    )
+    movement_type = models.CharField(
+        max_length=20,
+        choices=MOVEMENT_TYPES,
+        verbose_name="Type de mouvement"
+    )
+    quantity = models.IntegerField(
+        verbose_name="Quantité (signée)"
+    )
+    unit_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Coût unitaire (FCFA)"
+    )
+    reference = models.CharField(
+        max_length=50,
+        blank=True,
+        verbose_name="Référence"
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='stock_movements',
+        verbose_name="Effectué par"
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Date du mouvement"
+    )
+
+    class Meta:
+        verbose_name = "Mouvement de stock"
+        verbose_name_plural = "Mouvements de stock"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['medicine', 'created_at']),
+            models.Index(fields=['movement_type', 'created_at']),
+            models.Index(fields=['branch', 'medicine', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_movement_type_display()} {self.medicine_id} ({self.quantity:+d})"
+
+
+class StocktakeSession(models.Model):
+    """Session d'inventaire physique"""
+
+    STATUS_CHOICES = [
+        ('open', 'En cours'),
+        ('approved', 'Validé'),
+        ('cancelled', 'Annulé'),
+    ]
+
+    reference = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name="Référence"
+    )
+    branch = models.ForeignKey(
+        Branch,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='stocktakes',
+        verbose_name="Pharmacie"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='open',
+        verbose_name="Statut"
+    )
+    notes = models.TextField(
+        blank=True,
+        verbose_name="Notes"
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='stocktakes',
+        verbose_name="Ouvert par"
+    )
+    approved_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='approved_stocktakes',
+        verbose_name="Validé par"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Date d'ouverture"
+    )
+    approved_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Date de validation"
+    )
+
+    class Meta:
+        verbose_name = "Inventaire"
+        verbose_name_plural = "Inventaires"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['branch', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Inventaire {self.reference}"
+
+    def save(self, *args, **kwargs):
+        if not self.reference:
+            timestamp = timezone.now().strftime('%Y%m%d%H%M%S%f')[:-3]
+            self.reference = f"INV-{timestamp}"
         super().save(*args, **kwargs)
-        self.medicine.stock_quantity -= self.quantity
-        self.medicine.save()
\ No newline at end of file
+
+
+class StocktakeCount(models.Model):
+    """Quantité comptée pour un médicament lors d'un inventaire"""
+
+    session = models.ForeignKey(
+        StocktakeSession,
+        on_delete=models.CASCADE,
+        related_name='counts',
+        verbose_name="Inventaire"
+    )
+    medicine = models.ForeignKey(
+        Medicine,
+        on_delete=models.CASCADE,
+        related_name='stocktake_counts',
+        verbose_name="Médicament"
+    )
+    counted_quantity = models.IntegerField(
+        validators=[MinValueValidator(0)],
+        verbose_name="Quantité comptée"
+    )
+    expected_quantity = models.IntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Quantité théorique à la validation"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Dernière mise à jour"
+    )
+
+    class Meta:
+        verbose_name = "Comptage d'inventaire"
+        verbose_name_plural = "Comptages d'inventaire"
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'medicine'], name='unique_stocktake_medicine'),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} - {self.medicine_id}: {self.counted_quantity}"
+
+
+class SlowQuery(models.Model):
+    """Requête SQL lente relevée pendant une requête HTTP (api/slowqueries.py)"""
+
+    endpoint = models.CharField(
+        max_length=200,
+        verbose_name="Point d'accès"
+    )
+    method = models.CharField(
+        max_length=10,
+        verbose_name="Méthode HTTP"
+    )
+    path = models.CharField(
+        max_length=500,
+        verbose_name="Chemin"
+    )
+    query_params = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Paramètres de la requête HTTP"
+    )
+    database = models.CharField(
+        max_length=50,
+        verbose_name="Base de données"
+    )
+    sql = models.TextField(
+        verbose_name="Requête SQL"
+    )
+    params = models.TextField(
+        blank=True,
+        verbose_name="Paramètres SQL"
+    )
+    duration_ms = models.FloatField(
+        verbose_name="Durée (ms)"
+    )
+    plan = models.TextField(
+        blank=True,
+        verbose_name="Plan d'exécution (EXPLAIN)"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='slow_queries',
+        verbose_name="Utilisateur"
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Date"
+    )
+
+    class Meta:
+        verbose_name = "Requête lente"
+        verbose_name_plural = "Requêtes lentes"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['endpoint', 'created_at']),
+            models.Index(fields=['duration_ms']),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.endpoint} ({self.duration_ms:.0f} ms)"
+
+
+class CatalogDeletion(models.Model):
+    """Trace de la suppression d'une ligne du catalogue (flux de modifications, api/changes.py)"""
+
+    KINDS = [
+        ('medicine', 'Médicament'),
+        ('group', 'Groupe de médicaments'),
+        ('supplier', 'Fournisseur'),
+    ]
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KINDS,
+        verbose_name="Type"
+    )
+    object_id = models.BigIntegerField(
+        verbose_name="Identifiant supprimé"
+    )
+    change_seq = models.BigIntegerField(
+        verbose_name="Numéro de modification"
+    )
+    change_xid = models.BigIntegerField(
+        default=0,
+        verbose_name="Transaction de modification"
+    )
+    deleted_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Date de suppression"
+    )
+
+    class Meta:
+        verbose_name = "Suppression du catalogue"
+        verbose_name_plural = "Suppressions du catalogue"
+        indexes = [
+            models.Index(fields=['change_xid', 'change_seq']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} (#{self.change_seq})"
+
+
+class ChangeCounter(models.Model):
+    """Compteur des numéros de modification sur les bases sans séquence (api/changes.py)"""
+
+    value = models.BigIntegerField(
+        default=0,
+        verbose_name="Dernier numéro attribué"
+    )
+
+    class Meta:
+        verbose_name = "Compteur de modifications"
+        verbose_name_plural = "Compteurs de modifications"
+
+    def __str__(self):
+        return str(self.value)
+
+
+class AuditEntry(models.Model):
+    """Modification d'un médicament, fournisseur, client ou utilisateur (journal d'audit, api/audit.py)"""
+
+    OBJECT_TYPES = [
+        ('medicine', 'Médicament'),
+        ('supplier', 'Fournisseur'),
+        ('client', 'Client'),
+        ('user', 'Utilisateur'),
+    ]
+
+    ACTIONS = [
+        ('create', 'Création'),
+        ('update', 'Modification'),
+        ('delete', 'Suppression'),
+        ('bulk_update', 'Modification en masse'),
+    ]
+
+    object_type = models.CharField(
+        max_length=20,
+        choices=OBJECT_TYPES,
+        verbose_name="Type d'objet"
+    )
+    object_id = models.BigIntegerField(
+        verbose_name="Identifiant de l'objet"
+    )
+    object_repr = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Libellé de l'objet"
+    )
+    action = models.CharField(
+        max_length=20,
+        choices=ACTIONS,
+        verbose_name="Action"
+    )
+    # {champ: [ancienne valeur, nouvelle valeur]}
+    changes = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="Modifications"
+    )
+    # Sans contrainte en base: les entrées sont écrites après coup, par lots,
+    # et l'auteur a pu être supprimé entre-temps (index: actor, created_at)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        db_index=False,
+        related_name='audit_entries',
+        verbose_name="Auteur"
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Date de la modification"
+    )
+
+    class Meta:
+        verbose_name = "Entrée du journal d'audit"
+        verbose_name_plural = "Journal d'audit"
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['object_type', 'object_id', 'created_at']),
+            models.Index(fields=['actor', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.object_type} {self.object_id}"
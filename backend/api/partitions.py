@@ -0,0 +1,242 @@
+"""
+Partitionnement mensuel (PostgreSQL) des tables de ventes.
+
+api_sale et api_saleitem sont partitionnées par plage sur created_at, une
+partition par mois (api_sale_p2026_01, ...) plus une partition par défaut.
+Les requêtes bornées en date ne lisent que les mois concernés, et un mois
+ancien se détache en une opération de catalogue (DETACH PARTITION).
+
+Une contrainte d'unicité sur une table partitionnée doit inclure la clé de
+partitionnement: l'unicité globale (sale_number) est donc portée par une table
+de référence non partitionnée (api_sale_sale_number_key_registry), tenue à
+jour par trigger. Les numéros des mois détachés ou archivés y restent réservés.
+
+Sur les autres bases (SQLite en développement), les tables restent ordinaires
+et ces fonctions ne font rien.
+"""
+import re
+from datetime import date, datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+PARTITIONED_TABLES = ('api_sale', 'api_saleitem')
+
+
+def is_supported(using_connection=None):
+    return (using_connection or connection).vendor == 'postgresql'
+
+
+def add_months(day, months):
+    """Premier jour du mois situé `months` mois après celui de `day`"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month.year:04d}_{month.month:02d}'
+
+
+def _bound(day):
+    """Borne de partition: minuit local (TIME_ZONE) du jour donné"""
+    return timezone.make_aware(datetime(day.year, day.month, day.day)).isoformat()
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor, table):
+    """Noms des partitions attachées à une table"""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_month_partition(cursor, table, month):
+    """
+    Crée la partition du mois si elle n'existe pas; retourne True si créée.
+    Les lignes du mois déjà tombées dans la partition par défaut (partition
+    créée en retard) y sont déplacées, sans quoi la création échouerait.
+    """
+    name = partition_name(table, month)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    start, end = _bound(month), _bound(add_months(month, 1))
+    default = f'{table}_default'
+    moved = False
+    if default in list_partitions(cursor, table):
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE "created_at" >= %s AND "created_at" < %s)',
+            [start, end],
+        )
+        moved = cursor.fetchone()[0]
+    if moved:
+        pending = f'{name}_pending'
+        cursor.execute(f'CREATE TEMPORARY TABLE "{pending}" (LIKE "{table}")')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{default}" WHERE "created_at" >= %s AND "created_at" < %s RETURNING *) '
+            f'INSERT INTO "{pending}" SELECT * FROM moved',
+            [start, end],
+        )
+    cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (\'{start}\') TO (\'{end}\')')
+    if moved:
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{pending}"')
+        cursor.execute(f'DROP TABLE "{pending}"')
+    return True
+
+
+def ensure_partitions(first_month, last_month, tables=PARTITIONED_TABLES):
+    """Crée les partitions mensuelles manquantes de first_month à last_month inclus"""
+    created = []
+    with connection.cursor() as cursor:
+        for table in tables:
+            if not is_partitioned(cursor, table):
+                continue
+            month = month_start(first_month)
+            while month <= last_month:
+                # Déplacement éventuel des lignes de la partition par défaut: tout ou rien
+                with transaction.atomic():
+                    is_created = create_month_partition(cursor, table, month)
+                if is_created:
+                    created.append(partition_name(table, month))
+                month = add_months(month, 1)
+    return created
+
+
+def detach_partitions_before(month, tables=PARTITIONED_TABLES):
+    """
+    Détache les partitions mensuelles antérieures au mois donné. Les tables
+    détachées restent en base (archivage, suppression) mais ne sont plus lues.
+    """
+    detached = []
+    limit = partition_name('', month_start(month))
+    with connection.cursor() as cursor:
+        for table in tables:
+            if not is_partitioned(cursor, table):
+                continue
+            prefix = f'{table}_p'
+            for name in list_partitions(cursor, table):
+                if name.startswith(prefix) and name[len(table):] < limit:
+                    cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                    detached.append(name)
+    return detached
+
+
+def _install_unique_registry(cursor, table, name, columns):
+    """
+    Unicité globale de `columns` sur une table partitionnée: table de référence
+    indexée, alimentée par trigger à chaque insertion, suppression ou
+    modification des colonnes (violation -> IntegrityError comme avant).
+    """
+    registry = f'{name}_registry'
+    function = f'{registry}_sync'
+    old = ', '.join(f'OLD.{column}' for column in columns.split(', '))
+    new = ', '.join(f'NEW.{column}' for column in columns.split(', '))
+    cursor.execute(f'CREATE TABLE "{registry}" AS SELECT {columns} FROM "{table}"')
+    cursor.execute(f'ALTER TABLE "{registry}" ADD PRIMARY KEY ({columns})')
+    cursor.execute(f"""
+        CREATE FUNCTION "{function}"() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM "{registry}" WHERE ({columns}) = ({old});
+            END IF;
+            IF TG_OP IN ('UPDATE', 'INSERT') THEN
+                INSERT INTO "{registry}" ({columns}) VALUES ({new});
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute(
+        f'CREATE TRIGGER "{registry}_write" AFTER INSERT OR DELETE ON "{table}" '
+        f'FOR EACH ROW EXECUTE FUNCTION "{function}"()'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER "{registry}_update" AFTER UPDATE OF {columns} ON "{table}" '
+        f'FOR EACH ROW WHEN (({old}) IS DISTINCT FROM ({new})) EXECUTE FUNCTION "{function}"()'
+    )
+
+
+def _recreate_indexes_and_constraints(cursor, legacy, table):
+    """
+    Recrée sur la table partitionnée les index et contraintes de l'ancienne
+    table, sous les mêmes noms (ceux attendus par les migrations Django).
+    Clé primaire et contraintes d'unicité doivent inclure la clé de
+    partitionnement; l'unicité seule des colonnes d'origine est conservée
+    par une table de référence (_install_unique_registry).
+    """
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass",
+        [legacy],
+    )
+    constraints = cursor.fetchall()
+    # Index hors contraintes, lus avant le renommage (qui renomme aussi les index des contraintes)
+    cursor.execute(
+        "SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "WHERE i.indrelid = %s::regclass "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)",
+        [legacy],
+    )
+    indexes = cursor.fetchall()
+    for name, _, _ in constraints:
+        cursor.execute(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{name}" TO "{name}_legacy"')
+
+    for name, definition in indexes:
+        name = name.strip('"')
+        cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name}_legacy"')
+        cursor.execute(re.sub(rf' ON (\w+\.)?"?{legacy}"? ', f' ON "{table}" ', definition, count=1))
+
+    for name, contype, definition in constraints:
+        if contype in ('f', 'c'):
+            # LIKE ... INCLUDING DEFAULTS ne copie ni les clés étrangères ni les CHECK
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+        elif contype in ('p', 'u'):
+            keyword = 'PRIMARY KEY' if contype == 'p' else 'UNIQUE'
+            columns = definition[definition.index('(') + 1:definition.rindex(')')]
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {keyword} ({columns}, "created_at")')
+            if contype == 'u':
+                _install_unique_registry(cursor, table, name, columns)
+
+
+def partition_table(cursor, table, months_ahead=3):
+    """
+    Convertit une table ordinaire en table partitionnée par mois sur created_at:
+    renommage, création du parent partitionné et des partitions couvrant les
+    données existantes et les mois à venir, copie des lignes, puis index et
+    contraintes, et suppression de l'ancienne table.
+    """
+    if is_partitioned(cursor, table):
+        return
+    legacy = f'{table}_legacy'
+    # Les colonnes IDENTITY ne sont pas gérées sur les tables partitionnées (< PG 17):
+    # l'identifiant passe sur une séquence dédiée
+    sequence = f'{table}_id_partitioned_seq'
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    cursor.execute(f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS) PARTITION BY RANGE ("created_at")')
+    cursor.execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{table}"."id"')
+    cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{sequence}"\')')
+
+    cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+    cursor.execute(f'SELECT MIN("created_at") FROM "{legacy}"')
+    oldest = cursor.fetchone()[0]
+    month = month_start(timezone.localtime(oldest).date() if oldest else timezone.localdate())
+    last = add_months(timezone.localdate(), months_ahead)
+    while month <= last:
+        create_month_partition(cursor, table, month)
+        month = add_months(month, 1)
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    _recreate_indexes_and_constraints(cursor, legacy, table)
+    cursor.execute(f'SELECT setval(\'"{sequence}"\', COALESCE(MAX("id"), 0) + 1, false) FROM "{table}"')
+    cursor.execute(f'DROP TABLE "{legacy}"')
@@ -0,0 +1,243 @@
+"""
+Profilage à la demande d'une requête, réservé au personnel.
+
+Un membre du personnel (is_staff) ajoute l'en-tête `X-Profile: 1` (ou
+`X-Profile: memory` pour mesurer aussi le pic mémoire avec tracemalloc) à
+n'importe quelle requête de l'API. La requête est alors exécutée sous cProfile
+et avec un QueryRecorder conservant le détail des requêtes SQL. Le rapport est
+stocké dans PROFILING_DIR et son identifiant renvoyé dans l'en-tête
+X-Profile-Id; il se consulte sur /api/profiles/<id>/ (JSON: fonctions les
+plus coûteuses, requêtes SQL avec leur durée, pic mémoire) ou se télécharge
+au format pstats (?download=prof, lisible avec snakeviz ou pstats).
+
+Sans l'en-tête, le coût se limite à la lecture d'une clé de request.META;
+PROFILING_ENABLED=False retire le middleware de la chaîne au démarrage.
+"""
+import cProfile
+import io
+import json
+import logging
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from users.authentication import CachedJWTAuthentication
+
+from .querylog import QueryRecorder
+
+logger = logging.getLogger('api.profiling')
+
+HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+TOP_FUNCTIONS = 40
+
+# tracemalloc est global au processus: une seule mesure mémoire à la fois
+_memory_lock = threading.Lock()
+
+
+def profiling_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def staff_user(request):
+    """Utilisateur du jeton JWT s'il est membre du personnel, sinon None"""
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except APIException:
+        return None
+    if authenticated is None or not authenticated[0].is_staff:
+        return None
+    return authenticated[0]
+
+
+async def astaff_user(request):
+    try:
+        authenticated = await CachedJWTAuthentication().aauthenticate(request)
+    except APIException:
+        return None
+    if authenticated is None or not authenticated[0].is_staff:
+        return None
+    return authenticated[0]
+
+
+def top_functions(profiler, limit=TOP_FUNCTIONS):
+    """Fonctions triées par temps cumulé, au format texte de pstats"""
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return output.getvalue()
+
+
+def prune(directory, keep):
+    """Ne garde que les `keep` rapports les plus récents"""
+    reports = sorted(directory.glob('*.json'), key=lambda path: path.stat().st_mtime, reverse=True)
+    for report in reports[keep:]:
+        report.unlink(missing_ok=True)
+        report.with_suffix('.prof').unlink(missing_ok=True)
+
+
+class ProfileSession:
+    """Mesures d'une requête profilée: cProfile, requêtes SQL, pic mémoire (mode 'memory')"""
+
+    def __init__(self, mode):
+        self.measure_memory = mode == 'memory' and _memory_lock.acquire(blocking=False)
+        self.profiler = cProfile.Profile()
+        self.recorder = QueryRecorder(keep_queries=True)
+        self.duration = None
+        self.peak = None
+
+    def start(self):
+        if self.measure_memory:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        if self.measure_memory:
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _memory_lock.release()
+
+    def __enter__(self):
+        self.start()
+        self.recorder.__enter__()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.recorder.__exit__(*exc_info)
+        self.stop()
+        return False
+
+    async def __aenter__(self):
+        self.start()
+        await self.recorder.__aenter__()
+        self.profiler.enable()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.profiler.disable()
+        await self.recorder.__aexit__(*exc_info)
+        self.stop()
+        return False
+
+
+class ProfilingMiddleware:
+    """
+    Sous ASGI (vues asynchrones), cProfile ne voit que le thread de la boucle
+    d'événements: les requêtes concurrentes peuvent apparaître dans le profil et
+    le code exécuté dans les threads de sync_to_async n'y figure pas; le relevé
+    SQL reste complet.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = request.META.get(HEADER)
+        if not mode:
+            return self.get_response(request)
+        user = staff_user(request)
+        if user is None:
+            return self.get_response(request)
+        with ProfileSession(mode.strip().lower()) as session:
+            response = self.get_response(request)
+        return self.report(request, user, session, response)
+
+    async def __acall__(self, request):
+        mode = request.META.get(HEADER)
+        if not mode:
+            return await self.get_response(request)
+        user = await astaff_user(request)
+        if user is None:
+            return await self.get_response(request)
+        async with ProfileSession(mode.strip().lower()) as session:
+            response = await self.get_response(request)
+        return self.report(request, user, session, response)
+
+    def report(self, request, user, session, response):
+        """Enregistre le rapport dans PROFILING_DIR et l'annonce dans les en-têtes de la réponse"""
+        recorder = session.recorder
+        profile_id = uuid.uuid4().hex
+        report = {
+            'id': profile_id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': user.email,
+            'status': response.status_code,
+            'duration_ms': round(session.duration * 1000, 3),
+            'memory_peak_bytes': session.peak,
+            'sql': {
+                'count': recorder.count,
+                'duration_ms': round(recorder.duration * 1000, 3),
+                'repeated': [
+                    {'sql': shape, 'count': occurrences}
+                    for shape, occurrences in recorder.repeated(settings.METRICS_NPLUS1_THRESHOLD)
+                ],
+                'queries': [
+                    {
+                        'alias': query['alias'],
+                        'sql': query['sql'],
+                        'params': repr(query['params']),
+                        'duration_ms': round(query['duration'] * 1000, 3),
+                    }
+                    for query in recorder.queries
+                ],
+            },
+            'functions': top_functions(session.profiler),
+        }
+        try:
+            directory = profiling_dir()
+            directory.mkdir(parents=True, exist_ok=True)
+            session.profiler.dump_stats(directory / f'{profile_id}.prof')
+            (directory / f'{profile_id}.json').write_text(json.dumps(report, indent=2), encoding='utf-8')
+            prune(directory, settings.PROFILING_KEEP)
+        except OSError:
+            logger.exception('Impossible d\'enregistrer le profil %s', profile_id)
+            return response
+
+        response['X-Profile-Id'] = profile_id
+        response['X-Profile-Duration'] = f'{session.duration * 1000:.1f}ms'
+        response['X-Profile-Queries'] = str(recorder.count)
+        return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_view(request, profile_id):
+    """Rapport de profilage (JSON) ou, avec ?download=prof, le fichier pstats brut"""
+    if not PROFILE_ID.match(profile_id):
+        raise Http404
+    directory = profiling_dir()
+    if request.query_params.get('download') == 'prof':
+        path = directory / f'{profile_id}.prof'
+        if not path.exists():
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'profile_{profile_id}.prof')
+    path = directory / f'{profile_id}.json'
+    if not path.exists():
+        raise Http404
+    return Response(json.loads(path.read_text(encoding='utf-8')))
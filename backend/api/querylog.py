@@ -0,0 +1,124 @@
+"""
+Capture des requêtes SQL exécutées pendant un bloc de code.
+
+Un seul execute_wrapper, `dispatch`, est installé une fois pour toutes sur
+chaque connexion du processus (signal connection_created, voir
+ApiConfig.ready). Il transmet chaque requête aux observateurs actifs du
+contexte courant (ContextVar), posés par `recording()`: une requête HTTP ne
+voit donc que ses propres requêtes SQL, même quand les connexions sont
+partagées, comme celles du thread de sync_to_async sous ASGI (le contexte y
+est copié à chaque appel). Sans observateur actif, le wrapper se contente
+d'appeler la requête.
+
+QueryRecorder compte les requêtes, le temps passé en base et les occurrences
+de chaque « forme » de requête (SQL sans les valeurs), ce qui révèle les
+motifs N+1. Le détail des requêtes (SQL, paramètres, durée) n'est conservé
+qu'à la demande.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+# Observateurs actifs du contexte courant, du plus ancien au plus récent
+_observers = ContextVar('query_observers', default=())
+
+
+def query_shape(sql):
+    """Forme d'une requête: SQL paramétré, listes IN (...) ramenées à une seule valeur"""
+    if ' IN (' in sql:
+        return _IN_LIST.sub('IN (...)', sql)
+    return sql
+
+
+def dispatch(execute, sql, params, many, context):
+    """execute_wrapper du processus: mesure la requête pour les observateurs du contexte courant"""
+    observers = _observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        alias = context['connection'].alias
+        for observer in observers:
+            observer.observe(alias, sql, params, many, elapsed)
+
+
+def install(sender, connection, **kwargs):
+    """Récepteur de connection_created: pose `dispatch` sur la connexion s'il n'y est pas déjà"""
+    if dispatch not in connection.execute_wrappers:
+        # En tête de liste: connection.execute_wrapper() retire toujours le dernier wrapper ajouté
+        connection.execute_wrappers.insert(0, dispatch)
+
+
+@contextmanager
+def recording(observer):
+    """
+    Transmet à `observer.observe(alias, sql, params, many, elapsed)` les requêtes
+    SQL du bloc, y compris celles exécutées par sync_to_async depuis ce contexte
+    """
+    token = _observers.set(_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        _observers.reset(token)
+
+
+class QueryRecorder:
+    """
+    Contexte d'enregistrement des requêtes:
+
+        with QueryRecorder(keep_queries=True) as recorder:
+            ...
+        recorder.count, recorder.duration, recorder.repeated(5), recorder.queries
+
+    (ou `async with` dans du code asynchrone)
+    """
+
+    def __init__(self, keep_queries=False):
+        self.keep_queries = keep_queries
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.queries = []
+        self._context = None
+
+    def observe(self, alias, sql, params, many, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        self.shapes[sql] += 1
+        if self.keep_queries:
+            self.queries.append({
+                'alias': alias,
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'duration': elapsed,
+            })
+
+    def __enter__(self):
+        self._context = recording(self)
+        self._context.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._context.__exit__(*exc_info)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
+
+    def repeated(self, threshold):
+        """Formes exécutées au moins `threshold` fois (N+1 probables), les plus fréquentes d'abord"""
+        grouped = Counter()
+        for sql, occurrences in self.shapes.items():
+            grouped[query_shape(sql)] += occurrences
+        return [(shape, occurrences) for shape, occurrences in grouped.most_common() if occurrences >= threshold]
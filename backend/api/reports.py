@@ -1,18 +1,36 @@
+from datetime import timedelta
 from django.http import HttpResponse
 from django.utils import timezone
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import F
-from api.models import Medicine, MedicineGroup, Supplier, Client, Sale
+from rest_framework import status
+from rest_framework.response import Response
+from api.archive import sales_summary
+from api.branches import scope_to_branch, user_branch, user_branch_id
+from api.routing import replica_reads
+from api.models import BranchStock, Medicine, MedicineGroup, Supplier, Client
+from api.valuation import stock_valuation
+from api.views import parse_period
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def download_dashboard_report(request):
+    # ReportLab n'est chargé qu'à la première génération de rapport (démarrage plus rapide)
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    user = request.user
+    branch = user_branch(user)
+    try:
+        period_start, period_end = parse_period(request.query_params)
+    except ValueError:
+        return Response({'error': 'Date invalide (format AAAA-MM-JJ)'}, status=status.HTTP_400_BAD_REQUEST)
+
     # Créer la réponse HTTP avec le type PDF
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="rapport_dashboard_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
@@ -33,7 +51,9 @@ def download_dashboard_report(request):
     )
 
     # Titre
-    title = Paragraph("Rapport du Tableau de bord - Pharmacie Fadj-Ma", title_style)
+    title = Paragraph(
+        f"Rapport du Tableau de bord - {branch.name if branch else 'Pharmacie Fadj-Ma'}", title_style
+    )
     elements.append(title)
 
     # Date
@@ -48,27 +68,27 @@ def download_dashboard_report(request):
     elements.append(date_text)
     elements.append(Spacer(1, 1*cm))
 
-    # Récupérer les données
+    # Récupérer les données (limitées à la pharmacie de l'utilisateur, s'il en a une)
     medicines = Medicine.objects.all()
     groups = MedicineGroup.objects.all()
     suppliers = Supplier.objects.all()
-    clients = Client.objects.all()
-    sales = Sale.objects.all()
+    clients = scope_to_branch(Client.objects.all(), user)
 
     # Calculer les statistiques
     medicines_count = medicines.count()
-    low_stock_count = medicines.filter(stock_quantity__lte=F('min_stock_alert')).count()
-    medicines_available = medicines.filter(stock_quantity__gt=0).count()
+    if branch is None:
+        low_stock_count = medicines.filter(stock_quantity__lte=F('min_stock_alert')).count()
+        medicines_available = medicines.filter(stock_quantity__gt=0).count()
+    else:
+        stocks = BranchStock.objects.filter(branch=branch)
+        low_stock_count = stocks.filter(stock_quantity__lte=F('min_stock_alert')).count()
+        medicines_available = stocks.filter(stock_quantity__gt=0).count()
     groups_count = groups.count()
     suppliers_count = suppliers.count()
     clients_count = clients.count()
 
-    total_revenue = sum(sale.total_amount for sale in sales)
-    total_quantity_sold = sum(
-        item.quantity
-        for sale in sales
-        for item in sale.items.all()
-    )
+    # Ventes de la période (tout l'historique par défaut), mois archivés compris
+    sales_totals = sales_summary(user_branch_id(user), period_start, period_end)
 
     # Section 1: Statistiques générales
     section_title = Paragraph("<b>Statistiques Générales</b>", styles['Heading2'])
@@ -105,15 +125,21 @@ def download_dashboard_report(request):
     elements.append(Spacer(1, 1*cm))
 
     # Section 2: Finances
-    section_title = Paragraph("<b>Finances</b>", styles['Heading2'])
+    period = ''
+    if period_start or period_end:
+        period = ' ({} - {})'.format(
+            timezone.localtime(period_start).strftime('%d/%m/%Y') if period_start else '…',
+            timezone.localtime(period_end - timedelta(days=1)).strftime('%d/%m/%Y') if period_end else '…',
+        )
+    section_title = Paragraph(f"<b>Finances{period}</b>", styles['Heading2'])
     elements.append(section_title)
     elements.append(Spacer(1, 0.5*cm))
 
     finance_data = [
         ['Indicateur', 'Valeur'],
-        ['Revenu total', f'{total_revenue:,.0f} FCFA'],
-        ['Nombre de ventes', str(sales.count())],
-        ['Quantité vendue', str(total_quantity_sold)],
+        ['Revenu total', f'{sales_totals["revenue"]:,.0f} FCFA'],
+        ['Nombre de ventes', str(sales_totals['count'])],
+        ['Quantité vendue', str(sales_totals['quantity'])],
     ]
 
     finance_table = Table(finance_data, colWidths=[10*cm, 5*cm])
@@ -134,19 +160,67 @@ def download_dashboard_report(request):
     elements.append(finance_table)
     elements.append(Spacer(1, 1*cm))
 
-    # Section 3: Top 5 médicaments
+    # Section 3: Valorisation du stock
+    section_title = Paragraph("<b>Valorisation du stock (coût moyen pondéré)</b>", styles['Heading2'])
+    elements.append(section_title)
+    elements.append(Spacer(1, 0.5*cm))
+
+    valuation = stock_valuation(branch=branch)
+    valuation_data = [
+        ['Groupe', 'Quantité', 'Valeur au coût', 'Valeur de vente'],
+        *[
+            [
+                row['group_name'] or 'Sans groupe',
+                str(row['quantity']),
+                f"{row['cost_value']:,.0f} FCFA",
+                f"{row['retail_value']:,.0f} FCFA",
+            ]
+            for row in valuation['by_group']
+        ],
+        [
+            'Total',
+            str(valuation['totals']['quantity']),
+            f"{valuation['totals']['cost_value']:,.0f} FCFA",
+            f"{valuation['totals']['retail_value']:,.0f} FCFA",
+        ],
+    ]
+
+    valuation_table = Table(valuation_data, colWidths=[6*cm, 2.5*cm, 3.5*cm, 3.5*cm])
+    valuation_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#27AE60')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ]))
+
+    elements.append(valuation_table)
+    elements.append(Spacer(1, 1*cm))
+
+    # Section 4: Top 5 médicaments
     section_title = Paragraph("<b>Top 5 Médicaments (Stock le plus élevé)</b>", styles['Heading2'])
     elements.append(section_title)
     elements.append(Spacer(1, 0.5*cm))
 
-    top_medicines = medicines.order_by('-stock_quantity')[:5]
+    if branch is None:
+        top_medicines = medicines.order_by('-stock_quantity').values_list('name', 'stock_quantity', 'selling_price')[:5]
+    else:
+        top_medicines = stocks.order_by('-stock_quantity').values_list(
+            'medicine__name', 'stock_quantity', 'medicine__selling_price'
+        )[:5]
     medicines_data = [['Nom', 'Stock', 'Prix de vente']]
 
-    for med in top_medicines:
+    for name, stock_quantity, selling_price in top_medicines:
         medicines_data.append([
-            med.name,
-            str(med.stock_quantity),
-            f'{med.selling_price:,.0f} FCFA'
+            name,
+            str(stock_quantity),
+            f'{selling_price:,.0f} FCFA'
         ])
 
     medicines_table = Table(medicines_data, colWidths=[8*cm, 3*cm, 4*cm])
@@ -0,0 +1,36 @@
+"""
+Branchement des vues DRF sur le routeur réplica (config/db_router.py).
+"""
+from functools import wraps
+
+from rest_framework.permissions import SAFE_METHODS
+
+from config import db_router
+
+
+class ReplicaReadMixin:
+    """
+    Mixin de vue DRF: les requêtes en lecture seule (GET, HEAD, OPTIONS) lisent
+    sur le réplica; les écritures rendent l'utilisateur « collant » au primaire.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with db_router.routing_context():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        db_router.bind_user(request.user)
+        if request.method in SAFE_METHODS:
+            db_router.use_replica()
+
+
+def replica_reads(view):
+    """Décorateur pour les vues fonctions (sous @api_view) en lecture seule"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with db_router.routing_context():
+            db_router.bind_user(request.user)
+            db_router.use_replica()
+            return view(request, *args, **kwargs)
+    return wrapper
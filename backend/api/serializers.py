@@ -1,5 +1,32 @@
+from decimal import Decimal
+
+from django.db import models, transaction
 from rest_framework import serializers
-from .models import MedicineGroup, Supplier, Client, Medicine,Sale,SaleItem
+from . import events
+from .branches import user_branch_id
+from .models import (
+    Branch, BranchStock, MedicineGroup, Supplier, Client, Medicine, Sale, SaleItem,
+    PurchaseOrder, PurchaseOrderItem, GoodsReceipt, GoodsReceiptItem, StocktakeSession,
+    SlowQuery, AuditEntry,
+)
+from .stock import bulk_update_stock, decrement_stock, increment_stock, merge_quantities, record_movements
+
+class BranchSerializer(serializers.ModelSerializer):
+    """Serializer pour les pharmacies"""
+
+    class Meta:
+        model = Branch
+        fields = [
+            'id',
+            'name',
+            'code',
+            'address',
+            'phone',
+            'is_active',
+            'created_at',
+            'updated_at'
+        ]
+        read_only_fields = ['id', 'created_at', 'updated_at']
 
 class MedicineGroupSerializer(serializers.ModelSerializer):
     """Serializer pour les groupes de médicaments"""
@@ -55,6 +82,7 @@ class ClientSerializer(serializers.ModelSerializer):
         model = Client
         fields = [
             'id',
+            'branch',
             'first_name',
             'last_name',
             'full_name',
@@ -67,7 +95,7 @@ class ClientSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at'
         ]
-        read_only_fields = ['id', 'full_name', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'branch', 'full_name', 'created_at', 'updated_at']
 
     def get_purchases_count(self, obj):
         """Retourne le nombre d'achats du client"""
@@ -84,9 +112,12 @@ class MedicineSerializer(serializers.ModelSerializer):
     # Propriétés calculées
     is_low_stock = serializers.ReadOnlyField()
     profit_margin = serializers.ReadOnlyField()
+    branch_stock_quantity = serializers.SerializerMethodField()
 
-    # Image
+    # Image (les variantes WebP sont générées à l'envoi)
     image = serializers.ImageField(required=False, allow_null=True, use_url=True)
+    image_thumbnail = serializers.ImageField(read_only=True, use_url=True)
+    image_detail = serializers.ImageField(read_only=True, use_url=True)
 
     class Meta:
         model = Medicine
@@ -99,6 +130,7 @@ class MedicineSerializer(serializers.ModelSerializer):
             'supplier',
             'supplier_detail',
             'stock_quantity',
+            'branch_stock_quantity',
             'min_stock_alert',
             'is_low_stock',
             'composition',
@@ -114,6 +146,8 @@ class MedicineSerializer(serializers.ModelSerializer):
             'selling_price',
             'profit_margin',
             'image',
+            'image_thumbnail',
+            'image_detail',
             'created_by',
             'created_by_name',
             'created_at',
@@ -124,12 +158,17 @@ class MedicineSerializer(serializers.ModelSerializer):
             'medicine_id',
             'is_low_stock',
             'profit_margin',
+            'branch_stock_quantity',
             'created_by',
             'created_by_name',
             'created_at',
             'updated_at'
         ]
 
+    def get_branch_stock_quantity(self, obj):
+        """Stock de la pharmacie de l'utilisateur (annoté par le ViewSet)"""
+        return getattr(obj, 'branch_stock_quantity', None)
+
     def create(self, validated_data):
         """Ajouter l'utilisateur connecté comme créateur"""
         validated_data['created_by'] = self.context['request'].user
@@ -157,6 +196,11 @@ class SaleItemSerializer(serializers.ModelSerializer):
         medicine = data.get('medicine')
         quantity = data.get('quantity')
 
+        # Le stock d'une pharmacie est vérifié pour toute la vente par SaleSerializer
+        request = self.context.get('request')
+        if request and user_branch_id(request.user) is not None:
+            return data
+
         if medicine and quantity:
             if medicine.stock_quantity < quantity:
                 raise serializers.ValidationError({
@@ -178,6 +222,7 @@ class SaleSerializer(serializers.ModelSerializer):
         fields = [
             'id',
             'sale_number',
+            'branch',
             'client',
             'client_name',
             'total_amount',
@@ -188,8 +233,34 @@ class SaleSerializer(serializers.ModelSerializer):
             'items',
             'created_at'
         ]
-        read_only_fields = ['id', 'sale_number', 'total_amount', 'sold_by', 'created_at']
+        read_only_fields = ['id', 'sale_number', 'branch', 'total_amount', 'sold_by', 'created_at']
+
+    def validate(self, data):
+        """Vérifier client et stock de la pharmacie du vendeur (une requête pour toutes les lignes)"""
+        branch_id = user_branch_id(self.context['request'].user)
+        if branch_id is None:
+            return data
+
+        client = data.get('client')
+        if client and client.branch_id not in (None, branch_id):
+            raise serializers.ValidationError({'client': "Client d'une autre pharmacie."})
 
+        requested = merge_quantities(
+            (item['medicine'].pk, item['quantity']) for item in data.get('items', [])
+        )
+        available = dict(
+            BranchStock.objects.filter(branch_id=branch_id, medicine_id__in=requested)
+            .values_list('medicine_id', 'stock_quantity')
+        )
+        errors = {
+            pk: f'Stock insuffisant. Disponible: {available.get(pk, 0)}'
+            for pk, quantity in requested.items() if available.get(pk, 0) < quantity
+        }
+        if errors:
+            raise serializers.ValidationError({'items': errors})
+        return data
+
+    @transaction.atomic
     def create(self, validated_data):
         """Créer une vente avec ses lignes"""
         items_data = validated_data.pop('items')
@@ -207,23 +278,454 @@ class SaleSerializer(serializers.ModelSerializer):
         # Créer la vente
         sale = Sale.objects.create(**validated_data)
 
-        # Créer les lignes de vente et mettre à jour le stock
-        for item_data in items_data:
-            medicine = item_data['medicine']
-            quantity = item_data['quantity']
-            unit_price = item_data['unit_price']
-
-            # Créer la ligne
-            SaleItem.objects.create(
+        # Créer les lignes de vente
+        SaleItem.objects.bulk_create([
+            SaleItem(
                 sale=sale,
-                medicine=medicine,
-                quantity=quantity,
-                unit_price=unit_price,
-                total_price=quantity * unit_price
+                branch=sale.branch,
+                medicine=item_data['medicine'],
+                quantity=item_data['quantity'],
+                unit_price=item_data['unit_price'],
+                total_price=item_data['quantity'] * item_data['unit_price'],
+                created_at=sale.created_at,
+            )
+            for item_data in items_data
+        ])
+        events.sale_created(sale, items_data)
+
+        # Mettre à jour le stock et l'historique des mouvements
+        lines = [(item['medicine'].pk, item['quantity']) for item in items_data]
+        decrement_stock(lines, branch=sale.branch)
+        record_movements(
+            'sale',
+            [(pk, -quantity, None) for pk, quantity in lines],
+            reference=sale.sale_number,
+            user=sale.sold_by,
+            branch=sale.branch,
+        )
+
+        return sale
+
+
+def resolve_medicines(items_data):
+    """Charge en une requête les médicaments référencés par des lignes (medicine_id = pk)"""
+    pks = {item['medicine_id'] for item in items_data}
+    medicines = Medicine.objects.in_bulk(pks)
+    missing = sorted(pks - medicines.keys())
+    if missing:
+        raise serializers.ValidationError(
+            f"Médicaments introuvables: {', '.join(str(pk) for pk in missing)}"
+        )
+    return medicines
+
+
+class PurchaseOrderItemSerializer(serializers.ModelSerializer):
+    """Serializer pour les lignes de commande"""
+
+    medicine = serializers.IntegerField(source='medicine_id')
+    medicine_name = serializers.CharField(source='medicine.name', read_only=True)
+    quantity_pending = serializers.ReadOnlyField()
+
+    class Meta:
+        model = PurchaseOrderItem
+        fields = [
+            'id',
+            'medicine',
+            'medicine_name',
+            'quantity_ordered',
+            'quantity_received',
+            'quantity_pending',
+            'unit_cost'
+        ]
+        read_only_fields = ['id', 'quantity_received', 'quantity_pending']
+
+
+class PurchaseOrderSerializer(serializers.ModelSerializer):
+    """Serializer pour les bons de commande"""
+
+    items = PurchaseOrderItemSerializer(many=True)
+    supplier_name = serializers.CharField(source='supplier.name', read_only=True)
+    created_by_name = serializers.CharField(source='created_by.full_name', read_only=True)
+
+    class Meta:
+        model = PurchaseOrder
+        fields = [
+            'id',
+            'order_number',
+            'branch',
+            'supplier',
+            'supplier_name',
+            'status',
+            'expected_date',
+            'notes',
+            'items',
+            'created_by',
+            'created_by_name',
+            'created_at',
+            'updated_at'
+        ]
+        read_only_fields = ['id', 'order_number', 'branch', 'created_by', 'created_at', 'updated_at']
+
+    def validate_items(self, items_data):
+        """Vérifier les lignes (au moins une, médicaments existants et uniques)"""
+        if not items_data:
+            raise serializers.ValidationError("La commande doit contenir au moins une ligne.")
+        pks = [item['medicine_id'] for item in items_data]
+        if len(pks) != len(set(pks)):
+            raise serializers.ValidationError("Un médicament ne peut apparaître qu'une fois par commande.")
+        resolve_medicines(items_data)
+        return items_data
+
+    def validate_status(self, value):
+        """Seules les transitions manuelles sont permises; une commande réceptionnée garde son statut"""
+        if value in ('partial', 'received'):
+            raise serializers.ValidationError("Ce statut est fixé par les réceptions.")
+        if self.instance is None:
+            if value not in PurchaseOrder.MANUAL_TRANSITIONS:
+                raise serializers.ValidationError("Une commande est créée en brouillon ou commandée.")
+        elif value != self.instance.status and value not in PurchaseOrder.MANUAL_TRANSITIONS.get(self.instance.status, ()):
+            raise serializers.ValidationError(
+                f"Passage de « {self.instance.get_status_display()} » à « {dict(PurchaseOrder.STATUS_CHOICES)[value]} » impossible."
+            )
+        return value
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        if 'items' in validated_data:
+            raise serializers.ValidationError({
+                'items': "Les lignes d'une commande ne sont pas modifiables."
+            })
+        if 'status' in validated_data:
+            # Relu sous verrou: une réception concurrente a pu changer le statut depuis la validation
+            instance.status = PurchaseOrder.objects.select_for_update().values_list('status', flat=True).get(pk=instance.pk)
+            self.validate_status(validated_data['status'])
+        return super().update(instance, validated_data)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """Créer une commande avec ses lignes"""
+        items_data = validated_data.pop('items')
+        validated_data['created_by'] = self.context['request'].user
+        order = PurchaseOrder.objects.create(**validated_data)
+        PurchaseOrderItem.objects.bulk_create([
+            PurchaseOrderItem(order=order, **item_data) for item_data in items_data
+        ])
+        return order
+
+
+class GoodsReceiptItemSerializer(serializers.ModelSerializer):
+    """Serializer pour les lignes de réception"""
+
+    medicine = serializers.IntegerField(source='medicine_id')
+    medicine_name = serializers.CharField(source='medicine.name', read_only=True)
+
+    class Meta:
+        model = GoodsReceiptItem
+        fields = [
+            'id',
+            'medicine',
+            'medicine_name',
+            'quantity',
+            'unit_cost'
+        ]
+        read_only_fields = ['id']
+
+
+class GoodsReceiptSerializer(serializers.ModelSerializer):
+    """Serializer pour les réceptions de marchandises"""
+
+    items = GoodsReceiptItemSerializer(many=True)
+    supplier_name = serializers.CharField(source='supplier.name', read_only=True)
+    received_by_name = serializers.CharField(source='received_by.full_name', read_only=True)
+
+    class Meta:
+        model = GoodsReceipt
+        fields = [
+            'id',
+            'receipt_number',
+            'branch',
+            'supplier',
+            'supplier_name',
+            'purchase_order',
+            'delivery_reference',
+            'notes',
+            'items',
+            'received_by',
+            'received_by_name',
+            'received_at'
+        ]
+        read_only_fields = ['id', 'receipt_number', 'branch', 'received_by', 'received_at']
+
+    def validate(self, data):
+        """Vérifier la cohérence avec la commande et les médicaments"""
+        items_data = data.get('items') or []
+        if not items_data:
+            raise serializers.ValidationError({'items': "La réception doit contenir au moins une ligne."})
+        resolve_medicines(items_data)
+
+        order = data.get('purchase_order')
+        if order:
+            branch_id = user_branch_id(self.context['request'].user)
+            if branch_id is not None and order.branch_id != branch_id:
+                raise serializers.ValidationError({
+                    'purchase_order': "Commande d'une autre pharmacie."
+                })
+            if order.supplier_id != data['supplier'].pk:
+                raise serializers.ValidationError({
+                    'purchase_order': "La commande appartient à un autre fournisseur."
+                })
+            if order.status in ('cancelled', 'received'):
+                raise serializers.ValidationError({
+                    'purchase_order': f"Commande {order.get_status_display().lower()}."
+                })
+            ordered = set(order.items.values_list('medicine_id', flat=True))
+            unexpected = sorted({item['medicine_id'] for item in items_data} - ordered)
+            if unexpected:
+                raise serializers.ValidationError({
+                    'items': f"Médicaments absents de la commande: {', '.join(map(str, unexpected))}"
+                })
+        return data
+
+    @staticmethod
+    def lock_order_items(order, received):
+        """
+        Verrouille la commande et ses lignes reçues, puis vérifie que la réception
+        ne dépasse pas le reliquat (quantité commandée moins réceptions antérieures).
+        Deux réceptions simultanées de la même commande passent ainsi l'une après l'autre.
+        """
+        status = PurchaseOrder.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+        if status in ('cancelled', 'received'):
+            raise serializers.ValidationError({
+                'purchase_order': f"Commande {dict(PurchaseOrder.STATUS_CHOICES)[status].lower()}."
+            })
+        order_items = {
+            item.medicine_id: item
+            for item in order.items.select_for_update().filter(medicine_id__in=received)
+        }
+        excess = [
+            f"{medicine_pk} ({quantity} pour {order_items[medicine_pk].quantity_pending} attendus)"
+            for medicine_pk, quantity in sorted(received.items())
+            if quantity > order_items[medicine_pk].quantity_pending
+        ]
+        if excess:
+            raise serializers.ValidationError({
+                'items': f"Quantités au-delà du reliquat de la commande: {', '.join(excess)}"
+            })
+        return order_items
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """
+        Créer une réception et incrémenter le stock en une seule transaction.
+        Les variations sont appliquées en requêtes ensemblistes, pas ligne par ligne.
+        """
+        items_data = validated_data.pop('items')
+        received = merge_quantities(
+            (item['medicine_id'], item['quantity']) for item in items_data
+        )
+        order = validated_data.get('purchase_order')
+        # Verrou pris avant toute écriture, pour contrôler le reliquat sur des lignes figées
+        order_items = self.lock_order_items(order, received) if order else None
+
+        validated_data['received_by'] = self.context['request'].user
+        receipt = GoodsReceipt.objects.create(**validated_data)
+
+        GoodsReceiptItem.objects.bulk_create([
+            GoodsReceiptItem(receipt=receipt, **item_data) for item_data in items_data
+        ])
+        increment_stock(received.items(), branch=receipt.branch)
+        record_movements(
+            'receipt',
+            [(item['medicine_id'], item['quantity'], item['unit_cost']) for item in items_data],
+            reference=receipt.receipt_number,
+            user=receipt.received_by,
+            branch=receipt.branch,
+        )
+
+        if order:
+            bulk_update_stock(
+                {order_items[medicine_pk].pk: quantity for medicine_pk, quantity in received.items()},
+                model=PurchaseOrderItem,
+                field_name='quantity_received',
+            )
+            pending = order.items.filter(quantity_received__lt=models.F('quantity_ordered')).exists()
+            order.status = 'partial' if pending else 'received'
+            order.save(update_fields=['status', 'updated_at'])
+
+        return receipt
+
+
+class StocktakeSessionSerializer(serializers.ModelSerializer):
+    """Serializer pour les sessions d'inventaire"""
+
+    lines_count = serializers.IntegerField(read_only=True)
+    created_by_name = serializers.CharField(source='created_by.full_name', read_only=True)
+    approved_by_name = serializers.CharField(source='approved_by.full_name', read_only=True)
+
+    class Meta:
+        model = StocktakeSession
+        fields = [
+            'id',
+            'reference',
+            'branch',
+            'status',
+            'notes',
+            'lines_count',
+            'created_by',
+            'created_by_name',
+            'approved_by',
+            'approved_by_name',
+            'created_at',
+            'approved_at'
+        ]
+        read_only_fields = [
+            'id', 'reference', 'branch', 'status', 'created_by', 'approved_by', 'created_at', 'approved_at'
+        ]
+
+    def create(self, validated_data):
+        validated_data['created_by'] = self.context['request'].user
+        return super().create(validated_data)
+
+
+class StocktakeCountSerializer(serializers.Serializer):
+    """Ligne de comptage envoyée en JSON"""
+
+    medicine_id = serializers.CharField(max_length=50)
+    counted_quantity = serializers.IntegerField(min_value=0)
+
+
+class StocktakeUploadSerializer(serializers.Serializer):
+    """Import de comptages: fichier CSV ou liste JSON"""
+
+    file = serializers.FileField(required=False)
+    counts = serializers.ListField(child=serializers.DictField(), required=False)
+    replace = serializers.BooleanField(default=True)
+
+    def validate(self, data):
+        if not data.get('file') and not data.get('counts'):
+            raise serializers.ValidationError("Fournir un fichier CSV (file) ou une liste de comptages (counts).")
+        return data
+
+
+class MedicineSelectionSerializer(serializers.Serializer):
+    """Médicaments visés par une mise à jour en masse (critères cumulés)"""
+
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    group = serializers.PrimaryKeyRelatedField(queryset=MedicineGroup.objects.all(), required=False)
+    supplier = serializers.PrimaryKeyRelatedField(queryset=Supplier.objects.all(), required=False)
+    consumption_type = serializers.ChoiceField(choices=Medicine.CONSUMPTION_TYPES, required=False)
+    pharmaceutical_form = serializers.ChoiceField(choices=Medicine.PHARMACEUTICAL_FORMS, required=False)
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not data['all'] and len(data) == 1:
+            raise serializers.ValidationError(
+                "Préciser au moins un critère, ou all=true pour tout le catalogue."
             )
+        return data
+
+
+class PriceRuleSerializer(serializers.Serializer):
+    """Variation de prix propre à un groupe ou à un fournisseur"""
+
+    group = serializers.PrimaryKeyRelatedField(queryset=MedicineGroup.objects.all(), required=False)
+    supplier = serializers.PrimaryKeyRelatedField(queryset=Supplier.objects.all(), required=False)
+    value = serializers.DecimalField(max_digits=12, decimal_places=4)
+
+    def validate(self, data):
+        if ('group' in data) == ('supplier' in data):
+            raise serializers.ValidationError("Une règle vise soit un groupe, soit un fournisseur.")
+        return data
+
+
+class PriceChangeSerializer(serializers.Serializer):
+    """
+    Variation d'un prix: en pourcentage (+5 = +5 %) ou en montant absolu
+    (FCFA ajoutés, négatif pour une baisse). Les règles par groupe ou par
+    fournisseur l'emportent sur `value` (première règle applicable).
+    """
+
+    PRICE_FIELDS = [('selling_price', 'Prix de vente'), ('purchase_price', "Prix d'achat")]
+    MODES = [('percent', 'Pourcentage'), ('absolute', 'Montant')]
+
+    field = serializers.ChoiceField(choices=PRICE_FIELDS, default='selling_price')
+    mode = serializers.ChoiceField(choices=MODES)
+    value = serializers.DecimalField(max_digits=12, decimal_places=4, required=False)
+    rules = PriceRuleSerializer(many=True, required=False)
+    round_to = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'), required=False)
+
+    def validate(self, data):
+        if 'value' not in data and not data.get('rules'):
+            raise serializers.ValidationError("Préciser une variation (value) ou des règles (rules).")
+        if data['mode'] == 'percent':
+            values = [data.get('value')] + [rule['value'] for rule in data.get('rules', [])]
+            if any(value is not None and value <= -100 for value in values):
+                raise serializers.ValidationError("Une baisse en pourcentage doit rester supérieure à -100 %.")
+        return data
+
+
+class MedicineAttributesSerializer(serializers.ModelSerializer):
+    """Attributs affectés à tous les médicaments sélectionnés"""
+
+    class Meta:
+        model = Medicine
+        fields = [
+            'group', 'supplier', 'min_stock_alert', 'manufacturer', 'consumption_type',
+            'pharmaceutical_form', 'expiration_date', 'purchase_price', 'selling_price',
+        ]
+        extra_kwargs = {field: {'required': False} for field in fields}
+
 
-            # Mettre à jour le stock
-            medicine.stock_quantity -= quantity
-            medicine.save()
+class MedicineBulkUpdateSerializer(serializers.Serializer):
+    """Mise à jour en masse des médicaments (prix et attributs)"""
 
-        return sale
\ No newline at end of file
+    filter = MedicineSelectionSerializer()
+    price = PriceChangeSerializer(required=False)
+    set = MedicineAttributesSerializer(required=False)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        attributes = data.get('set') or {}
+        if 'price' not in data and not attributes:
+            raise serializers.ValidationError("Préciser une variation de prix (price) ou des attributs (set).")
+        if 'price' in data and data['price']['field'] in attributes:
+            raise serializers.ValidationError(
+                f"{data['price']['field']} ne peut être à la fois modifié par price et par set."
+            )
+        return data
+
+
+class CatalogImportSerializer(serializers.Serializer):
+    """Import du catalogue: fichier CSV ou XLSX"""
+
+    file = serializers.FileField()
+    create_groups = serializers.BooleanField(default=False)
+    dry_run = serializers.BooleanField(default=False)
+
+
+class SlowQuerySerializer(serializers.ModelSerializer):
+    """Requête SQL lente (lecture seule)"""
+
+    user_email = serializers.EmailField(source='user.email', read_only=True, default=None)
+
+    class Meta:
+        model = SlowQuery
+        fields = [
+            'id', 'endpoint', 'method', 'path', 'query_params', 'database', 'sql', 'params',
+            'duration_ms', 'plan', 'user', 'user_email', 'created_at',
+        ]
+        read_only_fields = fields
+
+
+class AuditEntrySerializer(serializers.ModelSerializer):
+    """Entrée du journal d'audit (lecture seule)"""
+
+    actor_email = serializers.EmailField(source='actor.email', read_only=True, default=None)
+
+    class Meta:
+        model = AuditEntry
+        fields = [
+            'id', 'object_type', 'object_id', 'object_repr', 'action', 'changes', 'actor', 'actor_email',
+            'created_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import audit, changes, events
+from .models import CatalogDeletion, Client, Medicine, MedicineGroup, Supplier
+
+DELETION_KINDS = {Medicine: 'medicine', MedicineGroup: 'group', Supplier: 'supplier'}
+
+
+@receiver(post_save, sender=Medicine)
+def announce_stock(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Stock modifié par l'enregistrement de la fiche d'un médicament"""
+    if raw:
+        return
+    if update_fields is None or 'stock_quantity' in update_fields:
+        events.stock_changed([instance.pk])
+
+
+# Numéros de modification sur les bases sans séquence (sous PostgreSQL, les triggers s'en chargent)
+
+@receiver(pre_save, sender=Medicine)
+@receiver(pre_save, sender=MedicineGroup)
+@receiver(pre_save, sender=Supplier)
+def number_change(sender, instance, using, **kwargs):
+    if not changes.uses_sequence(using):
+        instance.change_seq = instance.change_xid = changes.allocate(1, using)[0]
+
+
+@receiver(pre_delete, sender=MedicineGroup)
+@receiver(pre_delete, sender=Supplier)
+def number_detached_medicines(sender, instance, using, **kwargs):
+    """Médicaments dont le groupe ou le fournisseur va passer à NULL"""
+    if not changes.uses_sequence(using):
+        field = 'group' if sender is MedicineGroup else 'supplier'
+        changes.touch(Medicine, Medicine.objects.using(using).filter(**{field: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Medicine)
+@receiver(post_delete, sender=MedicineGroup)
+@receiver(post_delete, sender=Supplier)
+def record_deletion(sender, instance, using, **kwargs):
+    if not changes.uses_sequence(using):
+        number = changes.allocate(1, using)[0]
+        CatalogDeletion.objects.using(using).create(
+            kind=DELETION_KINDS[sender], object_id=instance.pk, change_seq=number, change_xid=number
+        )
+
+
+# Journal d'audit (api/audit.py): anciennes valeurs lues avant l'enregistrement, entrées écrites après validation
+
+@receiver(pre_save, sender=Medicine)
+@receiver(pre_save, sender=Supplier)
+@receiver(pre_save, sender=Client)
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_audited_values(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    if settings.AUDIT_ENABLED and not raw:
+        instance._audit_previous = audit.previous_values(instance, using, update_fields)
+
+
+@receiver(post_save, sender=Medicine)
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def audit_save(sender, instance, created, raw=False, using=None, **kwargs):
+    if settings.AUDIT_ENABLED and not raw:
+        audit.record_save(instance, created, instance.__dict__.pop('_audit_previous', None), using)
+
+
+@receiver(post_delete, sender=Medicine)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def audit_delete(sender, instance, using, **kwargs):
+    if settings.AUDIT_ENABLED:
+        audit.record_delete(instance, using)
@@ -0,0 +1,193 @@
+"""
+Relevé des requêtes SQL lentes avec leur plan d'exécution.
+
+SlowQueryMiddleware observe le temps de chaque requête HTTP ses requêtes SQL
+(api/querylog.py): toute requête SQL plus longue que SLOW_QUERY_MS est gardée (au plus SLOW_QUERY_MAX_PER_REQUEST), puis confiée
+une fois la réponse produite à un thread du processus qui l'enregistre en base
+(modèle SlowQuery) avec le point d'accès, le chemin et les paramètres de la
+requête HTTP. La réponse n'attend ni l'EXPLAIN ni l'écriture; au-delà de
+MAX_PENDING relevés en attente, les suivants sont abandonnés.
+
+Une fraction SLOW_QUERY_EXPLAIN_RATE des SELECT relevés est rejouée par ce
+thread sous EXPLAIN (ANALYZE, BUFFERS) (PostgreSQL; EXPLAIN QUERY PLAN sous
+SQLite, sans exécution), dans une transaction toujours annulée et avec un
+statement_timeout. Ne sont jamais rejoués: les écritures, y compris dans une
+CTE (WITH ... UPDATE), les SELECT ... FOR UPDATE, les SELECT sans FROM
+(appels de fonction seuls) et les appels de fonctions à effet de bord
+(verrous consultatifs, séquences, notifications).
+
+Consultation (personnel uniquement): /api/slow-queries/ et l'administration.
+"""
+import logging
+import os
+import queue
+import random
+import re
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .metrics import endpoint_labels
+from .models import SlowQuery
+from .querylog import recording
+
+logger = logging.getLogger('api.slowqueries')
+
+_SELECT = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+_LOCKING = re.compile(r'\bFOR\s+(UPDATE|SHARE|NO KEY UPDATE|KEY SHARE)\b', re.IGNORECASE)
+_WRITING = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE)\b', re.IGNORECASE)
+_FROM = re.compile(r'\bFROM\b', re.IGNORECASE)
+_SIDE_EFFECTS = re.compile(
+    r'\b(pg_(try_)?advisory\w*|nextval|setval|pg_notify|set_config|pg_cancel_backend|pg_terminate_backend|lo_\w+)\s*\(',
+    re.IGNORECASE,
+)
+MAX_PARAMS_LENGTH = 2000
+# Relevés en attente d'enregistrement au plus (par processus)
+MAX_PENDING = 1000
+
+
+def is_explainable(sql, many):
+    """SELECT en lecture seule, sans effet de bord s'il est exécuté une seconde fois"""
+    return (
+        not many and bool(_SELECT.match(sql)) and bool(_FROM.search(sql))
+        and not _LOCKING.search(sql) and not _WRITING.search(sql) and not _SIDE_EFFECTS.search(sql)
+    )
+
+
+def explain(alias, sql, params):
+    """Plan d'exécution de la requête, ou '' si la base ne le permet pas ou en cas d'erreur"""
+    connection = connections[alias]
+    plan = ''
+    try:
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}')
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            elif connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+            # La requête est réellement exécutée par ANALYZE: rien n'en est jamais validé
+            transaction.set_rollback(True, using=alias)
+    except DatabaseError:
+        logger.warning('EXPLAIN impossible pour une requête lente', exc_info=True)
+    return plan
+
+
+class SlowQueryCollector:
+    """Observateur (querylog.recording) gardant les requêtes SQL au-delà du seuil"""
+
+    def __init__(self, threshold, limit):
+        self.threshold = threshold
+        self.limit = limit
+        self.queries = []
+
+    def observe(self, alias, sql, params, many, elapsed):
+        if elapsed >= self.threshold and len(self.queries) < self.limit:
+            self.queries.append((alias, sql, params, many, elapsed))
+
+
+class SlowQueryMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.SLOW_QUERY_MS <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        collector = SlowQueryCollector(settings.SLOW_QUERY_MS / 1000, settings.SLOW_QUERY_MAX_PER_REQUEST)
+        with recording(collector):
+            response = self.get_response(request)
+        if collector.queries:
+            recorder.add(request, collector.queries)
+        return response
+
+    async def __acall__(self, request):
+        collector = SlowQueryCollector(settings.SLOW_QUERY_MS / 1000, settings.SLOW_QUERY_MAX_PER_REQUEST)
+        with recording(collector):
+            response = await self.get_response(request)
+        if collector.queries:
+            # request.user peut encore devoir être chargé depuis la session
+            await sync_to_async(recorder.add)(request, collector.queries)
+        return response
+
+
+class SlowQueryRecorder:
+    """File des relevés, expliqués et enregistrés par un thread du processus"""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=MAX_PENDING)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def add(self, request, queries):
+        view, action = endpoint_labels(request)
+        user = getattr(request, 'user', None)
+        context = {
+            'endpoint': f'{view}:{action}' if action else view,
+            'method': request.method,
+            'path': request.path[:500],
+            'query_params': {key: values if len(values) > 1 else values[0] for key, values in request.GET.lists()},
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+            'created_at': timezone.now(),
+        }
+        try:
+            self._queue.put_nowait((context, queries))
+        except queue.Full:
+            logger.warning('File des requêtes lentes pleine: %d relevé(s) abandonné(s)', len(queries))
+            return
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            # Le thread d'un processus parent n'existe pas dans ses enfants (fork des workers)
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='slow-queries', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            context, queries = self._queue.get()
+            close_old_connections()
+            try:
+                self.record(context, queries)
+            except Exception:
+                logger.exception('Échec de l\'enregistrement des requêtes lentes')
+            finally:
+                self._queue.task_done()
+
+    def record(self, context, queries):
+        records = []
+        for alias, sql, params, many, elapsed in queries:
+            plan = ''
+            if is_explainable(sql, many) and random.random() < settings.SLOW_QUERY_EXPLAIN_RATE:
+                plan = explain(alias, sql, params)
+            records.append(SlowQuery(
+                **context,
+                database=alias,
+                sql=sql,
+                params=repr(params)[:MAX_PARAMS_LENGTH],
+                duration_ms=round(elapsed * 1000, 3),
+                plan=plan,
+            ))
+        try:
+            SlowQuery.objects.bulk_create(records)
+        except DatabaseError:
+            logger.exception('Impossible d\'enregistrer %d requête(s) lente(s)', len(records))
+
+
+recorder = SlowQueryRecorder()
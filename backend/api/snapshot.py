@@ -0,0 +1,156 @@
+"""
+Instantané compressé du catalogue complet (nouveaux terminaux, clients hors ligne).
+
+Le fichier CATALOG_SNAPSHOT_DIR/catalog-<version>.json.gz reprend la forme
+compacte du flux de modifications (api/changes.py): colonnes puis lignes de
+chaque table, sans les suppressions. La version est lue avant les lignes: un
+client qui enchaîne avec /api/catalog/changes/?since=<version> reçoit au pire
+une seconde fois des lignes déjà à jour, jamais un trou.
+
+/api/catalog/snapshot/ sert le dernier fichier tel quel (FileResponse,
+sendfile sous gunicorn) avec un ETag tiré de la version. Il n'est jamais
+reconstruit pendant la requête, sauf s'il n'en existe encore aucun: quand le
+catalogue a changé et que le fichier a plus de CATALOG_SNAPSHOT_MAX_AGE
+secondes, un thread le régénère pendant que l'ancien continue d'être servi.
+`python manage.py build_catalog_snapshot` le construit au déploiement.
+"""
+import gzip
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from .changes import FEEDS, changed_since, current_version, encode_value
+from .models import Medicine
+
+logger = logging.getLogger('api.snapshot')
+
+SNAPSHOT_NAME = re.compile(r'^catalog-(\d+)\.json\.gz$')
+CHUNK_SIZE = 2000
+# Instantanés précédents conservés (téléchargements en cours, autres processus)
+KEEP = 2
+# Durée pendant laquelle la recherche de modifications depuis l'instantané est réutilisée
+VERSION_CACHE_SECONDS = 5
+
+_build_lock = threading.Lock()
+_checked_version = (float('-inf'), None, False)
+
+
+def snapshot_dir():
+    return Path(settings.CATALOG_SNAPSHOT_DIR)
+
+
+def snapshots():
+    """Instantanés construits [(version, chemin)], du plus ancien au plus récent"""
+    found = []
+    for path in snapshot_dir().glob('catalog-*.json.gz'):
+        match = SNAPSHOT_NAME.match(path.name)
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found)
+
+
+def latest_snapshot():
+    found = snapshots()
+    return found[-1] if found else None
+
+
+def write_snapshot(handle, version, using):
+    encoder = JSONEncoder(separators=(',', ':'))
+    handle.write(f'{{"version":{version},"generated_at":{encoder.encode(timezone.now())},"changes":{{')
+    for index, (name, (model, fields)) in enumerate(FEEDS.items()):
+        handle.write(f'{"," if index else ""}"{name}":{{"fields":{encoder.encode(list(fields))},"rows":[')
+        rows = model.objects.using(using).order_by('pk').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+        for position, row in enumerate(rows):
+            values = [encode_value(model, field_name, value) for field_name, value in zip(fields, row)]
+            handle.write(f'{"," if position else ""}{encoder.encode(values)}')
+        handle.write(']}')
+    handle.write('},"deleted":' + encoder.encode({name: [] for name in FEEDS}) + '}')
+
+
+def build_snapshot(force=False):
+    """
+    Construit l'instantané de la version courante s'il n'existe pas encore.
+    Retourne (version, chemin).
+    """
+    using = router.db_for_write(Medicine)
+    version = current_version(using)
+    directory = snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'catalog-{version}.json.gz'
+    if path.exists() and not force:
+        return version, path
+
+    started = time.monotonic()
+    temporary = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        with gzip.open(temporary, 'wt', encoding='utf-8', compresslevel=6) as handle:
+            write_snapshot(handle, version, using)
+        # Remplacement atomique: une requête ne sert jamais un fichier partiel
+        temporary.replace(path)
+    finally:
+        temporary.unlink(missing_ok=True)
+    logger.info('Instantané du catalogue %s construit en %.1fs', path.name, time.monotonic() - started)
+
+    for _, old in snapshots()[:-KEEP]:
+        old.unlink(missing_ok=True)
+    return version, path
+
+
+def rebuild_in_background():
+    """Lance une reconstruction dans un thread, sauf si une est déjà en cours dans ce processus"""
+    if not _build_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            build_snapshot()
+        except Exception:
+            logger.exception('Échec de la reconstruction de l\'instantané du catalogue')
+        finally:
+            _build_lock.release()
+            connections.close_all()
+    threading.Thread(target=run, name='catalog-snapshot', daemon=True).start()
+    return True
+
+
+def cached_changed_since(version):
+    """changed_since(version), relu au plus toutes les VERSION_CACHE_SECONDS secondes"""
+    global _checked_version
+    checked_at, checked, changed = _checked_version
+    now = time.monotonic()
+    if checked == version and now - checked_at < VERSION_CACHE_SECONDS:
+        return changed
+    changed = changed_since(version, router.db_for_write(Medicine))
+    _checked_version = (now, version, changed)
+    return changed
+
+
+def snapshot_for_download():
+    """
+    (version, chemin) de l'instantané à servir; relance sa reconstruction en
+    arrière-plan si le catalogue a changé depuis et qu'il a assez vieilli.
+    """
+    latest = latest_snapshot()
+    if latest is None:
+        with _build_lock:
+            return latest_snapshot() or build_snapshot()
+
+    version, path = latest
+    try:
+        age = time.time() - path.stat().st_mtime
+    except OSError:
+        # Supprimé entre-temps par une reconstruction: le suivant est prêt
+        return latest_snapshot()
+    # Pendant une reconstruction, inutile de relire la version à chaque téléchargement
+    if age >= settings.CATALOG_SNAPSHOT_MAX_AGE and not _build_lock.locked():
+        if cached_changed_since(version):
+            rebuild_in_background()
+    return latest
@@ -0,0 +1,169 @@
+"""
+Mises à jour de stock ensemblistes.
+
+Les réceptions (et plus généralement tout mouvement portant sur de nombreuses
+lignes) appliquent leurs variations de stock en une requête UPDATE par lot au
+lieu d'un save() par médicament.
+"""
+from collections import defaultdict
+
+from django.db import connections, router
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import changes, events
+from .models import BranchStock, Medicine, StockMovement
+
+# Nombre de lignes par requête UPDATE ... FROM (VALUES ...)
+BATCH_SIZE = 1000
+
+
+def merge_quantities(lines):
+    """Regroupe des couples (medicine_pk, quantité) en {medicine_pk: total}"""
+    totals = defaultdict(int)
+    for medicine_pk, quantity in lines:
+        totals[medicine_pk] += quantity
+    return dict(totals)
+
+
+def _has_updated_at(model):
+    return any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+
+
+def _update_from_values(model, field_name, values, add):
+    """UPDATE ... FROM (VALUES ...) pour PostgreSQL, par lots de BATCH_SIZE"""
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    pk_column = qn(model._meta.pk.column)
+    column = qn(model._meta.get_field(field_name).column)
+    expression = f't.{column} + v.value' if add else 'v.value'
+    assignments = [f'{column} = {expression}']
+    if _has_updated_at(model):
+        assignments.append(f"{qn(model._meta.get_field('updated_at').column)} = %s")
+        extra_params = [timezone.now()]
+    else:
+        extra_params = []
+
+    items = list(values.items())
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            placeholders = ', '.join(['(%s, %s)'] * len(batch))
+            params = list(extra_params)
+            for pk, value in batch:
+                params.extend([pk, value])
+            cursor.execute(
+                f'UPDATE {table} AS t SET {", ".join(assignments)} '
+                f'FROM (VALUES {placeholders}) AS v(pk, value) '
+                f'WHERE t.{pk_column} = v.pk',
+                params,
+            )
+            updated += cursor.rowcount
+    return updated
+
+
+def _update_with_case(model, field_name, values, add):
+    """Repli portable: un UPDATE ... SET col = CASE ... par lot"""
+    items = list(values.items())
+    updated = 0
+    extra = {'updated_at': timezone.now()} if _has_updated_at(model) else {}
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        case = Case(
+            *[When(pk=pk, then=Value(value)) for pk, value in batch],
+            output_field=IntegerField(),
+        )
+        updated += model.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            **{field_name: F(field_name) + case if add else case}, **extra
+        )
+        # Sous PostgreSQL, les triggers du catalogue numérotent les lignes modifiées
+        changes.touch(model, [pk for pk, _ in batch])
+    return updated
+
+
+def bulk_update_stock(values, add=True, model=Medicine, field_name='stock_quantity'):
+    """
+    Applique {pk: valeur} au champ de stock en requêtes ensemblistes.
+    add=True ajoute la valeur (variation), add=False la remplace.
+    Retourne le nombre de lignes modifiées. À appeler dans une transaction.
+    """
+    values = {pk: value for pk, value in values.items() if not (add and value == 0)}
+    if not values:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor == 'postgresql':
+        return _update_from_values(model, field_name, values, add)
+    return _update_with_case(model, field_name, values, add)
+
+
+def branch_stock_pks(branch, medicine_pks):
+    """
+    {medicine_pk: pk de la ligne BranchStock} pour une pharmacie, en créant
+    d'un seul bulk_create les lignes manquantes.
+    """
+    medicine_pks = list(medicine_pks)
+    BranchStock.objects.bulk_create(
+        [BranchStock(branch=branch, medicine_id=pk) for pk in medicine_pks],
+        ignore_conflicts=True,
+        batch_size=BATCH_SIZE,
+    )
+    pks = {}
+    for start in range(0, len(medicine_pks), BATCH_SIZE):
+        pks.update(
+            BranchStock.objects.filter(branch=branch, medicine_id__in=medicine_pks[start:start + BATCH_SIZE])
+            .values_list('medicine_id', 'pk')
+        )
+    return pks
+
+
+def adjust_stock(deltas, branch=None):
+    """
+    Applique des variations {medicine_pk: delta} au stock total du médicament
+    et, si une pharmacie est donnée, à son stock local.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    updated = bulk_update_stock(deltas, add=True)
+    if branch is not None and deltas:
+        rows = branch_stock_pks(branch, deltas)
+        bulk_update_stock(
+            {rows[pk]: delta for pk, delta in deltas.items()},
+            add=True,
+            model=BranchStock,
+        )
+    events.stock_changed(deltas, branch=branch)
+    return updated
+
+
+def increment_stock(lines, branch=None):
+    """Ajoute au stock les quantités (medicine_pk, quantité) données"""
+    return adjust_stock(merge_quantities(lines), branch=branch)
+
+
+def decrement_stock(lines, branch=None):
+    """Retire du stock les quantités (medicine_pk, quantité) données"""
+    return adjust_stock(
+        {pk: -quantity for pk, quantity in merge_quantities(lines).items()}, branch=branch
+    )
+
+
+def record_movements(movement_type, lines, reference='', user=None, branch=None):
+    """
+    Enregistre en un seul bulk_create les mouvements de stock.
+    lines: itérable de (medicine_pk, quantité signée, coût unitaire ou None)
+    """
+    return StockMovement.objects.bulk_create([
+        StockMovement(
+            medicine_id=medicine_pk,
+            branch=branch,
+            movement_type=movement_type,
+            quantity=quantity,
+            unit_cost=unit_cost,
+            reference=reference,
+            created_by=user,
+        )
+        for medicine_pk, quantity, unit_cost in lines
+        if quantity
+    ], batch_size=BATCH_SIZE)
@@ -0,0 +1,215 @@
+"""
+Inventaires physiques: import des comptages, écarts et ajustements.
+
+Les comptages (CSV ou JSON, plusieurs milliers de lignes) sont résolus et
+enregistrés par lots; l'écart avec le stock théorique est calculé par une seule
+requête, et les ajustements validés sont appliqués de manière atomique en
+requêtes ensemblistes.
+"""
+import csv
+import io
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BranchStock, Medicine, StocktakeCount
+from .stock import BATCH_SIZE, adjust_stock, bulk_update_stock, record_movements
+
+CODE_COLUMNS = ('medicine_id', 'code', 'barcode')
+QUANTITY_COLUMNS = ('counted_quantity', 'quantity', 'count')
+
+
+class StocktakeError(Exception):
+    """Erreur fonctionnelle d'inventaire (session fermée, fichier illisible...)"""
+
+
+def _first(row, columns):
+    for column in columns:
+        value = row.get(column)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def parse_counts(rows):
+    """
+    Valide des lignes {medicine_id, counted_quantity} et cumule les quantités
+    par code (un même produit peut être scanné sur plusieurs rayons).
+    Retourne ({code: quantité}, [erreurs]).
+    """
+    totals, errors = {}, []
+    for line, row in enumerate(rows, start=1):
+        code = _first(row, CODE_COLUMNS)
+        quantity = _first(row, QUANTITY_COLUMNS)
+        if code is None:
+            errors.append({'line': line, 'error': 'medicine_id manquant'})
+            continue
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            errors.append({'line': line, 'medicine_id': code, 'error': 'Quantité invalide'})
+            continue
+        if quantity < 0:
+            errors.append({'line': line, 'medicine_id': code, 'error': 'Quantité négative'})
+            continue
+        code = str(code).strip()
+        totals[code] = totals.get(code, 0) + quantity
+    return totals, errors
+
+
+def read_csv(uploaded_file):
+    """Lit un fichier CSV (séparateur , ou ;) en dictionnaires"""
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    sample = text.read(2048)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    return csv.DictReader(text, dialect=dialect)
+
+
+def resolve_codes(codes):
+    """{code médicament: pk} par lots de requêtes IN"""
+    codes = list(codes)
+    resolved = {}
+    for start in range(0, len(codes), BATCH_SIZE):
+        resolved.update(
+            Medicine.objects.filter(medicine_id__in=codes[start:start + BATCH_SIZE])
+            .values_list('medicine_id', 'pk')
+        )
+    return resolved
+
+
+@transaction.atomic
+def save_counts(session, totals, replace=True):
+    """
+    Enregistre les comptages d'une session. replace=True remplace un comptage
+    existant, sinon la quantité s'ajoute (comptage d'un rayon supplémentaire).
+    Retourne (nombre de lignes enregistrées, codes inconnus).
+    """
+    if session.status != 'open':
+        raise StocktakeError("L'inventaire n'est plus ouvert.")
+
+    pks = resolve_codes(totals)
+    unknown = sorted(set(totals) - pks.keys())
+    quantities = {pks[code]: quantity for code, quantity in totals.items() if code in pks}
+
+    existing = {}
+    medicine_pks = list(quantities)
+    for start in range(0, len(medicine_pks), BATCH_SIZE):
+        existing.update(
+            StocktakeCount.objects.filter(session=session, medicine_id__in=medicine_pks[start:start + BATCH_SIZE])
+            .values_list('medicine_id', 'pk')
+        )
+
+    bulk_update_stock(
+        {existing[pk]: quantity for pk, quantity in quantities.items() if pk in existing},
+        add=not replace,
+        model=StocktakeCount,
+        field_name='counted_quantity',
+    )
+    StocktakeCount.objects.bulk_create([
+        StocktakeCount(session=session, medicine_id=pk, counted_quantity=quantity)
+        for pk, quantity in quantities.items() if pk not in existing
+    ], batch_size=BATCH_SIZE)
+    return len(quantities), unknown
+
+
+def current_stock(session):
+    """Stock théorique courant: celui de la pharmacie de la session, sinon le stock total"""
+    if session.branch_id is None:
+        return F('medicine__stock_quantity')
+    return Coalesce(
+        Subquery(
+            BranchStock.objects.filter(branch_id=session.branch_id, medicine_id=OuterRef('medicine_id'))
+            .values('stock_quantity')[:1]
+        ),
+        0,
+    )
+
+
+def variance_queryset(session):
+    """
+    Écarts comptage / stock en une requête. Avant validation, le stock théorique
+    est le stock courant; après, celui figé au moment de la validation.
+    """
+    expected = F('expected_quantity') if session.status == 'approved' else current_stock(session)
+    return (
+        StocktakeCount.objects.filter(session=session)
+        .annotate(expected=expected)
+        .annotate(
+            variance=F('counted_quantity') - F('expected'),
+            variance_value=ExpressionWrapper(
+                (F('counted_quantity') - F('expected')) * F('medicine__purchase_price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+    )
+
+
+def variance_report(session, only_differences=False):
+    """Rapport d'écarts (lignes + totaux) sans requête par ligne"""
+    queryset = variance_queryset(session)
+    if only_differences:
+        queryset = queryset.exclude(variance=0)
+    lines = list(
+        queryset.order_by('medicine__name').values(
+            'medicine', 'counted_quantity', 'expected', 'variance', 'variance_value',
+            code=F('medicine__medicine_id'), name=F('medicine__name'),
+        )
+    )
+    totals = queryset.aggregate(
+        counted_total=Coalesce(Sum('counted_quantity'), 0),
+        expected_total=Coalesce(Sum('expected'), 0),
+        variance_total=Coalesce(Sum('variance'), 0),
+        variance_value_total=Sum('variance_value'),
+    )
+    totals = {
+        'counted': totals['counted_total'],
+        'expected': totals['expected_total'],
+        'variance': totals['variance_total'],
+        'variance_value': totals['variance_value_total'] or 0,
+        'lines': len(lines),
+        'lines_with_variance': sum(1 for line in lines if line['variance']),
+    }
+    return {'session': session.reference, 'status': session.status, 'totals': totals, 'lines': lines}
+
+
+@transaction.atomic
+def approve(session, user):
+    """
+    Valide l'inventaire: fige le stock théorique, puis applique les écarts au
+    stock sous forme de variations (les ventes concurrentes restent comptées).
+    """
+    session = type(session).objects.select_for_update().get(pk=session.pk)
+    if session.status != 'open':
+        raise StocktakeError("L'inventaire n'est plus ouvert.")
+
+    if session.branch_id is None:
+        expected = Subquery(Medicine.objects.filter(pk=OuterRef('medicine_id')).values('stock_quantity')[:1])
+    else:
+        expected = current_stock(session)
+    StocktakeCount.objects.filter(session=session).update(expected_quantity=expected)
+    deltas = dict(
+        StocktakeCount.objects.filter(session=session)
+        .exclude(counted_quantity=F('expected_quantity'))
+        .annotate(delta=F('counted_quantity') - F('expected_quantity'))
+        .values_list('medicine_id', 'delta')
+    )
+    adjust_stock(deltas, branch=session.branch)
+    record_movements(
+        'adjustment',
+        [(pk, delta, None) for pk, delta in deltas.items()],
+        reference=session.reference,
+        user=user,
+        branch=session.branch,
+    )
+
+    session.status = 'approved'
+    session.approved_by = user
+    session.approved_at = timezone.now()
+    session.save(update_fields=['status', 'approved_by', 'approved_at'])
+    return session, len(deltas)
@@ -1,3 +1,1261 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import psycopg2
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config import db_router, schema
+from config.postgresql_pool.pool import ConnectionPool, PoolTimeout, pool_stats
+from users.models import User
+
+from . import archive, audit, events, images, metrics, partitions, querylog, slowqueries, snapshot
+from .async_views import event_frames
+from .models import (
+    AuditEntry, Branch, BranchStock, Medicine, MedicineGroup, PurchaseOrder, Sale, SaleItem, SlowQuery,
+    StockMovement, Supplier,
+)
+from .querylog import QueryRecorder
+from .valuation import stock_valuation
+
+
+def tables(context):
+    return ' '.join(query['sql'] for query in context.captured_queries)
+
+
+def medicine(code, **fields):
+    return Medicine.objects.create(**{
+        'medicine_id': code, 'name': f'Médicament {code}', 'purchase_price': Decimal('100.00'),
+        'selling_price': Decimal('150.00'), 'expiration_date': date(2030, 1, 1), **fields,
+    })
+
+
+def supplier(name='Laborex'):
+    return Supplier.objects.create(name=name, phone='771234567', email='contact@laborex.sn', address='Dakar')
+
+
+class ReplicaRoutingTests(TestCase):
+    """Lectures des actions en lecture seule sur le réplica, adhérence au primaire après une écriture"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Réplica miroir de la base de test, comme avec REPLICA_DATABASE_URL (TEST MIRROR 'default'),
+        # ajouté pour ces seuls tests: ailleurs, les lectures restent sur la transaction du test
+        primary = connections[db_router.PRIMARY].settings_dict
+        connections.settings[db_router.REPLICA] = {**primary, 'TEST': {**primary['TEST'], 'MIRROR': db_router.PRIMARY}}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[db_router.REPLICA].close()
+        del connections[db_router.REPLICA]
+        del connections.settings[db_router.REPLICA]
+        super().tearDownClass()
+
+    def setUp(self):
+        caches[db_router.STICKY_CACHE].clear()
+        self.user = User.objects.create_user(email='lecture@fadjma.sn', password='secret', all_branches=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_read_action_uses_replica(self):
+        with CaptureQueriesContext(connections[db_router.REPLICA]) as replica, \
+                CaptureQueriesContext(connections[db_router.PRIMARY]) as primary:
+            response = self.client.get('/api/medicine-groups/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('api_medicinegroup', tables(replica))
+        self.assertNotIn('api_medicinegroup', tables(primary))
+
+    def test_write_makes_user_read_from_primary(self):
+        response = self.client.post('/api/medicine-groups/', {'name': 'Antalgiques'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(db_router.is_sticky(self.user.pk))
+
+        with CaptureQueriesContext(connections[db_router.REPLICA]) as replica:
+            response = self.client.get('/api/medicine-groups/')
+        self.assertNotIn('api_medicinegroup', tables(replica))
+        # Relue sur le primaire: le groupe à peine créé est visible
+        self.assertEqual([group['name'] for group in response.data['results']], ['Antalgiques'])
+
+    def test_stickiness_is_per_user(self):
+        db_router.mark_sticky(self.user.pk)
+        other = User.objects.create_user(email='autre@fadjma.sn', password='secret', all_branches=True)
+        client = APIClient()
+        client.force_authenticate(other)
+        with CaptureQueriesContext(connections[db_router.REPLICA]) as replica:
+            client.get('/api/medicine-groups/')
+        self.assertIn('api_medicinegroup', tables(replica))
+
+    def test_write_goes_to_primary(self):
+        with CaptureQueriesContext(connections[db_router.REPLICA]) as replica:
+            response = self.client.post('/api/medicine-groups/', {'name': 'Antalgiques'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('INSERT', tables(replica))
+
+
+class PurchaseOrderTests(TestCase):
+    """Réceptions bornées au reliquat des commandes, statut piloté par les réceptions"""
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='Pharmacie Plateau', code='PLT')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password='secret', branch=self.branch))
+        self.supplier = supplier()
+        self.medicine = medicine('PARA500', stock_quantity=2)
+        response = self.client.post('/api/purchase-orders/', {
+            'supplier': self.supplier.pk, 'status': 'ordered',
+            'items': [{'medicine': self.medicine.pk, 'quantity_ordered': 10, 'unit_cost': '90.00'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.order = PurchaseOrder.objects.get()
+
+    def receive(self, *quantities):
+        return self.client.post('/api/goods-receipts/', {
+            'supplier': self.supplier.pk, 'purchase_order': self.order.pk,
+            'items': [{'medicine': self.medicine.pk, 'quantity': quantity, 'unit_cost': '90.00'} for quantity in quantities],
+        }, format='json')
+
+    def set_status(self, value):
+        return self.client.patch(f'/api/purchase-orders/{self.order.pk}/', {'status': value}, format='json')
+
+    def test_receipts_increment_stock_and_close_the_order(self):
+        self.assertEqual(self.receive(4).status_code, 201)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.items.get().quantity_received), ('partial', 4))
+
+        self.assertEqual(self.receive(3, 3).status_code, 201)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'received')
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 12)
+        self.assertEqual(BranchStock.objects.get(branch=self.branch, medicine=self.medicine).stock_quantity, 10)
+        self.assertEqual(StockMovement.objects.filter(movement_type='receipt').count(), 3)
+
+    def test_receipt_beyond_the_remainder_is_refused(self):
+        self.receive(8)
+        response = self.receive(2, 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reliquat', str(response.data['items']))
+        self.assertEqual(self.order.items.get().quantity_received, 8)
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 10)
+
+    def test_received_order_status_is_frozen(self):
+        self.receive(4)
+        for value in ('draft', 'cancelled', 'received'):
+            self.assertEqual(self.set_status(value).status_code, 400)
+        self.assertEqual(self.client.post(f'/api/purchase-orders/{self.order.pk}/cancel/').status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'partial')
+
+    def test_manual_transitions(self):
+        self.assertEqual(self.set_status('draft').status_code, 200)
+        self.assertEqual(self.set_status('cancelled').status_code, 200)
+        self.assertEqual(self.set_status('ordered').status_code, 400)
+        self.assertEqual(self.receive(1).status_code, 400)
+
+
+def moment(day, hour=12):
+    return timezone.make_aware(datetime(2024, 3, day, hour))
+
+
+class StockValuationTests(TestCase):
+    """Valorisation au coût moyen pondéré et en FIFO, à une date passée et par pharmacie"""
+
+    def setUp(self):
+        self.group = MedicineGroup.objects.create(name='Antalgiques')
+        self.medicine = medicine('PARA500', group=self.group, stock_quantity=15)
+        StockMovement.objects.bulk_create([
+            StockMovement(medicine=self.medicine, movement_type='receipt', quantity=10,
+                          unit_cost=Decimal('80.00'), created_at=moment(1)),
+            StockMovement(medicine=self.medicine, movement_type='receipt', quantity=10,
+                          unit_cost=Decimal('100.00'), created_at=moment(5)),
+            StockMovement(medicine=self.medicine, movement_type='sale', quantity=-5, created_at=moment(10)),
+        ])
+
+    def test_weighted_average(self):
+        valuation = stock_valuation(at=moment(20))
+        self.assertEqual(valuation['totals']['quantity'], 15)
+        self.assertEqual(valuation['totals']['cost_value'], Decimal('1350.00'))
+        self.assertEqual(valuation['totals']['retail_value'], Decimal('2250.00'))
+        self.assertEqual(valuation['totals']['potential_margin'], Decimal('900.00'))
+        self.assertEqual(valuation['by_group'][0]['group_name'], 'Antalgiques')
+
+    def test_fifo_keeps_the_latest_layers(self):
+        self.assertEqual(stock_valuation(at=moment(20), method='fifo')['totals']['cost_value'], Decimal('1400.00'))
+
+    def test_past_date_undoes_later_movements(self):
+        valuation = stock_valuation(at=moment(7), method='fifo')
+        self.assertEqual(valuation['totals']['quantity'], 20)
+        self.assertEqual(valuation['totals']['cost_value'], Decimal('1800.00'))
+        # Avant toute réception, le prix d'achat du médicament sert de coût
+        self.assertEqual(stock_valuation(at=moment(3))['totals']['cost_value'], Decimal('800.00'))
+
+    def test_branch_values_its_own_stock(self):
+        branch = Branch.objects.create(name='Pharmacie Plateau', code='PLT')
+        BranchStock.objects.create(branch=branch, medicine=self.medicine, stock_quantity=4)
+        valuation = stock_valuation(at=moment(20), branch=branch)
+        self.assertEqual(valuation['totals']['quantity'], 4)
+        self.assertEqual(valuation['totals']['cost_value'], Decimal('360.00'))
+
+    def test_endpoint_rejects_unknown_method(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='siege@fadjma.sn', password='secret', all_branches=True))
+        self.assertEqual(client.get('/api/stock/valuation/', {'method': 'lifo'}).status_code, 400)
+        response = client.get('/api/stock/valuation/', {'method': 'fifo'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['quantity'], 15)
+
+
+class StocktakeTests(TestCase):
+    """Comptages cumulés par code, écarts avec le stock de la pharmacie, ajustements à la validation"""
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='Pharmacie Plateau', code='PLT')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password='secret', branch=self.branch))
+        self.first = medicine('PARA500', stock_quantity=10)
+        self.second = medicine('IBU400', stock_quantity=5)
+        for item in (self.first, self.second):
+            BranchStock.objects.create(branch=self.branch, medicine=item, stock_quantity=item.stock_quantity)
+        response = self.client.post('/api/stocktakes/', {'notes': 'Inventaire annuel'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.url = f"/api/stocktakes/{response.data['id']}"
+
+    def upload(self, content):
+        upload = SimpleUploadedFile('comptage.csv', content.encode('utf-8'), content_type='text/csv')
+        return self.client.post(f'{self.url}/counts/', {'file': upload}, format='multipart')
+
+    def test_counts_and_variance(self):
+        response = self.upload('medicine_id;counted_quantity\nPARA500;5\nIBU400;5\nPARA500;3\nINCONNU;1\nIBU400;-2\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['saved'], response.data['unknown_medicines']), (2, ['INCONNU']))
+        self.assertEqual([error['line'] for error in response.data['errors']], [5])
+
+        report = self.client.get(f'{self.url}/variance/', {'only_differences': 'true'}).data
+        self.assertEqual([(line['code'], line['variance']) for line in report['lines']], [('PARA500', -2)])
+        self.assertEqual(report['totals']['variance_value'], Decimal('-200.00'))
+
+    def test_json_counts_replace_or_add(self):
+        self.client.post(f'{self.url}/counts/', {'counts': [{'medicine_id': 'PARA500', 'counted_quantity': 4}]}, format='json')
+        self.client.post(f'{self.url}/counts/', {
+            'counts': [{'medicine_id': 'PARA500', 'counted_quantity': 2}], 'replace': False,
+        }, format='json')
+        report = self.client.get(f'{self.url}/variance/').data
+        self.assertEqual(report['lines'][0]['counted_quantity'], 6)
+
+    def test_approve_applies_the_differences(self):
+        self.upload('medicine_id;counted_quantity\nPARA500;8\nIBU400;6\n')
+        response = self.client.post(f'{self.url}/approve/')
+        self.assertEqual((response.status_code, response.data['adjusted_medicines']), (200, 2))
+        stocks = dict(BranchStock.objects.filter(branch=self.branch).values_list('medicine__medicine_id', 'stock_quantity'))
+        self.assertEqual(stocks, {'PARA500': 8, 'IBU400': 6})
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock_quantity, 8)
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(movement_type='adjustment').values_list('quantity', flat=True)), [-2, 1]
+        )
+        # Écarts figés: un mouvement postérieur ne les change plus
+        BranchStock.objects.filter(branch=self.branch, medicine=self.first).update(stock_quantity=0)
+        self.assertEqual(self.client.get(f'{self.url}/variance/').data['totals']['variance'], -1)
+
+    def test_closed_session_refuses_counts(self):
+        self.assertEqual(self.client.post(f'{self.url}/cancel/').status_code, 200)
+        self.assertEqual(self.upload('medicine_id;counted_quantity\nPARA500;8\n').status_code, 400)
+        self.assertEqual(self.client.post(f'{self.url}/approve/').status_code, 400)
+
+
+class SaleStockTests(TestCase):
+    """Une vente retire les quantités du stock total et du stock de la pharmacie, en une passe"""
+
+    def setUp(self):
+        self.branch = Branch.objects.create(name='Pharmacie Plateau', code='PLT')
+        self.user = User.objects.create_user(email='caisse@fadjma.sn', password='secret', branch=self.branch)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.medicine = medicine('PARA500', stock_quantity=10)
+        BranchStock.objects.create(branch=self.branch, medicine=self.medicine, stock_quantity=10)
+
+    def sell(self, *quantities):
+        return self.client.post('/api/sales/', {
+            'payment_method': 'cash',
+            'items': [{'medicine': self.medicine.pk, 'quantity': quantity, 'unit_price': '150.00'} for quantity in quantities],
+        }, format='json')
+
+    def test_sale_decrements_stock(self):
+        response = self.sell(3, 2)
+        self.assertEqual(response.status_code, 201)
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 5)
+        self.assertEqual(BranchStock.objects.get(branch=self.branch, medicine=self.medicine).stock_quantity, 5)
+        movements = StockMovement.objects.filter(medicine=self.medicine, movement_type='sale')
+        self.assertEqual(sorted(movements.values_list('quantity', flat=True)), [-3, -2])
+        self.assertEqual(Sale.objects.get().branch, self.branch)
+
+    def test_sale_beyond_branch_stock_is_refused(self):
+        response = self.sell(8, 3)
+        self.assertEqual(response.status_code, 400)
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 10)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_stock_edit_goes_through_adjustment(self):
+        response = self.client.patch(f'/api/medicines/{self.medicine.pk}/', {'stock_quantity': 4}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(BranchStock.objects.get(branch=self.branch, medicine=self.medicine).stock_quantity, 4)
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 4)
+        self.assertEqual(
+            list(StockMovement.objects.filter(movement_type='adjustment').values_list('quantity', flat=True)), [-6]
+        )
+
+    def test_sale_items_carry_the_branch(self):
+        self.sell(3)
+        other = Branch.objects.create(name='Pharmacie Médina', code='MED')
+        sale = Sale.objects.create(branch=other, total_amount=Decimal('150.00'), payment_method='cash')
+        SaleItem.objects.create(sale=sale, medicine=self.medicine, quantity=4, unit_price=Decimal('150.00'))
+        self.assertEqual(sorted(SaleItem.objects.values_list('branch__code', flat=True)), ['MED', 'PLT'])
+        # SaleItem.save ne touche plus au stock: seules les ventes de l'API le décrémentent
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 7)
+
+        response = self.client.get('/api/sale-items/by_medicine/', {'medicine_id': self.medicine.pk})
+        self.assertEqual((response.data['total_quantity'], response.data['total_sales']), (3, 1))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitionnement propre à PostgreSQL')
+class SalePartitionTests(TestCase):
+    """Ventes rangées dans la partition de leur mois, numéros uniques sur toutes les partitions"""
+
+    def sale_partition(self, sale):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM api_sale WHERE id = %s', [sale.pk])
+            return cursor.fetchone()[0]
+
+    def create_sale(self, **fields):
+        return Sale.objects.create(total_amount=Decimal('150.00'), payment_method='cash', **fields)
+
+    def test_sale_lands_in_its_month_partition(self):
+        month = partitions.month_start(timezone.localdate())
+        partitions.ensure_partitions(month, month)
+        self.assertEqual(self.sale_partition(self.create_sale()), partitions.partition_name('api_sale', month))
+
+    def test_late_partition_takes_its_rows_from_default(self):
+        month = date(2090, 1, 1)
+        sale = self.create_sale()
+        Sale.objects.filter(pk=sale.pk).update(created_at=timezone.make_aware(datetime(2090, 1, 15, 10)))
+        self.assertEqual(self.sale_partition(sale), 'api_sale_default')
+        self.assertEqual(partitions.ensure_partitions(month, month), [
+            partitions.partition_name('api_sale', month), partitions.partition_name('api_saleitem', month),
+        ])
+        self.assertEqual(self.sale_partition(sale), partitions.partition_name('api_sale', month))
+
+    def test_sale_number_is_unique_across_partitions(self):
+        sale = self.create_sale(sale_number='VNT-0001')
+        Sale.objects.filter(pk=sale.pk).update(created_at=timezone.make_aware(datetime(2090, 1, 15, 10)))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create_sale(sale_number='VNT-0001')
+
+
+class SalesArchiveTests(TestCase):
+    """Mois clos sortis des tables chaudes vers un fichier, rapports inchangés"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = override_settings(SALES_ARCHIVE_DIR=directory.name)
+        patch.enable()
+        self.addCleanup(patch.disable)
+        self.branch = Branch.objects.create(name='Pharmacie Plateau', code='PLT')
+        self.medicine = medicine('PARA500')
+        self.month = date(2023, 1, 1)
+        self.old_sale(datetime(2023, 1, 10, 9), 2)
+        self.old_sale(datetime(2023, 1, 25, 18), 3, branch=None)
+
+    def old_sale(self, moment, quantity, branch=True):
+        sale = Sale.objects.create(
+            branch=self.branch if branch else None, total_amount=Decimal('150.00') * quantity, payment_method='cash',
+        )
+        Sale.objects.filter(pk=sale.pk).update(created_at=timezone.make_aware(moment))
+        sale.refresh_from_db()
+        SaleItem.objects.create(sale=sale, medicine=self.medicine, quantity=quantity, unit_price=Decimal('150.00'))
+        return sale
+
+    def test_month_leaves_the_hot_tables_and_reports_are_unchanged(self):
+        start, end = archive.month_bounds(self.month)
+        periods = [(None, None, None), (self.branch.pk, None, None), (None, start, end),
+                   (None, start, timezone.make_aware(datetime(2023, 1, 20)))]
+        before = [archive.sales_summary(*period) for period in periods]
+
+        entry = archive.archive_month(self.month)
+        self.assertEqual((entry['sales'], entry['items']), (2, 2))
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleItem.objects.exists())
+        self.assertEqual(archive.archived_months(), ['2023-01'])
+        self.assertEqual([archive.sales_summary(*period) for period in periods], before)
+        self.assertEqual(before[3], {'count': 1, 'revenue': Decimal('300.00'), 'quantity': 2})
+        self.assertEqual(len(list(archive.iter_sales(self.branch.pk))), 1)
+
+    def test_month_is_archived_once(self):
+        entry = archive.archive_month(self.month, purge=False)
+        with self.assertRaisesMessage(archive.ArchiveError, 'déjà archivé'):
+            archive.archive_month(self.month)
+        self.assertEqual(archive.load_manifest()['months']['2023-01'], entry)
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_failed_purge_leaves_the_manifest_untouched(self):
+        with mock.patch.object(archive, '_purge_month', side_effect=DatabaseError('disque plein')):
+            with self.assertRaises(DatabaseError):
+                archive.archive_month(self.month)
+        self.assertEqual(archive.archived_months(), [])
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_recent_month_is_refused(self):
+        with self.assertRaisesMessage(archive.ArchiveError, 'période de conservation'):
+            archive.archive_month(timezone.localdate())
+
+    def test_by_medicine_states_its_coverage(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='siege@fadjma.sn', password='secret', all_branches=True))
+        archive.archive_month(self.month)
+        response = client.get('/api/sale-items/by_medicine/', {'medicine_id': self.medicine.pk})
+        self.assertIsNone(response.data['total_quantity'])
+        self.assertEqual(response.data['hot_data_from'], archive.month_bounds(date(2023, 2, 1))[0])
+
+
+def png(name='photo.png', size=(1000, 600)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageVariantTests(TestCase):
+    """Variantes WebP générées quand l'image change, et seulement dans ce cas"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = override_settings(AUDIT_ENABLED=False, MEDIA_ROOT=directory.name, STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        patch.enable()
+        self.addCleanup(patch.disable)
+        self.item = medicine('PARA500', image=png())
+
+    def rendered(self):
+        patch = mock.patch.object(images, 'render_variant', wraps=images.render_variant)
+        self.addCleanup(patch.stop)
+        return patch.start()
+
+    def test_upload_creates_the_variants(self):
+        from PIL import Image
+
+        item = Medicine.objects.get(pk=self.item.pk)
+        for field_name, size in images.MEDICINE_IMAGE_VARIANTS.items():
+            variant = getattr(item, field_name)
+            self.assertTrue(variant.name.endswith('.webp'))
+            with variant.open('rb'), Image.open(variant) as image:
+                self.assertEqual(max(image.size), size[0])
+
+    def test_price_and_stock_saves_keep_the_variants(self):
+        render = self.rendered()
+        item = Medicine.objects.get(pk=self.item.pk)
+        variants = (item.image_thumbnail.name, item.image_detail.name)
+        item.selling_price = Decimal('175.00')
+        item.save()
+        item.stock_quantity = 3
+        item.save(update_fields=['stock_quantity'])
+        Medicine.objects.get(pk=self.item.pk).save()
+        render.assert_not_called()
+        item.refresh_from_db()
+        self.assertEqual((item.image_thumbnail.name, item.image_detail.name), variants)
+
+    def test_new_image_replaces_the_variants(self):
+        item = Medicine.objects.get(pk=self.item.pk)
+        old = item.image_thumbnail.name
+        item.image = png('boite.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save(update_fields=['image'])
+        item.refresh_from_db()
+        self.assertIn('boite', item.image_thumbnail.name)
+        self.assertFalse(item.image_thumbnail.storage.exists(old))
+
+    def test_removed_image_clears_the_variants(self):
+        item = Medicine.objects.get(pk=self.item.pk)
+        item.image = None
+        item.save()
+        item.refresh_from_db()
+        self.assertEqual((item.image_thumbnail.name, item.image_detail.name), ('', ''))
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='')
+class MetricsTests(TestCase):
+    """Compteurs par point d'accès, exposition réservée au jeton ou au personnel"""
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.client = APIClient()
+        self.staff = User.objects.create_user(email='admin@fadjma.sn', password='secret', is_staff=True, all_branches=True)
+
+    def scrape(self, user=None, **headers):
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        return self.client.get('/api/metrics', **headers)
+
+    def test_requests_are_counted_per_endpoint(self):
+        self.client.force_authenticate(self.staff)
+        self.client.get('/api/medicine-groups/')
+        self.client.force_authenticate(None)
+        response = self.scrape(self.staff)
+        self.assertEqual(response.status_code, 200)
+        labels = 'view="api:medicine-group-list",action="list",method="GET",status="2xx"'
+        self.assertIn(f'fadjma_request_duration_seconds_count{{{labels}}} 1', response.content.decode())
+
+    def test_without_token_only_staff_may_scrape(self):
+        caisse = User.objects.create_user(email='caisse@fadjma.sn', password='secret', all_branches=True)
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(caisse).status_code, 403)
+        self.assertEqual(self.scrape(self.staff).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='jeton-prometheus')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.scrape(self.staff).status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer jeton-prometheus').status_code, 200)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_metrics_are_not_served(self):
+        self.assertEqual(self.scrape(self.staff).status_code, 404)
+
+
+class ProfilingTests(TestCase):
+    """Profil d'une requête sur demande du personnel, rapport consultable ensuite"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=directory.name, PROFILING_KEEP=2)
+        patch.enable()
+        self.addCleanup(patch.disable)
+        self.directory = directory.name
+        self.client = APIClient()
+        self.staff = User.objects.create_user(email='admin@fadjma.sn', password='secret', is_staff=True, all_branches=True)
+
+    def get(self, path, user, **headers):
+        return self.client.get(path, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}', **headers)
+
+    def test_staff_request_is_profiled(self):
+        medicine('PARA500')
+        response = self.get('/api/medicines/', self.staff, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertGreater(int(response['X-Profile-Queries']), 0)
+
+        report = self.get(f'/api/profiles/{profile_id}/', self.staff)
+        self.assertEqual(report.status_code, 200)
+        self.assertEqual((report.data['path'], report.data['status']), ('/api/medicines/', 200))
+        self.assertEqual(report.data['sql']['count'], int(response['X-Profile-Queries']))
+        self.assertTrue(any('api_medicine' in query['sql'] for query in report.data['sql']['queries']))
+        download = self.get(f'/api/profiles/{profile_id}/', self.staff, data={'download': 'prof'})
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content))
+
+    def test_other_users_are_not_profiled(self):
+        caisse = User.objects.create_user(email='caisse@fadjma.sn', password='secret', all_branches=True)
+        response = self.get('/api/medicines/', caisse, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(list(Path(self.directory).iterdir()), [])
+        self.assertEqual(self.get(f'/api/profiles/{"0" * 32}/', caisse).status_code, 403)
+
+    def test_only_the_latest_reports_are_kept(self):
+        ids = [self.get('/api/medicines/', self.staff, HTTP_X_PROFILE='1')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(self.get(f'/api/profiles/{ids[0]}/', self.staff).status_code, 404)
+        self.assertEqual(self.get(f'/api/profiles/{ids[2]}/', self.staff).status_code, 200)
+
+    def test_memory_mode_reports_the_peak(self):
+        response = self.get('/api/medicines/', self.staff, HTTP_X_PROFILE='memory')
+        report = self.get(f'/api/profiles/{response["X-Profile-Id"]}/', self.staff)
+        self.assertGreater(report.data['memory_peak_bytes'], 0)
+
+
+class SlowQueryTests(TestCase):
+    """Requêtes SQL au-delà du seuil relevées par requête HTTP, rejouées sous EXPLAIN si c'est sans risque"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.staff = User.objects.create_user(email='admin@fadjma.sn', password='secret', is_staff=True, all_branches=True)
+        self.client.force_authenticate(self.staff)
+
+    def context(self):
+        return {
+            'endpoint': 'api:medicine-list:list', 'method': 'GET', 'path': '/api/medicines/',
+            'query_params': {}, 'user_id': self.staff.pk, 'created_at': timezone.now(),
+        }
+
+    @override_settings(SLOW_QUERY_MS=0.001, SLOW_QUERY_MAX_PER_REQUEST=2)
+    def test_queries_over_the_threshold_are_handed_over(self):
+        medicine('PARA500')
+        with mock.patch.object(slowqueries.recorder, 'add') as add:
+            self.assertEqual(APIClient().get('/api/medicines/', HTTP_AUTHORIZATION=(
+                f'Bearer {AccessToken.for_user(self.staff)}'
+            )).status_code, 200)
+        request, queries = add.call_args.args
+        self.assertEqual(request.path, '/api/medicines/')
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(queries[0][0], 'default')
+
+    @override_settings(SLOW_QUERY_MS=60000)
+    def test_fast_requests_record_nothing(self):
+        with mock.patch.object(slowqueries.recorder, 'add') as add:
+            self.client.get('/api/medicines/')
+        add.assert_not_called()
+
+    @override_settings(SLOW_QUERY_EXPLAIN_RATE=1.0)
+    def test_reads_are_explained_and_writes_are_not(self):
+        item = medicine('PARA500', stock_quantity=100)
+        slowqueries.recorder.record(self.context(), [
+            ('default', 'SELECT "id" FROM "api_medicine" WHERE "id" = %s', (item.pk,), False, 0.8),
+            ('default', 'UPDATE "api_medicine" SET "stock_quantity" = 0 WHERE "id" = %s', (item.pk,), False, 0.9),
+        ])
+        read, write = SlowQuery.objects.order_by('duration_ms')
+        self.assertTrue(read.plan)
+        self.assertEqual((read.endpoint, read.user, read.duration_ms), ('api:medicine-list:list', self.staff, 800.0))
+        self.assertEqual(write.plan, '')
+        item.refresh_from_db()
+        self.assertEqual(item.stock_quantity, 100)
+
+    def test_only_side_effect_free_selects_are_explainable(self):
+        self.assertTrue(slowqueries.is_explainable('SELECT * FROM api_sale WHERE id = %s', False))
+        for sql in (
+            'SELECT * FROM api_sale WHERE id = %s FOR UPDATE',
+            'WITH moved AS (UPDATE api_medicine SET stock_quantity = 0 RETURNING id) SELECT * FROM moved',
+            'SELECT pg_advisory_lock(42)',
+            'SELECT nextval(%s) FROM api_sale',
+            'DELETE FROM api_sale',
+        ):
+            self.assertFalse(slowqueries.is_explainable(sql, False), sql)
+        self.assertFalse(slowqueries.is_explainable('SELECT * FROM api_sale', True))
+
+    def test_listing_is_staff_only(self):
+        slowqueries.recorder.record(self.context(), [('default', 'SELECT 1 FROM api_sale', (), False, 0.6)])
+        response = self.client.get('/api/slow-queries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password='secret', all_branches=True))
+        self.assertEqual(self.client.get('/api/slow-queries/').status_code, 403)
+
+
+class QueryRecorderTests(TestCase):
+    """Requêtes SQL attribuées au contexte qui les exécute, y compris dans le thread de sync_to_async"""
+
+    def test_nested_recorders_both_observe(self):
+        with QueryRecorder() as outer:
+            Medicine.objects.count()
+            with QueryRecorder(keep_queries=True) as inner:
+                Medicine.objects.count()
+        Medicine.objects.count()
+        self.assertEqual((outer.count, inner.count), (2, 1))
+        self.assertEqual(inner.queries[0]['alias'], 'default')
+
+    def test_dispatcher_is_installed_once(self):
+        Medicine.objects.count()
+        with connection.execute_wrapper(lambda execute, *args: execute(*args)):
+            Medicine.objects.count()
+        self.assertEqual(connection.execute_wrappers, [querylog.dispatch])
+
+    async def test_concurrent_recorders_only_see_their_own_queries(self):
+        async def queries(count):
+            async with QueryRecorder() as recorder:
+                for _ in range(count):
+                    await Medicine.objects.acount()
+                    await asyncio.sleep(0)
+            return recorder.count
+
+        self.assertEqual(await asyncio.gather(queries(1), queries(3)), [1, 3])
+
+    @override_settings(PROFILING_ENABLED=True)
+    async def test_async_view_queries_reach_the_request_recorder(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        staff = await User.objects.acreate(email='admin@fadjma.sn', is_staff=True, all_branches=True)
+        await sync_to_async(medicine)('PARA500')
+        with override_settings(PROFILING_DIR=directory.name):
+            response = await self.async_client.get('/api/async/medicines/', headers={
+                'Authorization': f'Bearer {AccessToken.for_user(staff)}', 'X-Profile': '1',
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertGreater(int(response['X-Profile-Queries']), 0)
+
+
+class FakeConnection:
+    """Connexion psycopg2 réduite à ce qu'utilise le pool"""
+
+    def __init__(self, healthy=True):
+        self.closed = 0
+        self.autocommit = True
+        self.healthy = healthy
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        if not self.healthy:
+            raise psycopg2.OperationalError('connexion perdue')
+        return mock.MagicMock()
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(TestCase):
+    """Connexions PostgreSQL partagées par les threads: réemploi, attente bornée, santé"""
+
+    def pool(self, **options):
+        self.opened = []
+
+        def connect():
+            self.opened.append(FakeConnection())
+            return self.opened[-1]
+
+        return ConnectionPool('default', connect, {'MIN_SIZE': 0, 'MAX_SIZE': 2, 'TIMEOUT': 0.05, **options})
+
+    def test_returned_connection_is_reused(self):
+        pool = self.pool()
+        first = pool.getconn()
+        pool.putconn(first)
+        self.assertIs(pool.getconn(), first)
+        self.assertEqual(
+            {key: pool.snapshot()[key] for key in ('size', 'in_use', 'idle', 'opened', 'checkouts')},
+            {'size': 1, 'in_use': 1, 'idle': 0, 'opened': 1, 'checkouts': 2},
+        )
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.pool(MAX_SIZE=1)
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual((pool.snapshot()['timeouts'], len(self.opened)), (1, 1))
+
+    def test_waiting_caller_gets_the_released_connection(self):
+        pool = self.pool(MAX_SIZE=1, TIMEOUT=5)
+        held = pool.getconn()
+        threading.Timer(0.05, pool.putconn, [held]).start()
+        self.assertIs(pool.getconn(), held)
+        self.assertEqual(pool.snapshot()['waits'], 1)
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        pool = self.pool()
+        connection = pool.getconn()
+        connection.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(connection)
+        self.assertEqual(connection.rollbacks, 1)
+
+    def test_broken_idle_connection_is_replaced(self):
+        pool = self.pool(CHECK_AFTER=0)
+        broken = pool.getconn()
+        pool.putconn(broken)
+        broken.healthy = False
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual((pool.snapshot()['health_check_failures'], pool.size), (1, 1))
+
+    def test_old_connection_is_closed_on_return(self):
+        pool = self.pool(MAX_LIFETIME=0)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual((pool.size, pool.snapshot()['idle']), (0, 0))
+
+    @skipUnless(connection.settings_dict['ENGINE'] == 'config.postgresql_pool', 'Moteur à pool non configuré')
+    def test_pool_statistics_are_exported(self):
+        Medicine.objects.count()
+        self.assertGreaterEqual(pool_stats()['default']['in_use'], 1)
+        self.assertIn('fadjma_db_pool_in_use{database="default"}', metrics.registry.render())
+
+
+STARTUP_IMPORTS = """
+import sys, django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(' '.join(name for name in sys.argv[1:] if name in sys.modules))
+"""
+
+
+class SchemaTests(TestCase):
+    """Schéma OpenAPI servi depuis les fichiers précalculés, modules lourds chargés à la demande"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = override_settings(OPENAPI_SCHEMA_DIR=directory.name)
+        patch.enable()
+        self.addCleanup(patch.disable)
+        self.directory = Path(directory.name)
+        schema._cache.clear()
+        self.addCleanup(schema._cache.clear)
+
+    def test_built_schema_is_served_with_an_etag(self):
+        call_command('build_schema', stdout=io.StringIO())
+        response = self.client.get('/api/schema/', {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, (self.directory / 'openapi.json').read_bytes())
+        self.assertIn('/api/medicines/', response.json()['paths'])
+        self.assertEqual(self.client.get('/api/schema/', {'format': 'json'}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertTrue(self.client.get('/api/schema/').content.startswith(b'openapi:'))
+
+    def test_rebuilt_file_replaces_the_served_schema(self):
+        (self.directory / 'openapi.yaml').write_bytes(b'openapi: 3.0.3\n')
+        first = self.client.get('/api/schema/')
+        (self.directory / 'openapi.yaml').write_bytes(b'openapi: 3.0.3\ninfo: {}\n')
+        second = self.client.get('/api/schema/')
+        self.assertEqual(second.content, b'openapi: 3.0.3\ninfo: {}\n')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_missing_file_is_generated_once_per_process(self):
+        with mock.patch.object(schema, 'generate_schema', return_value=b'openapi: 3.0.3\n') as generate:
+            for _ in range(2):
+                self.assertEqual(self.client.get('/api/schema/').status_code, 200)
+        generate.assert_called_once_with('yaml')
+
+    def test_url_loading_leaves_heavy_modules_unimported(self):
+        heavy = ['reportlab', 'PIL', 'drf_spectacular.views', 'drf_spectacular.generators']
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP_IMPORTS, *heavy], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'config.settings'}, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), '')
+
+
+def frame_request(last_event_id=None):
+    headers = {'HTTP_LAST_EVENT_ID': last_event_id} if last_event_id else {}
+    return RequestFactory().get('/api/events/stream/', **headers)
+
+
+@override_settings(AUDIT_ENABLED=False)
+class EventStreamTests(TestCase):
+    """Ventes et stock annoncés après validation; reprise après reconnexion, reset sinon"""
+
+    def setUp(self):
+        self.broker = events.Broker(history=10)
+        patch = mock.patch.object(events, 'broker', self.broker)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.branch = Branch.objects.create(name='Pharmacie Plateau', code='PLT')
+        self.medicine = medicine('PARA500', stock_quantity=10)
+        BranchStock.objects.create(branch=self.branch, medicine=self.medicine, stock_quantity=10)
+
+    def sell(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password='secret', branch=self.branch))
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post('/api/sales/', {
+                'payment_method': 'cash',
+                'items': [{'medicine': self.medicine.pk, 'quantity': 3, 'unit_price': '150.00'}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return callbacks
+
+    def history(self):
+        return list(self.broker._history)
+
+    def test_sale_is_announced_once_committed(self):
+        with mock.patch.object(events.Broker, 'has_subscribers', True):
+            callbacks = self.sell()
+            self.assertEqual(self.history(), [])
+            for callback in callbacks:
+                callback()
+        sale, stock = [event for event in self.history() if event['type'] != 'reset']
+        self.assertEqual((sale['type'], sale['branch'], sale['data']['quantity']), ('sale.created', self.branch.pk, 3))
+        self.assertEqual(stock['type'], 'stock.changed')
+        self.assertEqual(stock['data']['medicines'], [
+            {'id': self.medicine.pk, 'stock_quantity': 7, 'branch_stock_quantity': 7},
+        ])
+
+    def test_without_subscribers_a_reset_is_kept_instead(self):
+        callbacks = self.sell()
+        with self.assertNumQueries(0):
+            for callback in callbacks:
+                callback()
+        self.assertEqual({event['type'] for event in self.history()}, {events.RESET})
+
+    async def test_reconnected_client_receives_the_missed_events(self):
+        first = self.broker.publish('sale.created', None, {'id': 1})
+        self.broker.publish('sale.created', None, {'id': 2})
+        subscription = self.broker.subscribe(None, 10)
+        frames = event_frames(frame_request(first['id']), subscription)
+        self.assertTrue((await anext(frames)).startswith('retry:'))
+        self.assertIn('data: {"id":2}', await anext(frames))
+        self.broker.publish('stock.changed', None, {'medicines': []})
+        self.assertIn('event: stock.changed', await anext(frames))
+        await frames.aclose()
+        self.assertFalse(self.broker.has_subscribers)
+
+    async def test_unknown_or_incomplete_history_means_reset(self):
+        self.broker.publish('sale.created', None, {'id': 1})
+        self.broker.publish(events.RESET, None, {})
+        for last_event_id in ('autre-processus-1', self.history()[0]['id']):
+            frames = event_frames(frame_request(last_event_id), self.broker.subscribe(None, 10))
+            await anext(frames)
+            self.assertEqual(await anext(frames), 'event: reset\ndata: {}\n\n')
+            await frames.aclose()
+
+    async def test_slow_client_is_told_to_reload(self):
+        frames = event_frames(frame_request(), self.broker.subscribe(None, 1))
+        await anext(frames)
+        for number in range(2):
+            self.broker.publish('sale.created', None, {'id': number})
+        await asyncio.sleep(0)
+        self.assertEqual(await anext(frames), 'event: reset\ndata: {}\n\n')
+        with self.assertRaises(StopAsyncIteration):
+            await anext(frames)
+
+    async def test_branch_subscriber_only_sees_its_branch(self):
+        subscription = self.broker.subscribe(self.branch.pk, 10)
+        self.broker.publish('sale.created', self.branch.pk + 1, {'id': 1})
+        self.broker.publish('sale.created', self.branch.pk, {'id': 2})
+        self.broker.publish('stock.changed', None, {'medicines': []})
+        await asyncio.sleep(0)
+        received = [subscription.queue.get_nowait()['data'] for _ in range(subscription.queue.qsize())]
+        self.assertEqual(received, [{'id': 2}, {'medicines': []}])
+
+    async def test_stream_requires_a_token(self):
+        self.assertEqual((await self.async_client.get('/api/events/stream/')).status_code, 401)
+        user = await User.objects.acreate(email='siege@fadjma.sn', all_branches=True)
+        response = await self.async_client.get('/api/events/stream/', {'token': str(AccessToken.for_user(user))})
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/event-stream'))
+        content = aiter(response.streaming_content)
+        self.assertTrue((await anext(content)).startswith(b'retry:'))
+        await content.aclose()
+
+
+@override_settings(AUDIT_ENABLED=False)
+class CatalogChangesTests(TransactionTestCase):
+    """Flux de modifications: lignes au-delà de la position du client, suppressions, pagination"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password='secret', all_branches=True))
+
+    def changes(self, since=0, after=0, limit=None):
+        params = {'since': since, 'after': after, **({'limit': limit} if limit else {})}
+        response = self.client.get('/api/catalog/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def codes(self, data):
+        index = data['changes']['medicines']['fields'].index('medicine_id')
+        return [row[index] for row in data['changes']['medicines']['rows']]
+
+    def test_only_rows_written_since_the_version(self):
+        first = medicine('PARA500')
+        medicine('IBU400')
+        data = self.changes()
+        self.assertEqual(sorted(self.codes(data)), ['IBU400', 'PARA500'])
+        self.assertFalse(data['has_more'])
+
+        first.selling_price = Decimal('175.00')
+        first.save()
+        data = self.changes(data['version'], data['after'])
+        self.assertEqual(self.codes(data), ['PARA500'])
+        self.assertEqual(self.codes(self.changes(data['version'], data['after'])), [])
+
+    def test_deletions_are_listed(self):
+        item = medicine('PARA500')
+        version = self.changes()['version']
+        pk = item.pk
+        item.delete()
+        self.assertEqual(self.changes(version)['deleted']['medicines'], [pk])
+
+    def test_pagination_within_one_transaction(self):
+        with transaction.atomic():
+            for code in ('A1', 'A2', 'A3'):
+                medicine(code)
+        seen, data = [], {'version': 0, 'after': 0, 'has_more': True}
+        while data['has_more']:
+            data = self.changes(data['version'], data['after'], limit=2)
+            seen += self.codes(data)
+        self.assertEqual(sorted(seen), ['A1', 'A2', 'A3'])
+
+    def test_unknown_version_asks_for_reset(self):
+        data = self.changes(since=10 ** 15)
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['version'], 0)
+
+
+@override_settings(AUDIT_ENABLED=False, CATALOG_SNAPSHOT_MAX_AGE=0)
+class CatalogSnapshotTests(TransactionTestCase):
+    """Instantané servi tel quel, reconstruit en arrière-plan après une modification, complété par le flux"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = override_settings(CATALOG_SNAPSHOT_DIR=directory.name)
+        patch.enable()
+        self.addCleanup(patch.disable)
+        # Recherche de modifications jamais réutilisée d'un test à l'autre
+        checked = mock.patch.object(snapshot, '_checked_version', (float('-inf'), None, False))
+        checked.start()
+        self.addCleanup(checked.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password='secret', all_branches=True))
+        self.item = medicine('PARA500')
+
+    def download(self, **headers):
+        with mock.patch.object(snapshot, 'rebuild_in_background') as rebuild:
+            response = self.client.get('/api/catalog/snapshot/', **headers)
+        self.rebuild = rebuild
+        return response
+
+    def content(self, response):
+        return json.loads(gzip.decompress(b''.join(response.streaming_content)))
+
+    def test_first_download_builds_the_snapshot(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        data = self.content(response)
+        self.assertEqual(str(data['version']), response['X-Catalog-Version'])
+        fields = data['changes']['medicines']['fields']
+        self.assertEqual([row[fields.index('medicine_id')] for row in data['changes']['medicines']['rows']], ['PARA500'])
+        self.assertEqual(self.download(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_changed_catalog_is_rebuilt_in_the_background(self):
+        version, _ = snapshot.build_snapshot()
+        self.assertEqual(self.download()['X-Catalog-Version'], str(version))
+        self.rebuild.assert_not_called()
+
+        self.item.selling_price = Decimal('175.00')
+        self.item.save()
+        snapshot._checked_version = (float('-inf'), None, False)
+        response = self.download()
+        self.assertEqual(response['X-Catalog-Version'], str(version))
+        self.rebuild.assert_called_once_with()
+
+    def test_changes_since_the_snapshot_cover_later_writes(self):
+        version, _ = snapshot.build_snapshot()
+        medicine('IBU400')
+        data = self.client.get('/api/catalog/changes/', {'since': version}).data
+        fields = data['changes']['medicines']['fields']
+        self.assertIn('IBU400', [row[fields.index('medicine_id')] for row in data['changes']['medicines']['rows']])
+
+    def test_only_the_latest_snapshots_are_kept(self):
+        versions = []
+        for code in ('IBU400', 'AMOX1G', 'DOLI1G'):
+            versions.append(snapshot.build_snapshot()[0])
+            medicine(code)
+        versions.append(snapshot.build_snapshot()[0])
+        self.assertEqual([version for version, _ in snapshot.snapshots()], versions[-snapshot.KEEP:])
+
+
+class BulkUpdateTests(TestCase):
+    """Mise à jour en masse du catalogue, journalisée ligne à ligne"""
+
+    def setUp(self):
+        # Entrées en masse écrites directement; le thread du journal n'est pas lancé
+        patch = mock.patch.object(audit.AuditWriter, '_start')
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.admin = User.objects.create_user(email='admin@fadjma.sn', password='secret', is_staff=True, all_branches=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.group = MedicineGroup.objects.create(name='Antalgiques')
+        self.first = medicine('PARA500', group=self.group)
+        self.second = medicine('IBU400', group=self.group, selling_price=Decimal('200.00'))
+        self.other = medicine('AMOX1G')
+
+    def bulk_update(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/medicines/bulk_update/', data, format='json')
+
+    def test_bulk_price_change(self):
+        response = self.bulk_update(
+            filter={'group': self.group.pk}, price={'field': 'selling_price', 'mode': 'percent', 'value': '10'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        prices = dict(Medicine.objects.values_list('medicine_id', 'selling_price'))
+        self.assertEqual(prices, {'PARA500': Decimal('165.00'), 'IBU400': Decimal('220.00'), 'AMOX1G': Decimal('150.00')})
+        entry = AuditEntry.objects.get(object_id=self.second.pk, action='bulk_update')
+        self.assertEqual(entry.changes, {'selling_price': ['200.00', '220.00']})
+        self.assertEqual(entry.actor, self.admin)
+
+    def test_bulk_dry_run_changes_nothing(self):
+        response = self.bulk_update(
+            filter={'all': True}, price={'field': 'selling_price', 'mode': 'absolute', 'value': '-50'}, dry_run=True,
+        )
+        self.assertEqual(response.data['matched'], 3)
+        self.assertEqual(response.data['updated'], 0)
+        self.assertEqual(Medicine.objects.filter(selling_price=Decimal('100.00')).count(), 0)
+        self.assertFalse(AuditEntry.objects.filter(action='bulk_update').exists())
+
+    def test_bulk_negative_price_is_refused(self):
+        response = self.bulk_update(filter={'all': True}, price={'field': 'selling_price', 'mode': 'absolute', 'value': '-180'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Medicine.objects.filter(selling_price__lt=0).exists())
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password='secret', all_branches=True))
+        response = self.bulk_update(filter={'all': True}, price={'field': 'selling_price', 'mode': 'percent', 'value': '10'})
+        self.assertEqual(response.status_code, 403)
+
+
+class CatalogImportTests(TestCase):
+    """Import CSV du catalogue: colonnes présentes seules mises à jour, nouveaux codes créés, erreurs par ligne"""
+
+    def setUp(self):
+        patch = mock.patch.object(audit.AuditWriter, '_start')
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.admin = User.objects.create_user(email='admin@fadjma.sn', password='secret', is_staff=True, all_branches=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.group = MedicineGroup.objects.create(name='Antalgiques')
+        self.first = medicine('PARA500', group=self.group)
+        self.second = medicine('IBU400', group=self.group, selling_price=Decimal('200.00'))
+
+    def import_file(self, content, **data):
+        upload = SimpleUploadedFile('catalogue.csv', content.encode('utf-8'), content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/medicines/import/', {'file': upload, **data}, format='multipart')
+
+    def test_import_updates_only_present_columns(self):
+        response = self.import_file('medicine_id;purchase_price\nPARA500;120,50\nIBU400;abc\n')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['rejected']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['line'], 3)
+        self.first.refresh_from_db()
+        self.assertEqual((self.first.purchase_price, self.first.selling_price), (Decimal('120.50'), Decimal('150.00')))
+        entry = AuditEntry.objects.get(object_id=self.first.pk)
+        self.assertEqual((entry.action, entry.changes), ('bulk_update', {'purchase_price': ['100.00', '120.50']}))
+
+    def test_import_creates_new_codes(self):
+        response = self.import_file(
+            'code;nom;groupe;prix_achat;prix_vente\nDOLI1G;Doliprane 1g;Antalgiques;900;1200\nPARA500;Paracétamol;Antalgiques;100;150\n'
+        )
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        created = Medicine.objects.get(medicine_id='DOLI1G')
+        self.assertEqual((created.group, created.selling_price, created.created_by), (self.group, Decimal('1200.00'), self.admin))
+        self.assertEqual(AuditEntry.objects.get(object_id=created.pk).action, 'create')
+
+    def test_import_new_code_requires_all_columns(self):
+        response = self.import_file('medicine_id;purchase_price\nNOUVEAU;10\n')
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertFalse(Medicine.objects.filter(medicine_id='NOUVEAU').exists())
+
+    def test_import_dry_run_rolls_back(self):
+        response = self.import_file('medicine_id;purchase_price\nPARA500;120\n', dry_run=True)
+        self.assertEqual(response.data['updated'], 1)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.purchase_price, Decimal('100.00'))
+        self.assertFalse(AuditEntry.objects.exists())
+
+    def test_file_without_code_column_is_refused(self):
+        response = self.import_file('nom;prix_vente\nDoliprane;1200\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Medicine.objects.count(), 2)
+
+
+class AuditTests(TestCase):
+    """Entrées du journal écrites après validation, avec les seuls champs modifiés"""
+
+    def setUp(self):
+        # Écriture par flush() dans le fil du test, sans le thread du processus
+        patch = mock.patch.object(audit.AuditWriter, '_start')
+        patch.start()
+        self.addCleanup(patch.stop)
+        # Entrées laissées par d'autres tests: jamais écrites dans celui-ci
+        audit.writer._pending.clear()
+
+    def test_update_records_changed_fields(self):
+        item = medicine('PARA500')
+        item.selling_price = Decimal('175.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        audit.writer.flush()
+        entry = AuditEntry.objects.get(action='update')
+        self.assertEqual(entry.changes, {'selling_price': ['150.00', '175.00']})
+
+    def test_unchanged_save_records_nothing(self):
+        item = medicine('PARA500')
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        audit.writer.flush()
+        self.assertFalse(AuditEntry.objects.filter(action='update').exists())
+
+    def test_rolled_back_write_is_not_recorded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                medicine('PARA500')
+                transaction.set_rollback(True)
+        audit.writer.flush()
+        self.assertFalse(AuditEntry.objects.exists())
+
+    def test_api_write_records_the_actor_and_history_is_staff_only(self):
+        admin = User.objects.create_user(email='admin@fadjma.sn', password='secret', is_staff=True, all_branches=True)
+        item = medicine('PARA500')
+        client = APIClient()
+        client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(f'/api/medicines/{item.pk}/', {'selling_price': '175.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        audit.writer.flush()
+        history = client.get('/api/audit/', {'object_type': 'medicine', 'object_id': item.pk})
+        self.assertEqual(history.status_code, 200)
+        [entry] = history.data['results']
+        self.assertEqual((entry['action'], entry['actor']), ('update', admin.pk))
+        client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password='secret', all_branches=True))
+        self.assertEqual(client.get('/api/audit/').status_code, 403)
+
+    @override_settings(AUDIT_MAX_PENDING=2)
+    def test_full_buffer_drops_the_oldest_entries(self):
+        audit.writer.add([audit.entry(Medicine, pk, 'delete', {}) for pk in (1, 2)])
+        with self.assertLogs('api.audit', 'ERROR'):
+            audit.writer.add([audit.entry(Medicine, 3, 'delete', {})])
+        self.assertEqual(audit.writer.flush(), 2)
+        self.assertEqual(sorted(AuditEntry.objects.values_list('object_id', flat=True)), [2, 3])
+
+    @override_settings(AUDIT_MAX_PENDING=1)
+    def test_bulk_entries_bypass_the_buffer_cap(self):
+        for code in ('PARA500', 'IBU400', 'AMOX1G'):
+            medicine(code)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(
+            email='admin@fadjma.sn', password='secret', is_staff=True, all_branches=True,
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/medicines/bulk_update/', {
+                'filter': {'all': True}, 'price': {'field': 'purchase_price', 'mode': 'absolute', 'value': '5'},
+            }, format='json')
+        self.assertEqual(AuditEntry.objects.filter(action='bulk_update').count(), 3)
@@ -1,42 +1,71 @@
 
 
 from django.urls import path,include
+from . import async_views
+from .metrics import metrics_view
+from .profiling import profile_view
 from .reports import download_dashboard_report
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
+    LoginView,
     RegisterView,
     UserDetailView,
     ChangePasswordView,
     logout_view,
+    BranchViewSet,
     MedicineGroupViewSet,
     SupplierViewSet,
     ClientViewSet,
     MedicineViewSet,
     SaleViewSet,
     SaleItemViewSet,
-
+    PurchaseOrderViewSet,
+    GoodsReceiptViewSet,
+    StocktakeSessionViewSet,
+    SlowQueryViewSet,
+    AuditEntryViewSet,
+    stock_valuation_view,
+    catalog_changes_view,
+    catalog_snapshot_view,
 )
 
 app_name = 'api'
 router = DefaultRouter()
+router.register(r'branches', BranchViewSet, basename='branch')
 router.register(r'medicine-groups', MedicineGroupViewSet, basename='medicine-group')
 router.register(r'suppliers', SupplierViewSet, basename='supplier')
 router.register(r'clients', ClientViewSet, basename='client')
 router.register(r'medicines', MedicineViewSet, basename='medicine')
 router.register(r'sales', SaleViewSet, basename='sale')
 router.register(r'sale-items', SaleItemViewSet, basename='sale-item')
+router.register(r'purchase-orders', PurchaseOrderViewSet, basename='purchase-order')
+router.register(r'goods-receipts', GoodsReceiptViewSet, basename='goods-receipt')
+router.register(r'stocktakes', StocktakeSessionViewSet, basename='stocktake')
+router.register(r'slow-queries', SlowQueryViewSet, basename='slow-query')
+router.register(r'audit', AuditEntryViewSet, basename='audit-entry')
 
 
 
 urlpatterns = [
 
-    path('auth/login/', TokenObtainPairView.as_view(), name='login'),
+    path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/logout/', logout_view, name='logout'),
     path('auth/profile/', UserDetailView.as_view(), name='profile'),
     path('auth/change-password/', ChangePasswordView.as_view(), name='change_password'),
     path('reports/dashboard/', download_dashboard_report, name='dashboard_report'),
+    path('stock/valuation/', stock_valuation_view, name='stock_valuation'),
+    path('catalog/changes/', catalog_changes_view, name='catalog_changes'),
+    path('catalog/snapshot/', catalog_snapshot_view, name='catalog_snapshot'),
+    path('metrics', metrics_view, name='metrics'),
+    path('async/medicines/', async_views.medicine_list, name='async_medicine_list'),
+    path('async/medicines/alerts/', async_views.medicine_alerts, name='async_medicine_alerts'),
+    path('async/medicines/code/<str:medicine_id>/', async_views.medicine_by_code, name='async_medicine_by_code'),
+    path('async/medicines/<int:pk>/', async_views.medicine_detail, name='async_medicine_detail'),
+    path('async/sales/stats/', async_views.sale_stats, name='async_sale_stats'),
+    path('events/stream/', async_views.event_stream, name='event_stream'),
+    path('profiles/<str:profile_id>/', profile_view, name='profile_report'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Valorisation du stock sur tout le catalogue.
+
+Les quantités à une date donnée sont reconstituées à partir du stock courant
+et des mouvements postérieurs; le coût est calculé en coût moyen pondéré ou en
+FIFO à partir des réceptions. Tout le calcul est fait en SQL (une requête par
+valorisation), quel que soit le nombre de médicaments.
+"""
+from decimal import Decimal
+
+from django.db import connections, router
+from django.utils import timezone
+
+from .models import BranchStock, Medicine, MedicineGroup, StockMovement, Supplier
+
+METHODS = ('average', 'fifo')
+
+TWO_PLACES = Decimal('0.01')
+
+# Quantité en stock à la date demandée: stock courant moins les mouvements postérieurs
+_ON_HAND_SQL = """
+    later AS (
+        SELECT medicine_id, SUM(quantity) AS quantity
+        FROM {movement}
+        WHERE created_at > %s {branch_filter}
+        GROUP BY medicine_id
+    ),
+    on_hand AS (
+        SELECT m.id, m.group_id, m.supplier_id, m.purchase_price, m.selling_price,
+               CASE WHEN {stock} - COALESCE(l.quantity, 0) > 0
+                    THEN {stock} - COALESCE(l.quantity, 0) ELSE 0 END AS quantity
+        FROM {medicine} m
+        {stock_join}
+        LEFT JOIN later l ON l.medicine_id = m.id
+    )
+"""
+
+# Coût moyen pondéré des réceptions antérieures à la date
+_AVERAGE_SQL = """
+    WITH {on_hand},
+    costs AS (
+        SELECT medicine_id,
+               SUM(quantity * unit_cost) AS cost,
+               SUM(quantity) AS quantity
+        FROM {movement}
+        WHERE movement_type = 'receipt' AND created_at <= %s AND quantity > 0
+        GROUP BY medicine_id
+    ),
+    valued AS (
+        SELECT o.group_id, o.supplier_id, o.quantity,
+               o.quantity * COALESCE(c.cost * 1.0 / c.quantity, o.purchase_price) AS cost_value,
+               o.quantity * o.selling_price AS retail_value
+        FROM on_hand o
+        LEFT JOIN costs c ON c.medicine_id = o.id
+    )
+"""
+
+# FIFO: le stock restant provient des réceptions les plus récentes; chaque couche
+# (réception) couvre la part du stock qui n'est pas déjà couverte par les plus récentes
+_FIFO_SQL = """
+    WITH {on_hand},
+    layers AS (
+        SELECT medicine_id, quantity, unit_cost,
+               SUM(quantity) OVER (
+                   PARTITION BY medicine_id ORDER BY created_at DESC, id DESC
+               ) AS cumulative
+        FROM {movement}
+        WHERE movement_type = 'receipt' AND created_at <= %s AND quantity > 0
+    ),
+    consumed AS (
+        SELECT l.medicine_id, l.unit_cost,
+               CASE WHEN o.quantity <= l.cumulative - l.quantity THEN 0
+                    WHEN o.quantity >= l.cumulative THEN l.quantity
+                    ELSE o.quantity - (l.cumulative - l.quantity) END AS quantity
+        FROM layers l
+        JOIN on_hand o ON o.id = l.medicine_id
+    ),
+    costs AS (
+        SELECT medicine_id,
+               SUM(quantity * unit_cost) AS cost,
+               SUM(quantity) AS quantity
+        FROM consumed
+        GROUP BY medicine_id
+    ),
+    valued AS (
+        SELECT o.group_id, o.supplier_id, o.quantity,
+               COALESCE(c.cost, 0)
+               + (o.quantity - COALESCE(c.quantity, 0)) * o.purchase_price AS cost_value,
+               o.quantity * o.selling_price AS retail_value
+        FROM on_hand o
+        LEFT JOIN costs c ON c.medicine_id = o.id
+    )
+"""
+
+_GROUPED_SQL = """
+    SELECT group_id, supplier_id, COUNT(*), SUM(quantity), SUM(cost_value), SUM(retail_value)
+    FROM valued
+    GROUP BY group_id, supplier_id
+"""
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(TWO_PLACES)
+
+
+def _bucket():
+    return {'medicines': 0, 'quantity': 0, 'cost_value': Decimal('0'), 'retail_value': Decimal('0')}
+
+
+def _finish(bucket):
+    bucket['cost_value'] = _money(bucket['cost_value'])
+    bucket['retail_value'] = _money(bucket['retail_value'])
+    bucket['potential_margin'] = bucket['retail_value'] - bucket['cost_value']
+    return bucket
+
+
+def stock_valuation(at=None, method='average', branch=None):
+    """
+    Valorise le stock à la date `at` (maintenant par défaut), au coût et au prix
+    de vente, avec des sous-totaux par groupe et par fournisseur. Avec une
+    pharmacie, seules ses quantités sont valorisées; les coûts restent ceux de
+    l'ensemble des réceptions du catalogue.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Méthode de valorisation inconnue: {method}")
+    at = at or timezone.now()
+
+    alias = router.db_for_read(Medicine)
+    connection = connections[alias]
+    qn = connection.ops.quote_name
+    tables = {
+        'medicine': qn(Medicine._meta.db_table),
+        'movement': qn(StockMovement._meta.db_table),
+    }
+    at_param = connection.ops.adapt_datetimefield_value(at)
+    if branch is None:
+        on_hand = _ON_HAND_SQL.format(branch_filter='', stock='m.stock_quantity', stock_join='', **tables)
+        params = [at_param, at_param]
+    else:
+        on_hand = _ON_HAND_SQL.format(
+            branch_filter='AND branch_id = %s',
+            stock='COALESCE(s.stock_quantity, 0)',
+            stock_join=f'LEFT JOIN {qn(BranchStock._meta.db_table)} s ON s.medicine_id = m.id AND s.branch_id = %s',
+            **tables
+        )
+        params = [at_param, branch.pk, branch.pk, at_param]
+    template = _AVERAGE_SQL if method == 'average' else _FIFO_SQL
+    sql = template.format(on_hand=on_hand, **tables) + _GROUPED_SQL
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    totals = _bucket()
+    by_group, by_supplier = {}, {}
+    for group_id, supplier_id, count, quantity, cost_value, retail_value in rows:
+        for bucket in (totals, by_group.setdefault(group_id, _bucket()), by_supplier.setdefault(supplier_id, _bucket())):
+            bucket['medicines'] += count
+            bucket['quantity'] += int(quantity or 0)
+            bucket['cost_value'] += Decimal(str(cost_value or 0))
+            bucket['retail_value'] += Decimal(str(retail_value or 0))
+
+    group_names = dict(MedicineGroup.objects.filter(pk__in=[pk for pk in by_group if pk]).values_list('pk', 'name'))
+    supplier_names = dict(Supplier.objects.filter(pk__in=[pk for pk in by_supplier if pk]).values_list('pk', 'name'))
+
+    return {
+        'at': at,
+        'method': method,
+        'branch': branch.pk if branch else None,
+        'totals': _finish(totals),
+        'by_group': sorted(
+            ({'group': pk, 'group_name': group_names.get(pk), **_finish(bucket)} for pk, bucket in by_group.items()),
+            key=lambda row: row['cost_value'], reverse=True
+        ),
+        'by_supplier': sorted(
+            ({'supplier': pk, 'supplier_name': supplier_names.get(pk), **_finish(bucket)} for pk, bucket in by_supplier.items()),
+            key=lambda row: row['cost_value'], reverse=True
+        ),
+    }
@@ -1,12 +1,19 @@
 from django.shortcuts import render
 from rest_framework import status, generics
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema, OpenApiTypes
-from rest_framework_simplejwt.tokens import RefreshToken
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiTypes
+from rest_framework_simplejwt.views import TokenObtainPairView
+from users.blacklist import FilteredRefreshToken
+from users.throttling import LoginAccountThrottle, LoginIPThrottle, RegisterIPThrottle
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
 from django.utils import timezone
-from datetime import timedelta
+import csv
+import itertools
+from datetime import datetime, time, timedelta
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
@@ -16,18 +23,39 @@ from rest_framework import viewsets, filters
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 
-from django.db import models
-from .models import MedicineGroup, Supplier, Client, Medicine,Sale,SaleItem
-from .serializers import MedicineGroupSerializer, SupplierSerializer, ClientSerializer,MedicineSerializer,SaleSerializer, SaleItemSerializer
+from django.db import models, transaction
+from .models import (
+    Branch, BranchStock, MedicineGroup, Supplier, Client, Medicine, Sale, SaleItem, PurchaseOrder, GoodsReceipt,
+    StocktakeSession, SlowQuery, AuditEntry,
+)
+from . import bulk_update, catalog_import, changes, stocktake
+from .archive import SALE_COLUMNS, hot_data_start, iter_sales, sales_summary
+from .branches import BranchScopedMixin, user_branch, user_branch_id, with_branch_stock
+from .routing import ReplicaReadMixin, replica_reads
+from .snapshot import latest_snapshot, snapshot_for_download
+from .stock import adjust_stock, record_movements
+from .valuation import METHODS as VALUATION_METHODS, stock_valuation
+from .serializers import (
+    BranchSerializer, MedicineGroupSerializer, SupplierSerializer, ClientSerializer, MedicineSerializer, SaleSerializer,
+    SaleItemSerializer, PurchaseOrderSerializer, GoodsReceiptSerializer, StocktakeSessionSerializer,
+    StocktakeUploadSerializer, SlowQuerySerializer, MedicineBulkUpdateSerializer, CatalogImportSerializer,
+    AuditEntrySerializer,
+)
 
 
 User = get_user_model()
 
 
+class LoginView(TokenObtainPairView):
+    """Connexion (paire de jetons JWT), limitée par IP et par compte"""
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
+
+
 class RegisterView(generics.CreateAPIView):
     """Vue pour l'inscription d'un nouvel utilisateur"""
     queryset = User.objects.all()
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterIPThrottle]
     serializer_class = RegisterSerializer
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
@@ -101,7 +129,7 @@ def logout_view(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        token = RefreshToken(refresh_token)
+        token = FilteredRefreshToken(refresh_token)
         token.blacklist()
 
         return Response(
@@ -113,7 +141,25 @@ def logout_view(request):
             {"error": str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
-class MedicineGroupViewSet(viewsets.ModelViewSet):
+class BranchViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    """
+    ViewSet pour gérer les pharmacies du déploiement
+    Permet: list, retrieve (tous), create, update, delete (administrateurs)
+    """
+    queryset = Branch.objects.all()
+    serializer_class = BranchSerializer
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['name', 'code']
+    filterset_fields = ['is_active']
+    ordering_fields = ['name', 'created_at']
+    ordering = ['name']
+
+    def get_permissions(self):
+        if self.action in ('list', 'retrieve'):
+            return [IsAuthenticated()]
+        return [IsAdminUser()]
+
+class MedicineGroupViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les groupes de médicaments
     Permet: list, create, retrieve, update, delete
@@ -126,7 +172,7 @@ class MedicineGroupViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les fournisseurs
     Permet: list, create, retrieve, update, delete
@@ -139,7 +185,7 @@ class SupplierViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(ReplicaReadMixin, BranchScopedMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les clients
     Permet: list, create, retrieve, update, delete
@@ -149,11 +195,11 @@ class ClientViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['first_name', 'last_name', 'phone', 'email']
-    filterset_fields = ['gender']
+    filterset_fields = ['gender', 'branch']
     ordering_fields = ['last_name', 'created_at']
     ordering = ['last_name', 'first_name']
 
-class MedicineViewSet(viewsets.ModelViewSet):
+class MedicineViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les médicaments
     Permet: list, create, retrieve, update, delete
@@ -168,12 +214,55 @@ class MedicineViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'expiration_date', 'stock_quantity', 'selling_price', 'created_at']
     ordering = ['name']
 
+    def get_queryset(self):
+        """Ajoute le stock de la pharmacie de l'utilisateur (catalogue commun)"""
+        queryset = super().get_queryset()
+        branch_id = user_branch_id(self.request.user)
+        if branch_id is not None:
+            queryset = with_branch_stock(queryset, branch_id)
+        return queryset
+
+    def save_with_stock(self, serializer, **kwargs):
+        """
+        Enregistre le médicament; une quantité en stock saisie devient un
+        ajustement (stock total, stock de la pharmacie de l'utilisateur et
+        mouvement de stock), pour que BranchStock suive le stock total
+        """
+        target = serializer.validated_data.pop('stock_quantity', None)
+        branch = user_branch(self.request.user)
+        with transaction.atomic():
+            medicine = serializer.save(**kwargs)
+            if target is None:
+                return
+            current = Medicine.objects.select_for_update().filter(pk=medicine.pk).values_list('stock_quantity', flat=True).get()
+            if branch is not None:
+                current = BranchStock.objects.filter(branch=branch, medicine=medicine).values_list('stock_quantity', flat=True).first() or 0
+            delta = target - current
+            if delta:
+                adjust_stock({medicine.pk: delta}, branch=branch)
+                record_movements(
+                    'adjustment', [(medicine.pk, delta, None)],
+                    reference=medicine.medicine_id, user=self.request.user, branch=branch,
+                )
+        medicine.refresh_from_db(fields=['stock_quantity'])
+
+    def perform_create(self, serializer):
+        self.save_with_stock(serializer)
+
+    def perform_update(self, serializer):
+        self.save_with_stock(serializer)
+
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         """Retourne les médicaments avec stock faible"""
-        low_stock_medicines = self.queryset.filter(
-            stock_quantity__lte=models.F('min_stock_alert')
-        )
+        if user_branch_id(request.user) is not None:
+            low_stock_medicines = self.get_queryset().filter(
+                branch_stock_quantity__lte=models.F('branch_min_stock_alert')
+            )
+        else:
+            low_stock_medicines = self.get_queryset().filter(
+                stock_quantity__lte=models.F('min_stock_alert')
+            )
         serializer = self.get_serializer(low_stock_medicines, many=True)
         return Response(serializer.data)
 
@@ -181,7 +270,7 @@ class MedicineViewSet(viewsets.ModelViewSet):
     def expiring_soon(self, request):
         """Retourne les médicaments expirant dans les 30 jours"""
         thirty_days_later = timezone.now().date() + timedelta(days=30)
-        expiring_medicines = self.queryset.filter(
+        expiring_medicines = self.get_queryset().filter(
             expiration_date__lte=thirty_days_later,
             expiration_date__gte=timezone.now().date()
         )
@@ -191,13 +280,84 @@ class MedicineViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def expired(self, request):
         """Retourne les médicaments expirés"""
-        expired_medicines = self.queryset.filter(
+        expired_medicines = self.get_queryset().filter(
             expiration_date__lt=timezone.now().date()
         )
         serializer = self.get_serializer(expired_medicines, many=True)
         return Response(serializer.data)
 
-class SaleViewSet(viewsets.ModelViewSet):
+    @extend_schema(request=MedicineBulkUpdateSerializer, responses=OpenApiTypes.OBJECT)
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_update(self, request):
+        """
+        Modifie en un seul UPDATE les prix (pourcentage ou montant, par groupe ou
+        fournisseur) et attributs des médicaments sélectionnés; dry_run=true
+        renvoie le résumé sans rien modifier
+        """
+        serializer = MedicineBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = bulk_update.bulk_update_medicines(serializer.validated_data)
+        except bulk_update.BulkUpdateError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    @extend_schema(request={'multipart/form-data': CatalogImportSerializer}, responses=OpenApiTypes.OBJECT)
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser])
+    def import_catalog(self, request):
+        """
+        Importe ou met à jour le catalogue depuis un fichier CSV ou XLSX (clé
+        medicine_id); renvoie le rapport d'import avec les erreurs par ligne
+        """
+        upload = CatalogImportSerializer(data=request.data)
+        upload.is_valid(raise_exception=True)
+        uploaded_file = upload.validated_data['file']
+        try:
+            report = catalog_import.import_catalog(
+                catalog_import.read_rows(uploaded_file, uploaded_file.name),
+                user=request.user,
+                create_groups=upload.validated_data['create_groups'],
+                dry_run=upload.validated_data['dry_run'],
+            )
+        except (catalog_import.CatalogImportError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+
+def day_bounds(day):
+    """
+    [minuit, minuit du lendemain) en heure locale: un filtre en plage sur
+    created_at (contrairement à created_at__date) permet à PostgreSQL de ne lire
+    que la partition mensuelle concernée.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def parse_period(params):
+    """Période ?start=AAAA-MM-JJ&end=AAAA-MM-JJ (bornes incluses) -> [début, fin)"""
+    start = end = None
+    for name in ('start', 'end'):
+        if not params.get(name):
+            continue
+        day = parse_date(params[name])
+        if day is None:
+            raise ValueError(params[name])
+        if name == 'start':
+            start = day_bounds(day)[0]
+        else:
+            end = day_bounds(day)[1]
+    return start, end
+
+
+class Echo:
+    """Pseudo-fichier pour csv.writer: renvoie la ligne au lieu de l'écrire"""
+
+    def write(self, value):
+        return value
+
+
+class SaleViewSet(ReplicaReadMixin, BranchScopedMixin, viewsets.ModelViewSet):
     """
     ViewSet pour gérer les ventes
     Permet: list, create, retrieve (pas de update/delete pour l'intégrité)
@@ -207,7 +367,12 @@ class SaleViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['sale_number', 'client__first_name', 'client__last_name']
-    filterset_fields = ['payment_method', 'client']
+    filterset_fields = {
+        'payment_method': ['exact'],
+        'client': ['exact'],
+        'branch': ['exact'],
+        'created_at': ['gte', 'lt'],
+    }
     ordering_fields = ['created_at', 'total_amount']
     ordering = ['-created_at']
 
@@ -217,9 +382,8 @@ class SaleViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def today(self, request):
         """Retourne les ventes du jour"""
-        today_sales = self.queryset.filter(
-            created_at__date=timezone.now().date()
-        )
+        start, end = day_bounds(timezone.localdate())
+        today_sales = self.get_queryset().filter(created_at__gte=start, created_at__lt=end)
         serializer = self.get_serializer(today_sales, many=True)
         return Response(serializer.data)
 
@@ -228,26 +392,59 @@ class SaleViewSet(viewsets.ModelViewSet):
         """Statistiques des ventes"""
         from django.db.models import Sum, Count
 
-        today = timezone.now().date()
+        start, end = day_bounds(timezone.localdate())
+        today_sales = self.get_queryset().filter(created_at__gte=start, created_at__lt=end)
+
+        try:
+            period_start, period_end = parse_period(request.query_params)
+        except ValueError:
+            return Response({'error': 'Date invalide (format AAAA-MM-JJ)'}, status=status.HTTP_400_BAD_REQUEST)
+        # Total sur la période (tout l'historique par défaut), ventes archivées comprises
+        summary = sales_summary(user_branch_id(request.user), period_start, period_end)
 
         stats = {
             'today': {
-                'count': self.queryset.filter(created_at__date=today).count(),
-                'total': self.queryset.filter(created_at__date=today).aggregate(
+                'count': today_sales.count(),
+                'total': today_sales.aggregate(
                     total=Sum('total_amount')
                 )['total'] or 0
             },
             'total': {
-                'count': self.queryset.count(),
-                'total': self.queryset.aggregate(
-                    total=Sum('total_amount')
-                )['total'] or 0
+                'count': summary['count'],
+                'total': summary['revenue'],
+                'quantity': summary['quantity'],
             }
         }
 
         return Response(stats)
 
-class SaleItemViewSet(viewsets.ReadOnlyModelViewSet):
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('start', OpenApiTypes.DATE, description="Premier jour (AAAA-MM-JJ)"),
+            OpenApiParameter('end', OpenApiTypes.DATE, description="Dernier jour inclus (AAAA-MM-JJ)"),
+        ],
+        responses={(200, 'text/csv'): OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Export CSV des ventes d'une période, mois archivés compris"""
+        try:
+            period_start, period_end = parse_period(request.query_params)
+        except ValueError:
+            return Response({'error': 'Date invalide (format AAAA-MM-JJ)'}, status=status.HTTP_400_BAD_REQUEST)
+
+        writer = csv.writer(Echo(), delimiter=';')
+        rows = (
+            writer.writerow([sale[column] for column in SALE_COLUMNS])
+            for sale in iter_sales(user_branch_id(request.user), period_start, period_end)
+        )
+        response = StreamingHttpResponse(
+            itertools.chain([writer.writerow(SALE_COLUMNS)], rows), content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="ventes_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
+        return response
+
+class SaleItemViewSet(ReplicaReadMixin, BranchScopedMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet pour consulter les lignes de vente (lecture seule)
     Permet: list, retrieve (pas de création/modification)
@@ -257,13 +454,21 @@ class SaleItemViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['medicine__name', 'sale__sale_number']
-    filterset_fields = ['medicine', 'sale']
-    ordering_fields = ['sale__created_at', 'quantity', 'total_price']
-    ordering = ['-sale__created_at']
+    filterset_fields = {
+        'medicine': ['exact'],
+        'sale': ['exact'],
+        'created_at': ['gte', 'lt'],
+    }
+    ordering_fields = ['created_at', 'quantity', 'total_price']
+    ordering = ['-created_at']
 
     @action(detail=False, methods=['get'])
     def by_medicine(self, request):
-        """Statistiques de vente par médicament"""
+        """
+        Statistiques de vente par médicament, sur les tables chaudes seulement:
+        les mois archivés (api/archive.py) ne sont pas relus. hot_data_from
+        donne le début de la période couverte (null: aucun mois archivé).
+        """
         from django.db.models import Sum, Count
 
         medicine_id = request.query_params.get('medicine_id')
@@ -273,12 +478,292 @@ class SaleItemViewSet(viewsets.ReadOnlyModelViewSet):
                 status=400
             )
 
-        stats = self.queryset.filter(medicine_id=medicine_id).aggregate(
+        stats = self.get_queryset().filter(medicine_id=medicine_id).aggregate(
             total_quantity=Sum('quantity'),
             total_sales=Count('id'),
             total_revenue=Sum('total_price')
         )
+        stats['hot_data_from'] = hot_data_start()
 
         return Response(stats)
 
 
+class PurchaseOrderViewSet(ReplicaReadMixin, BranchScopedMixin, viewsets.ModelViewSet):
+    """
+    ViewSet pour gérer les bons de commande fournisseurs
+    Permet: list, create, retrieve, partial_update (statut, notes), cancel
+    """
+    queryset = PurchaseOrder.objects.select_related('supplier', 'created_by').prefetch_related('items__medicine').all()
+    serializer_class = PurchaseOrderSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['order_number', 'supplier__name']
+    filterset_fields = ['supplier', 'status', 'branch']
+    ordering_fields = ['created_at', 'expected_date']
+    ordering = ['-created_at']
+
+    http_method_names = ['get', 'post', 'patch', 'head', 'options']
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Annule une commande qui n'a encore rien reçu"""
+        order = self.get_object()
+        with transaction.atomic():
+            # Verrou partagé avec les réceptions: pas d'annulation pendant qu'une livraison s'enregistre
+            order.status = PurchaseOrder.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+            if order.status in ('partial', 'received'):
+                return Response(
+                    {'error': 'Une commande déjà réceptionnée ne peut pas être annulée'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            order.status = 'cancelled'
+            order.save(update_fields=['status', 'updated_at'])
+        return Response(self.get_serializer(order).data)
+
+class GoodsReceiptViewSet(ReplicaReadMixin, BranchScopedMixin, viewsets.ModelViewSet):
+    """
+    ViewSet pour gérer les réceptions de marchandises
+    Permet: list, create, retrieve (pas de update/delete: le stock a déjà été incrémenté)
+    """
+    queryset = GoodsReceipt.objects.select_related(
+        'supplier', 'purchase_order', 'received_by'
+    ).prefetch_related('items__medicine').all()
+    serializer_class = GoodsReceiptSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['receipt_number', 'delivery_reference', 'supplier__name']
+    filterset_fields = ['supplier', 'purchase_order', 'branch']
+    ordering_fields = ['received_at']
+    ordering = ['-received_at']
+
+    http_method_names = ['get', 'post', 'head', 'options']
+
+
+class StocktakeSessionViewSet(ReplicaReadMixin, BranchScopedMixin, viewsets.ModelViewSet):
+    """
+    ViewSet pour les inventaires physiques
+    Permet: list, create, retrieve, import des comptages, écarts, validation, annulation
+    """
+    queryset = StocktakeSession.objects.select_related('created_by', 'approved_by').annotate(
+        lines_count=models.Count('counts')
+    )
+    serializer_class = StocktakeSessionSerializer
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['reference', 'notes']
+    filterset_fields = ['status', 'branch']
+    ordering_fields = ['created_at', 'approved_at']
+    ordering = ['-created_at']
+
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def get_serializer_class(self):
+        if self.action == 'counts':
+            return StocktakeUploadSerializer
+        return super().get_serializer_class()
+
+    @action(detail=True, methods=['post'])
+    def counts(self, request, pk=None):
+        """Importe des comptages (CSV: medicine_id;counted_quantity, ou JSON)"""
+        session = self.get_object()
+        upload = StocktakeUploadSerializer(data=request.data)
+        upload.is_valid(raise_exception=True)
+
+        if upload.validated_data.get('file'):
+            rows = stocktake.read_csv(upload.validated_data['file'])
+        else:
+            rows = upload.validated_data['counts']
+        try:
+            totals, errors = stocktake.parse_counts(rows)
+            saved, unknown = stocktake.save_counts(session, totals, replace=upload.validated_data['replace'])
+        except (stocktake.StocktakeError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'saved': saved,
+            'unknown_medicines': unknown,
+            'errors': errors,
+        })
+
+    @extend_schema(parameters=[OpenApiParameter('only_differences', OpenApiTypes.BOOL)], responses=OpenApiTypes.OBJECT)
+    @action(detail=True, methods=['get'])
+    def variance(self, request, pk=None):
+        """Rapport d'écarts entre comptages et stock théorique"""
+        only_differences = request.query_params.get('only_differences') in ('1', 'true', 'True')
+        return Response(stocktake.variance_report(self.get_object(), only_differences=only_differences))
+
+    @action(detail=True, methods=['post'])
+    def approve(self, request, pk=None):
+        """Valide l'inventaire et applique les ajustements de stock"""
+        try:
+            session, adjusted = stocktake.approve(self.get_object(), request.user)
+        except stocktake.StocktakeError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'reference': session.reference,
+            'status': session.status,
+            'adjusted_medicines': adjusted,
+        })
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Annule un inventaire en cours (aucun ajustement appliqué)"""
+        session = self.get_object()
+        if session.status != 'open':
+            return Response({'error': "L'inventaire n'est plus ouvert."}, status=status.HTTP_400_BAD_REQUEST)
+        session.status = 'cancelled'
+        session.save(update_fields=['status'])
+        return Response({'reference': session.reference, 'status': session.status})
+
+
+class SlowQueryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Requêtes SQL lentes relevées par SlowQueryMiddleware (personnel uniquement)
+    Filtres: endpoint, method, database, duration_ms__gte, created_at__gte/__lt
+    """
+    queryset = SlowQuery.objects.select_related('user').all()
+    serializer_class = SlowQuerySerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    search_fields = ['sql', 'path']
+    filterset_fields = {
+        'endpoint': ['exact'],
+        'method': ['exact'],
+        'database': ['exact'],
+        'duration_ms': ['gte'],
+        'created_at': ['gte', 'lt'],
+    }
+    ordering_fields = ['created_at', 'duration_ms']
+    ordering = ['-created_at']
+
+
+class AuditEntryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Journal d'audit des médicaments, fournisseurs, clients et utilisateurs (personnel uniquement)
+    Historique d'un objet: ?object_type=medicine&object_id=42 (index dédié)
+    Autres filtres: action, actor, created_at__gte/__lt
+    """
+    queryset = AuditEntry.objects.select_related('actor').all()
+    serializer_class = AuditEntrySerializer
+    permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'object_type': ['exact'],
+        'object_id': ['exact'],
+        'action': ['exact'],
+        'actor': ['exact'],
+        'created_at': ['gte', 'lt'],
+    }
+    ordering_fields = ['created_at']
+    ordering = ['-created_at', '-id']
+
+
+def parse_as_of(value):
+    """Interprète un paramètre de date (AAAA-MM-JJ = fin de journée) ou de date-heure"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day, time.max)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter('at', OpenApiTypes.STR, description="Date de valorisation (AAAA-MM-JJ), maintenant par défaut"),
+        OpenApiParameter('method', OpenApiTypes.STR, enum=list(VALUATION_METHODS)),
+    ],
+    responses=OpenApiTypes.OBJECT,
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def stock_valuation_view(request):
+    """Valorisation du stock (coût et prix de vente) par groupe et fournisseur"""
+    method = request.query_params.get('method', 'average')
+    if method not in VALUATION_METHODS:
+        return Response(
+            {'error': f"method doit valoir {' ou '.join(VALUATION_METHODS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        at = parse_as_of(request.query_params.get('at'))
+    except ValueError:
+        return Response({'error': 'Date invalide (format AAAA-MM-JJ)'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(stock_valuation(at=at, method=method, branch=user_branch(request.user)))
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter('since', OpenApiTypes.INT, description="Version reçue lors de la dernière synchronisation (0 au départ)"),
+        OpenApiParameter('after', OpenApiTypes.INT, description="after reçu avec cette version (0 par défaut)"),
+        OpenApiParameter('limit', OpenApiTypes.INT, description=f"Éléments au plus (défaut {changes.DEFAULT_LIMIT}, max {changes.MAX_LIMIT})"),
+    ],
+    responses=OpenApiTypes.OBJECT,
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_changes_view(request):
+    """
+    Modifications du catalogue (médicaments, groupes, fournisseurs) et
+    suppressions depuis une version; rappeler avec la version et le after
+    renvoyés tant que has_more est vrai, tout recharger si reset est vrai.
+    """
+    try:
+        since = int(request.query_params.get('since', 0))
+        after = int(request.query_params.get('after', 0))
+        limit = int(request.query_params.get('limit', changes.DEFAULT_LIMIT))
+    except ValueError:
+        return Response({'error': 'since, after et limit doivent être des entiers'}, status=status.HTTP_400_BAD_REQUEST)
+    if since < 0 or after < 0 or limit < 1:
+        return Response({'error': 'since, after et limit doivent être positifs'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(changes.changes_since(since, after, min(limit, changes.MAX_LIMIT)))
+
+
+@extend_schema(responses={(200, 'application/gzip'): OpenApiTypes.BINARY})
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_snapshot_view(request):
+    """
+    Catalogue complet compressé (gzip, forme compacte du flux de
+    modifications), à compléter par /api/catalog/changes/?since=<version>.
+    """
+    def unavailable():
+        response = Response({'error': 'Instantané en cours de reconstruction, réessayer'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = '5'
+        return response
+
+    snapshot = snapshot_for_download()
+    if snapshot is None:
+        return unavailable()
+    version, path = snapshot
+    etag = f'"catalog-{version}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    try:
+        handle = open(path, 'rb')
+    except FileNotFoundError:
+        # Remplacé entre-temps par une reconstruction
+        snapshot = latest_snapshot()
+        if snapshot is None:
+            return unavailable()
+        version, path = snapshot
+        etag = f'"catalog-{version}"'
+        try:
+            handle = open(path, 'rb')
+        except FileNotFoundError:
+            return unavailable()
+    response = FileResponse(handle, as_attachment=True, filename=path.name, content_type='application/gzip')
+    response['ETag'] = etag
+    response['X-Catalog-Version'] = str(version)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,96 @@
+"""
+Routage base principale / réplica en lecture.
+
+Les lectures ne partent vers l'alias 'replica' que si une vue l'a demandé
+explicitement (actions en lecture seule, rapports) et que l'utilisateur n'a pas
+écrit récemment: après une écriture, ses lectures restent sur 'default'
+pendant REPLICA_STICKY_SECONDS pour qu'il relise ses propres données malgré le
+retard de réplication. Sans réplica configuré, tout reste sur 'default'.
+
+L'adhérence est stockée dans le cache 'replica_sticky', partagé entre les
+workers (Redis, Memcached...) pour s'appliquer d'un processus à l'autre: les
+réglages refusent un réplica avec un cache propre au processus.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+STICKY_CACHE = 'replica_sticky'
+
+_use_replica = ContextVar('db_router_use_replica', default=False)
+_user_id = ContextVar('db_router_user_id', default=None)
+_marked = ContextVar('db_router_marked', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def _sticky_key(user_id):
+    return f'db-router:sticky:{user_id}'
+
+
+def is_sticky(user_id):
+    """L'utilisateur a-t-il écrit dans les dernières REPLICA_STICKY_SECONDS ?"""
+    return user_id is not None and caches[STICKY_CACHE].get(_sticky_key(user_id)) is not None
+
+
+def mark_sticky(user_id):
+    if user_id is not None:
+        caches[STICKY_CACHE].set(_sticky_key(user_id), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+@contextmanager
+def routing_context():
+    """Isole l'état de routage d'une requête (rétabli à la sortie)"""
+    tokens = [(_use_replica, _use_replica.set(False)), (_user_id, _user_id.set(None)), (_marked, _marked.set(False))]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def bind_user(user):
+    """Associe l'utilisateur authentifié à la requête en cours (pour l'adhérence)"""
+    _user_id.set(getattr(user, 'pk', None))
+
+
+def use_replica():
+    """Envoie les lectures de la requête en cours vers le réplica, si possible"""
+    _use_replica.set(replica_configured() and not is_sticky(_user_id.get()))
+
+
+async def ause_replica():
+    """use_replica() pour les vues asynchrones (lecture du cache sans bloquer la boucle)"""
+    if not replica_configured():
+        _use_replica.set(False)
+        return
+    user_id = _user_id.get()
+    sticky = user_id is not None and await caches[STICKY_CACHE].aget(_sticky_key(user_id)) is not None
+    _use_replica.set(not sticky)
+
+
+class ReplicaRouter:
+    """Routeur de bases: écritures sur 'default', lectures demandées sur 'replica'"""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if not _marked.get() and _user_id.get() is not None:
+            mark_sticky(_user_id.get())
+            _marked.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,6 @@
+"""
+Moteur PostgreSQL avec pool de connexions intégré (ENGINE = 'config.postgresql_pool').
+
+Voir pool.py pour le fonctionnement et config/settings.py (DB_POOL_*) pour le
+réglage.
+"""
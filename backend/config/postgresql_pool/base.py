@@ -0,0 +1,39 @@
+from django.db.backends.postgresql import base, creation
+from django.db.backends.base.base import NO_DB_ALIAS
+
+from .pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Une base ne peut être supprimée tant que le pool y garde des connexions
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Backend PostgreSQL de Django dont les connexions viennent d'un pool partagé"""
+
+    creation_class = DatabaseCreation
+
+    @property
+    def pooled(self):
+        # Connexions techniques (création de la base de test...): hors pool
+        return self.alias != NO_DB_ALIAS
+
+    def get_new_connection(self, conn_params):
+        if not self.pooled:
+            return super().get_new_connection(conn_params)
+        connect = super().get_new_connection
+        self.pool = get_pool(self.alias, self.settings_dict, lambda: connect(conn_params))
+        return self.pool.getconn()
+
+    def _close(self):
+        if self.connection is None or not self.pooled:
+            return super()._close()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django garde la référence jusqu'à la fin du bloc atomic: ne pas la prêter entre-temps
+                self.pool.discard(self.connection)
+            else:
+                self.pool.putconn(self.connection)
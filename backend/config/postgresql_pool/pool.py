@@ -0,0 +1,270 @@
+"""
+Pool de connexions PostgreSQL par processus.
+
+Django 5.0 n'a pas de pool intégré (psycopg2): sans CONN_MAX_AGE, chaque
+requête ouvre une connexion (TCP, TLS, authentification); avec, chaque thread
+garde la sienne, même inactive. Ici les connexions sont partagées par tous les
+threads du processus: Django « ferme » sa connexion à la fin de la requête
+(CONN_MAX_AGE=0) et elle retourne au pool, prête pour la requête suivante.
+
+- taille: MIN_SIZE connexions ouvertes d'avance (en arrière-plan), MAX_SIZE au
+  plus; au-delà, une demande attend qu'une connexion se libère, TIMEOUT
+  secondes au plus (PoolTimeout, une OperationalError);
+- santé: une connexion inactive depuis plus de CHECK_AFTER secondes est testée
+  (SELECT 1) avant d'être rendue; une connexion fermée, en erreur ou plus
+  vieille que MAX_LIFETIME est remplacée;
+- les connexions inactives depuis plus de MAX_IDLE secondes sont fermées, dans
+  la limite de MIN_SIZE;
+- statistiques (attente, délais dépassés, échecs de santé...) exposées par
+  /api/metrics.
+"""
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger('config.postgresql_pool')
+
+DEFAULTS = {
+    'MIN_SIZE': 2,
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'CHECK_AFTER': 30,
+    'MAX_IDLE': 300,
+    'MAX_LIFETIME': 3600,
+}
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Aucune connexion libérée dans le délai imparti"""
+
+
+class IdleConnection:
+    __slots__ = ('connection', 'last_used')
+
+    def __init__(self, connection, last_used):
+        self.connection = connection
+        self.last_used = last_used
+
+
+class ConnectionPool:
+    def __init__(self, name, connect, options):
+        options = {**DEFAULTS, **options}
+        self.name = name
+        self.connect = connect
+        self.min_size = options['MIN_SIZE']
+        self.max_size = max(1, options['MAX_SIZE'])
+        self.timeout = options['TIMEOUT']
+        self.check_after = options['CHECK_AFTER']
+        self.max_idle = options['MAX_IDLE']
+        self.max_lifetime = options['MAX_LIFETIME']
+
+        self._cond = threading.Condition()
+        self._idle = []  # pile: les connexions les plus récemment rendues à la fin
+        self._created = {}
+        self._closed = False
+        self.size = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'opened': 0,
+            'closed': 0,
+        }
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while not self._idle and self.size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'Pool {self.name}: aucune connexion libre après {self.timeout}s ({self.max_size} en cours)'
+                    )
+                self.waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                self.size += 1
+            self.in_use += 1
+            waited = time.monotonic() - started
+            self.stats['checkouts'] += 1
+            if waited > 0.001:
+                self.stats['waits'] += 1
+                self.stats['wait_seconds'] += waited
+                self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], waited)
+
+        try:
+            if entry is not None:
+                if self._usable(entry):
+                    return entry.connection
+                self._close(entry.connection)
+            return self._open()
+        except BaseException:
+            with self._cond:
+                self.size -= 1
+                self.in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, connection):
+        now = time.monotonic()
+        reusable = not self._closed and not connection.closed and \
+            now - self._created.get(connection, now) < self.max_lifetime
+        if reusable:
+            try:
+                if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+        if not reusable:
+            self._close(connection)
+
+        with self._cond:
+            self.in_use -= 1
+            if reusable:
+                self._idle.append(IdleConnection(connection, now))
+            else:
+                self.size -= 1
+            expired = []
+            while self._idle and self.size > self.min_size and now - self._idle[0].last_used > self.max_idle:
+                expired.append(self._idle.pop(0).connection)
+                self.size -= 1
+            self._cond.notify()
+        for stale in expired:
+            self._close(stale)
+
+    def discard(self, connection):
+        """Ferme une connexion empruntée au lieu de la rendre"""
+        self._close(connection)
+        with self._cond:
+            self.in_use -= 1
+            self.size -= 1
+            self._cond.notify()
+
+    def prewarm(self):
+        """Ouvre MIN_SIZE connexions en arrière-plan (le démarrage n'attend pas la base)"""
+        def fill():
+            while True:
+                with self._cond:
+                    if self._closed or self.size >= self.min_size:
+                        return
+                    self.size += 1
+                try:
+                    connection = self._open()
+                except Exception:
+                    with self._cond:
+                        self.size -= 1
+                    logger.warning('Pool %s: préouverture impossible', self.name, exc_info=True)
+                    return
+                with self._cond:
+                    self._idle.insert(0, IdleConnection(connection, time.monotonic()))
+                    self._cond.notify()
+
+        threading.Thread(target=fill, name=f'db-pool-{self.name}', daemon=True).start()
+
+    def close(self):
+        """Ferme les connexions inactives; celles en cours le seront à leur retour"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self.size -= len(idle)
+        for entry in idle:
+            self._close(entry.connection)
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'waiting': self.waiting,
+                'max_size': self.max_size,
+                **self.stats,
+            }
+
+    def _count(self, name):
+        with self._cond:
+            self.stats[name] += 1
+
+    def _usable(self, entry):
+        connection = entry.connection
+        now = time.monotonic()
+        if connection.closed or now - self._created.get(connection, now) >= self.max_lifetime:
+            return False
+        if now - entry.last_used < self.check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+            return True
+        except psycopg2.Error:
+            self._count('health_check_failures')
+            logger.warning('Pool %s: connexion inactive hors service, remplacée', self.name)
+            return False
+
+    def _open(self):
+        connection = self.connect()
+        self._created[connection] = time.monotonic()
+        self._count('opened')
+        return connection
+
+    def _close(self, connection):
+        self._created.pop(connection, None)
+        self._count('closed')
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+
+_pools = {}
+_pools_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict, connect):
+    """Pool de l'alias (une base de test a le sien: la clé comprend le nom de la base)"""
+    global _pools_pid
+    key = (alias, settings_dict['NAME'])
+    with _lock:
+        if _pools_pid != os.getpid():
+            # Processus forké (gunicorn --preload): les sockets du parent ne sont pas à nous
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(alias, connect, settings_dict.get('POOL', {}))
+            pool.prewarm()
+        return pool
+
+
+def close_pools(database_name=None):
+    """Ferme les pools (de la base `database_name`, ou tous)"""
+    with _lock:
+        keys = [key for key in _pools if database_name is None or key[1] == database_name]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """{alias: statistiques} des pools du processus"""
+    with _lock:
+        pools = list(_pools.items())
+    return {alias: pool.snapshot() for (alias, _name), pool in pools}
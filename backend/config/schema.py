@@ -0,0 +1,106 @@
+"""
+Schéma OpenAPI précalculé.
+
+drf-spectacular reconstruit le schéma (introspection de toutes les vues et de
+tous les serializers) à chaque appel de /api/schema/. Le schéma est désormais
+généré au déploiement par `python manage.py build_schema`, qui écrit
+OPENAPI_SCHEMA_DIR/openapi.yaml et openapi.json; schema_view les sert tels
+quels (lus une fois par processus, avec ETag). Sans fichier précalculé, le
+schéma est généré au premier appel puis gardé en mémoire.
+
+drf-spectacular n'est importé qu'à la génération ou au premier affichage de la
+documentation (lazy_view): le chargement des URL au démarrage ne le tire pas.
+"""
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_safe
+
+logger = logging.getLogger('config.schema')
+
+FORMATS = {
+    'yaml': ('openapi.yaml', 'application/vnd.oai.openapi; charset=utf-8'),
+    'json': ('openapi.json', 'application/vnd.oai.openapi+json; charset=utf-8'),
+}
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def generate_schema(fmt):
+    """Schéma complet rendu en YAML ou JSON (comme `manage.py spectacular`)"""
+    from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    renderer = OpenApiJsonRenderer() if fmt == 'json' else OpenApiYamlRenderer()
+    return renderer.render(schema, renderer_context={})
+
+
+def schema_path(fmt):
+    return Path(settings.OPENAPI_SCHEMA_DIR) / FORMATS[fmt][0]
+
+
+def schema_content(fmt):
+    """(contenu, etag) du schéma: fichier précalculé s'il existe, sinon généré une fois par processus"""
+    path = schema_path(fmt)
+    try:
+        version = path.stat().st_mtime_ns
+    except OSError:
+        version = None
+    cached = _cache.get(fmt)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    with _lock:
+        cached = _cache.get(fmt)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        if version is not None:
+            content = path.read_bytes()
+        else:
+            logger.warning('Schéma OpenAPI non précalculé (%s): génération à la demande', path)
+            content = generate_schema(fmt)
+        etag = hashlib.md5(content).hexdigest()
+        _cache[fmt] = (version, content, etag)
+        return content, etag
+
+
+def requested_format(request):
+    fmt = request.GET.get('format', '')
+    if fmt:
+        return 'json' if 'json' in fmt else 'yaml'
+    return 'json' if 'json' in request.headers.get('Accept', '') else 'yaml'
+
+
+@csrf_exempt
+@require_safe
+@condition(etag_func=lambda request: schema_content(requested_format(request))[1])
+def schema_view(request):
+    """Schéma OpenAPI (YAML par défaut, JSON avec ?format=json ou Accept: application/json)"""
+    fmt = requested_format(request)
+    content, _ = schema_content(fmt)
+    response = HttpResponse(content, content_type=FORMATS[fmt][1])
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def lazy_view(view_path, **initkwargs):
+    """Vue basée sur une classe, importée et construite à sa première requête"""
+    view = None
+
+    @csrf_exempt
+    def dispatch(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(view_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+    return dispatch
@@ -1,5 +1,6 @@
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
 import os
 import dj_database_url
@@ -34,6 +35,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.slowqueries.SlowQueryMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -42,10 +46,47 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.audit.AuditMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
+# Métriques Prometheus par point d'accès (api/metrics.py), exposées sur /api/metrics
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# Nombre de répétitions d'une même requête SQL à partir duquel un N+1 est signalé
+METRICS_NPLUS1_THRESHOLD = config('METRICS_NPLUS1_THRESHOLD', default=5, cast=int)
+
+# Profilage à la demande (api/profiling.py): en-tête X-Profile, personnel uniquement
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_KEEP = config('PROFILING_KEEP', default=100, cast=int)
+
+# Requêtes SQL lentes (api/slowqueries.py), consultables sur /api/slow-queries/; 0 pour désactiver
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=500, cast=int)
+SLOW_QUERY_MAX_PER_REQUEST = config('SLOW_QUERY_MAX_PER_REQUEST', default=10, cast=int)
+# Part des SELECT lents rejoués sous EXPLAIN (ANALYZE, BUFFERS), et durée maximale de ce rejeu
+SLOW_QUERY_EXPLAIN_RATE = config('SLOW_QUERY_EXPLAIN_RATE', default=0.1, cast=float)
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = config('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', default=5000, cast=int)
+
+# Événements en direct (api/events.py) sur /api/events/stream/ (SSE, déploiement ASGI)
+EVENTS_HISTORY = config('EVENTS_HISTORY', default=500, cast=int)
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=1000, cast=int)
+EVENTS_KEEPALIVE_SECONDS = config('EVENTS_KEEPALIVE_SECONDS', default=15, cast=int)
+EVENTS_RETRY_MS = config('EVENTS_RETRY_MS', default=3000, cast=int)
+
+# Instantané compressé du catalogue (api/snapshot.py) servi par /api/catalog/snapshot/,
+# reconstruit en arrière-plan quand le catalogue a changé et qu'il a plus de MAX_AGE secondes
+CATALOG_SNAPSHOT_DIR = config('CATALOG_SNAPSHOT_DIR', default=str(BASE_DIR / 'snapshots'))
+CATALOG_SNAPSHOT_MAX_AGE = config('CATALOG_SNAPSHOT_MAX_AGE', default=300, cast=int)
+
+# Journal d'audit (api/audit.py) sur /api/audit/: entrées mises en tampon à la validation,
+# écrites par lots par un thread du processus
+AUDIT_ENABLED = config('AUDIT_ENABLED', default=True, cast=bool)
+AUDIT_BATCH_SIZE = config('AUDIT_BATCH_SIZE', default=500, cast=int)
+AUDIT_FLUSH_SECONDS = config('AUDIT_FLUSH_SECONDS', default=2.0, cast=float)
+AUDIT_MAX_PENDING = config('AUDIT_MAX_PENDING', default=50000, cast=int)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -65,22 +106,68 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 DATABASE_URL = os.getenv('DATABASE_URL') or os.environ.get('DATABASE_URL')
 
+# Pool de connexions PostgreSQL (config/postgresql_pool), pour les deux configurations
+DB_POOL_ENABLED = config('DB_POOL_ENABLED', default=True, cast=bool)
+DB_POOL = {
+    'MIN_SIZE': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+    'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+    # Attente maximale d'une connexion libre (secondes)
+    'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=float),
+    # Connexion inactive depuis plus de CHECK_AFTER secondes: testée avant usage
+    'CHECK_AFTER': config('DB_POOL_CHECK_AFTER', default=30, cast=float),
+    'MAX_IDLE': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+    'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+}
+
+
+def pooled(database):
+    """Bascule une configuration PostgreSQL sur le moteur à pool (le pool remplace CONN_MAX_AGE)"""
+    if not DB_POOL_ENABLED or database.get('ENGINE') != 'django.db.backends.postgresql':
+        return database
+    return {**database, 'ENGINE': 'config.postgresql_pool', 'CONN_MAX_AGE': 0, 'POOL': DB_POOL}
+
+
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': pooled(dj_database_url.parse(DATABASE_URL, conn_max_age=600))
     }
 else:
     DATABASES = {
-        'default': {
+        'default': pooled({
             'ENGINE': 'django.db.backends.postgresql',
             'NAME': config('DATABASE_NAME', default='fadjma_db'),
             'USER': config('DATABASE_USER', default='postgres'),
             'PASSWORD': config('DATABASE_PASSWORD', default='root'),
             'HOST': config('DATABASE_HOST',default='localhost'),
             'PORT': config('DATABASE_PORT', default='5432'),
-        }
+            'CONN_MAX_AGE': 600,
+        })
     }
 
+# Réplica en lecture optionnel (rapports, statistiques, actions en lecture seule)
+REPLICA_DATABASE_URL = config('REPLICA_DATABASE_URL', default='')
+DATABASE_REPLICA_HOST = config('DATABASE_REPLICA_HOST', default='')
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = pooled(dj_database_url.parse(REPLICA_DATABASE_URL, conn_max_age=600))
+elif DATABASE_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DATABASE_REPLICA_HOST,
+        'PORT': config('DATABASE_REPLICA_PORT', default=DATABASES['default'].get('PORT', '')),
+    }
+if 'replica' in DATABASES:
+    # En test, le réplica est un miroir de la base de test principale
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+# Durée pendant laquelle un utilisateur qui vient d'écrire relit sur le primaire
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# Archivage à froid des ventes (python manage.py archive_sales)
+SALES_ARCHIVE_DIR = config('SALES_ARCHIVE_DIR', default=str(BASE_DIR / 'archives' / 'sales'))
+# Nombre de mois conservés dans les tables chaudes
+SALES_ARCHIVE_AFTER_MONTHS = config('SALES_ARCHIVE_AFTER_MONTHS', default=24, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -105,7 +192,7 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -118,22 +205,76 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Mandataires de confiance devant l'application: 0 = REMOTE_ADDR seul, X-Forwarded-For ignoré
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+    # Seaux à jetons des routes d'authentification (users/throttling.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('THROTTLE_LOGIN_IP', default='20/min'),
+        'login_account': config('THROTTLE_LOGIN_ACCOUNT', default='5/min'),
+        'register_ip': config('THROTTLE_REGISTER_IP', default='10/hour'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Seaux de limitation de débit, partagés par les threads du processus
+    'throttle': {
+        'BACKEND': config('THROTTLE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('THROTTLE_CACHE_LOCATION', default='throttle'),
+    },
+    # Adhérence au primaire après une écriture (config/db_router.py): doit être vue de tous les workers
+    'replica_sticky': {
+        'BACKEND': config('REPLICA_STICKY_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('REPLICA_STICKY_CACHE_LOCATION', default='replica-sticky'),
+    },
 }
+if 'replica' in DATABASES and CACHES['replica_sticky']['BACKEND'] in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache',
+):
+    # Un cache propre au processus laisserait un autre worker relire sur le réplica juste après une écriture
+    raise ImproperlyConfigured(
+        'Réplica configuré: REPLICA_STICKY_CACHE_BACKEND doit désigner un cache partagé (Redis, Memcached, base de données).'
+    )
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': True,
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.FilteredTokenRefreshSerializer',
 }
+
+# Cache par processus des utilisateurs authentifiés par JWT (0 = désactivé)
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=60, cast=int)
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=10000, cast=int)
+
+# Filtre de Bloom de la liste noire des refresh tokens (users/blacklist.py)
+# Délai maximal avant qu'une révocation faite par un autre processus soit vue par le filtre
+BLACKLIST_FILTER_SYNC_SECONDS = config('BLACKLIST_FILTER_SYNC_SECONDS', default=5, cast=int)
+# Marge de relecture des entrées récentes (transactions validées tardivement, horloges décalées)
+BLACKLIST_FILTER_SYNC_OVERLAP_SECONDS = config('BLACKLIST_FILTER_SYNC_OVERLAP_SECONDS', default=30, cast=int)
+BLACKLIST_FILTER_REBUILD_SECONDS = config('BLACKLIST_FILTER_REBUILD_SECONDS', default=3600, cast=int)
+BLACKLIST_FILTER_ERROR_RATE = config('BLACKLIST_FILTER_ERROR_RATE', default=0.01, cast=float)
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='http://localhost:3000').split(',')
 CORS_ALLOW_CREDENTIALS = True
-CLOUDINARY_STORAGE = {
-    'CLOUD_NAME': config('CLOUDINARY_CLOUD_NAME'),
-    'API_KEY': config('CLOUDINARY_API_KEY'),
-    'API_SECRET': config('CLOUDINARY_API_SECRET'),
-}
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+# Stockage des fichiers envoyés: 'cloudinary' ou 'local' (MEDIA_ROOT, hors ligne / développement)
+MEDIA_STORAGE = config('MEDIA_STORAGE', default='cloudinary')
+if MEDIA_STORAGE == 'local':
+    CLOUDINARY_STORAGE = {
+        'CLOUD_NAME': config('CLOUDINARY_CLOUD_NAME', default=''),
+        'API_KEY': config('CLOUDINARY_API_KEY', default=''),
+        'API_SECRET': config('CLOUDINARY_API_SECRET', default=''),
+    }
+    DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+else:
+    CLOUDINARY_STORAGE = {
+        'CLOUD_NAME': config('CLOUDINARY_CLOUD_NAME'),
+        'API_KEY': config('CLOUDINARY_API_KEY'),
+        'API_SECRET': config('CLOUDINARY_API_SECRET'),
+    }
+    DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Pharmacy Management API',
     'DESCRIPTION': 'API de gestion de pharmacie avec Django et Next.js',
@@ -143,4 +284,8 @@ SPECTACULAR_SETTINGS = {
     'SWAGGER_UI_SETTINGS': {
         'deepLinking': True,
     },
-}
\ No newline at end of file
+    # Import de users.schema (extension JWT) à la génération seulement
+    'PREPROCESSING_HOOKS': ['users.schema.register_extensions'],
+}
+# Schéma précalculé par `python manage.py build_schema`, servi tel quel par /api/schema/
+OPENAPI_SCHEMA_DIR = config('OPENAPI_SCHEMA_DIR', default=str(BASE_DIR / 'openapi'))
\ No newline at end of file
@@ -1,3 +1,25 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import User
+
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    """
+    Comptes utilisateurs: le personnel rattache un compte à une pharmacie ou
+    lui ouvre l'accès à toutes les pharmacies (l'inscription ne le permet pas).
+    Les comptes se créent par l'inscription, les mots de passe ne se modifient pas ici.
+    """
+    list_display = ['email', 'first_name', 'last_name', 'role', 'branch', 'all_branches', 'is_staff', 'is_active']
+    list_filter = ['role', 'branch', 'all_branches', 'is_staff', 'is_active']
+    search_fields = ['email', 'first_name', 'last_name']
+    list_select_related = ['branch']
+    ordering = ['email']
+    fields = [
+        'email', 'first_name', 'last_name', 'phone', 'role',
+        'branch', 'all_branches', 'is_active', 'is_staff', 'last_login', 'date_joined',
+    ]
+    readonly_fields = ['email', 'last_login', 'date_joined']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,126 @@
+"""
+Authentification JWT sans requête utilisateur à chaque appel.
+
+JWTAuthentication relit l'utilisateur en base (SELECT par clé primaire) à chaque
+requête authentifiée. Ici l'utilisateur est résolu depuis les claims du jeton
+puis depuis un cache par processus: les valeurs de colonnes de l'utilisateur
+sont gardées AUTH_USER_CACHE_TTL secondes et une instance neuve en est
+reconstruite à chaque requête (aucun état partagé entre requêtes).
+
+Le cache est invalidé à l'enregistrement ou à la suppression d'un utilisateur
+(users/signals.py). Les autres processus ne voient pas cette invalidation: le
+TTL borne le délai, y compris pour une désactivation. Les mises à jour en masse
+(QuerySet.update) ne déclenchent pas de signal et attendent aussi le TTL.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserRecordCache:
+    """Cache TTL (par processus, thread-safe) des lignes utilisateur"""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(value):
+        return str(value)
+
+    def get(self, user_id):
+        """Instance reconstruite depuis le cache, ou None (absente ou expirée)"""
+        record = self._records.get(self._key(user_id))
+        if record is None or record[0] < time.monotonic():
+            return None
+        model = get_user_model()
+        return model.from_db(DEFAULT_DB_ALIAS, record[1], record[2])
+
+    def set(self, user):
+        ttl = settings.AUTH_USER_CACHE_TTL
+        if ttl <= 0:
+            return user
+        fields = user._meta.concrete_fields
+        attnames = [field.attname for field in fields]
+        if any(attname in user.get_deferred_fields() for attname in attnames):
+            return user
+        values = tuple(getattr(user, attname) for attname in attnames)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._records) >= settings.AUTH_USER_CACHE_SIZE:
+                self._records = {key: record for key, record in self._records.items() if record[0] >= now}
+                while len(self._records) >= settings.AUTH_USER_CACHE_SIZE:
+                    self._records.pop(next(iter(self._records)))
+            self._records[self._key(getattr(user, api_settings.USER_ID_FIELD))] = (now + ttl, attnames, values)
+        return user
+
+    def invalidate(self, user):
+        with self._lock:
+            self._records.pop(self._key(getattr(user, api_settings.USER_ID_FIELD)), None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+user_cache = UserRecordCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication servant l'utilisateur depuis user_cache quand c'est possible"""
+
+    @staticmethod
+    def user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    @staticmethod
+    def check_user(user, validated_token):
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    def get_user(self, validated_token):
+        user_id = self.user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            # Lecture en base et contrôles standards, puis mise en cache
+            return user_cache.set(super().get_user(validated_token))
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() pour les vues asynchrones (api/async_views.py)"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        """get_user() avec lecture en base par l'ORM asynchrone en cas d'absence du cache"""
+        user_id = self.user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            return user_cache.set(self.check_user(user, validated_token))
+        return self.check_user(user, validated_token)
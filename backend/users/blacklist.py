@@ -0,0 +1,180 @@
+"""
+Vérification rapide de la liste noire des refresh tokens.
+
+Avec ROTATE_REFRESH_TOKENS et BLACKLIST_AFTER_ROTATION, chaque rafraîchissement
+ajoute une ligne à BlacklistedToken et la vérification d'un refresh token
+interroge cette table (jointure sur le jti). Ici un filtre de Bloom en mémoire
+(par processus), construit depuis la table, répond seul quand le jti est
+certainement absent, sans aucune requête; une réponse positive (vraie ou faux
+positif) est toujours confirmée en base sur le jti.
+
+Les révocations faites par ce processus (rotation, déconnexion) entrent dans
+le filtre immédiatement. Celles des autres processus sont rattrapées par une
+synchronisation incrémentale en tâche de fond, toutes les
+BLACKLIST_FILTER_SYNC_SECONDS au plus: lecture des entrées récentes
+(blacklisted_at, indexé) depuis la précédente, avec une marge de
+BLACKLIST_FILTER_SYNC_OVERLAP_SECONDS pour qu'une transaction validée
+tardivement ou une horloge légèrement décalée n'en fasse pas manquer. Ce délai
+borne la fenêtre pendant laquelle un jeton révoké ailleurs reste accepté, comme
+le TTL du cache des utilisateurs (users/authentication.py).
+
+La reconstruction complète (toutes les BLACKLIST_FILTER_REBUILD_SECONDS, ou
+au-delà de la capacité), qui retire les entrées purgées par
+prune_token_blacklist, se fait aussi dans un thread: pendant la première
+construction, toutes les vérifications passent par la base.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+logger = logging.getLogger('users.blacklist')
+
+MIN_CAPACITY = 10000
+
+
+class BloomFilter:
+    """Filtre de Bloom (bytearray + double hachage blake2b)"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class BlacklistFilter:
+    """Filtre de Bloom des jti en liste noire, synchronisé avec BlacklistedToken"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        # Entrées blacklistées depuis cette date relues à la prochaine synchronisation
+        self._synced_from = None
+        self._built_at = self._synced_at = float('-inf')
+        self._running = set()
+
+    def _jtis(self, since=None):
+        queryset = BlacklistedToken.objects.all()
+        if since is not None:
+            queryset = queryset.filter(blacklisted_at__gte=since)
+        return queryset.values_list('token__jti', flat=True)
+
+    def _overlap(self):
+        return timedelta(seconds=settings.BLACKLIST_FILTER_SYNC_OVERLAP_SECONDS)
+
+    def _rebuild(self):
+        started = timezone.now()
+        bloom = BloomFilter(max(MIN_CAPACITY, BlacklistedToken.objects.count() * 2), settings.BLACKLIST_FILTER_ERROR_RATE)
+        for jti in self._jtis().iterator(chunk_size=5000):
+            bloom.add(jti)
+        with self._lock:
+            # Entrées validées pendant la lecture: rattrapées par la synchronisation suivante
+            self._bloom, self._synced_from = bloom, started - self._overlap()
+            self._built_at = self._synced_at = time.monotonic()
+
+    def _sync(self):
+        """
+        Ajoute au filtre les entrées récentes (depuis la dernière lecture, marge
+        comprise); False sans filtre ou si le filtre a été remplacé entre-temps.
+        """
+        with self._lock:
+            bloom, since = self._bloom, self._synced_from
+        if bloom is None:
+            return False
+        now = timezone.now()
+        jtis = list(self._jtis(since))
+        with self._lock:
+            if bloom is not self._bloom:
+                return False
+            for jti in jtis:
+                if jti not in bloom:
+                    bloom.add(jti)
+            self._synced_from = max(self._synced_from, now - self._overlap())
+            self._synced_at = time.monotonic()
+        return True
+
+    def _in_background(self, task, name):
+        """Lance task dans un thread, sauf si la même tâche est déjà en cours"""
+        with self._lock:
+            if name in self._running:
+                return False
+            self._running.add(name)
+
+        def run():
+            try:
+                task()
+            except Exception:
+                logger.exception('Échec de la tâche %s du filtre de liste noire', name)
+            finally:
+                with self._lock:
+                    self._running.discard(name)
+                connections.close_all()
+        threading.Thread(target=run, name=f'blacklist-filter-{name}', daemon=True).start()
+        return True
+
+    def rebuild_in_background(self):
+        """Lance la reconstruction complète dans un thread, sauf si une est déjà en cours"""
+        return self._in_background(self._rebuild, 'rebuild')
+
+    def sync_in_background(self):
+        """Lance la synchronisation incrémentale dans un thread, sauf si une est déjà en cours"""
+        return self._in_background(self._sync, 'sync')
+
+    def might_contain(self, jti):
+        """False: certainement absent de la liste noire (sans requête); True: à confirmer en base"""
+        with self._lock:
+            bloom = self._bloom
+        now = time.monotonic()
+        if (
+            bloom is None or bloom.count > bloom.capacity
+            or now - self._built_at >= settings.BLACKLIST_FILTER_REBUILD_SECONDS
+        ):
+            self.rebuild_in_background()
+        elif now - self._synced_at >= settings.BLACKLIST_FILTER_SYNC_SECONDS:
+            self.sync_in_background()
+        return bloom is None or jti in bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None and jti not in self._bloom:
+                self._bloom.add(jti)
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken dont la vérification de liste noire passe par blacklist_filter"""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = 'Supprime par lots les jetons expirés (liste des jetons émis et liste noire)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Jetons supprimés par transaction (défaut: 5000)')
+
+    def handle(self, *args, **options):
+        # Un jeton expiré est refusé avant toute vérification de liste noire:
+        # ses lignes ne servent plus à rien
+        now = aware_utcnow()
+        batch_size = options['batch_size']
+        blacklisted = outstanding = 0
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{outstanding} jeton(s) expiré(s) supprimé(s), dont {blacklisted} en liste noire'
+        ))
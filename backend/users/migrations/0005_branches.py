@@ -0,0 +1,20 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_branches'),
+        ('users', '0004_alter_user_managers_remove_user_username_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='api.branch', verbose_name='Pharmacie'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index sur la date de mise en liste noire (table de simplejwt), pour la
+    lecture des entrées récentes par users/blacklist.py.
+    """
+
+    dependencies = [
+        ('users', '0006_image_variants'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS "token_blacklist_blacklisted_at_idx" '
+            'ON "token_blacklist_blacklistedtoken" ("blacklisted_at")',
+            'DROP INDEX IF EXISTS "token_blacklist_blacklisted_at_idx"',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-19 18:41
+
+from django.db import migrations, models
+
+
+def keep_existing_access(apps, schema_editor):
+    """Les comptes existants sans pharmacie gardent l'accès à toutes les pharmacies qu'ils avaient"""
+    User = apps.get_model('users', 'User')
+    User.objects.using(schema_editor.connection.alias).filter(branch__isnull=True).update(all_branches=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_blacklisted_token_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='all_branches',
+            field=models.BooleanField(default=False, verbose_name='Accès à toutes les pharmacies'),
+        ),
+        migrations.RunPython(keep_existing_access, migrations.RunPython.noop),
+    ]
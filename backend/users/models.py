@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 from django.core.validators import RegexValidator
 
+from api.images import AVATAR_VARIANTS, remember_source, save_with_variants
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -68,12 +70,33 @@ class User(AbstractUser):
         default='user',
         verbose_name="Rôle"
     )
+    branch = models.ForeignKey(
+        'api.Branch',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='users',
+        verbose_name="Pharmacie"
+    )
+    # Accès à toutes les pharmacies (administration centrale), accordé par le personnel
+    all_branches = models.BooleanField(
+        default=False,
+        verbose_name="Accès à toutes les pharmacies"
+    )
     avatar = models.ImageField(
         upload_to='avatars/',
         blank=True,
         null=True,
         verbose_name="Photo de profil"
     )
+    # Variante WebP générée à l'envoi de la photo (api/images.py)
+    avatar_thumbnail = models.ImageField(
+        upload_to='avatars/variants/',
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Miniature de la photo"
+    )
 
     class Meta:
         verbose_name = "Utilisateur"
@@ -82,6 +105,15 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.first_name} {self.last_name}" if self.first_name else self.email
 
+    def save(self, *args, **kwargs):
+        save_with_variants(self, super().save, 'avatar', AVATAR_VARIANTS, *args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        remember_source(instance, 'avatar')
+        return instance
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -0,0 +1,14 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """Même schéma OpenAPI (Bearer JWT) que JWTAuthentication"""
+    target_class = 'users.authentication.CachedJWTAuthentication'
+
+
+def register_extensions(endpoints, **kwargs):
+    """
+    Hook de prétraitement de drf-spectacular: son import enregistre
+    CachedJWTScheme juste avant la génération du schéma (rien à filtrer).
+    """
+    return endpoints
@@ -2,6 +2,9 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+
+from .blacklist import FilteredRefreshToken
 
 
 
@@ -11,16 +14,16 @@ User = get_user_model()
 class UserSerializer(serializers.ModelSerializer):
     """Serializer pour afficher les informations utilisateur"""
     avatar = serializers.ImageField(required=False, allow_null=True, use_url=True)
-
+    avatar_thumbnail = serializers.ImageField(read_only=True, use_url=True)
 
     class Meta:
         model = User
         fields = [
             'id', 'email', 'first_name', 'last_name',
             'gender', 'birth_date', 'phone',
-            'role', 'avatar', 'full_name', 'role_display'
+            'role', 'branch', 'all_branches', 'avatar', 'avatar_thumbnail', 'full_name', 'role_display'
         ]
-        read_only_fields = ['id', 'full_name', 'role_display']
+        read_only_fields = ['id', 'branch', 'all_branches', 'avatar_thumbnail', 'full_name', 'role_display']
         extra_kwargs = {
                     'avatar': {'required': False, 'allow_null': True}
                 }
@@ -127,3 +130,8 @@ class ChangePasswordSerializer(serializers.Serializer):
         user.set_password(self.validated_data['new_password'])
         user.save()
         return user
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """Rafraîchissement avec vérification de liste noire par filtre de Bloom"""
+    token_class = FilteredRefreshToken
@@ -1,3 +1,199 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from api.models import Branch
+from users import blacklist
+from users.authentication import user_cache
+from users.models import User
+
+PASSWORD = 'Motdepasse-solide-2024'
+
+
+class BranchAssignmentTests(TestCase):
+    """Rattachement à une pharmacie réservé au personnel; sans rattachement, pas d'accès aux données"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.branch = Branch.objects.create(name='Pharmacie Plateau', code='PLT')
+        self.client = APIClient()
+
+    def test_register_ignores_branch(self):
+        response = self.client.post('/api/auth/register/', {
+            'email': 'nouveau@fadjma.sn', 'password': PASSWORD, 'password2': PASSWORD,
+            'first_name': 'Awa', 'last_name': 'Diop', 'branch': self.branch.pk, 'all_branches': True,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(email='nouveau@fadjma.sn')
+        self.assertIsNone(user.branch_id)
+        self.assertFalse(user.all_branches)
+
+    def test_profile_cannot_grant_central_access(self):
+        user = User.objects.create_user(email='caisse@fadjma.sn', password=PASSWORD)
+        self.client.force_authenticate(user)
+        self.client.patch('/api/auth/profile/', {'all_branches': True, 'first_name': 'Awa'}, format='json')
+        user.refresh_from_db()
+        self.assertFalse(user.all_branches)
+
+    def test_unassigned_user_is_refused(self):
+        self.client.force_authenticate(User.objects.create_user(email='caisse@fadjma.sn', password=PASSWORD))
+        self.assertEqual(self.client.get('/api/medicines/').status_code, 403)
+        self.assertEqual(self.client.get('/api/sales/').status_code, 403)
+
+    def test_assigned_and_central_users_are_allowed(self):
+        for email, extra in (('caisse@fadjma.sn', {'branch': self.branch}), ('siege@fadjma.sn', {'all_branches': True})):
+            self.client.force_authenticate(User.objects.create_user(email=email, password=PASSWORD, **extra))
+            self.assertEqual(self.client.get('/api/medicines/').status_code, 200)
+
+
+class CachedUserTests(TestCase):
+    """Utilisateur des jetons d'accès servi depuis le cache du processus, relu après modification"""
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.user = User.objects.create_user(email='caisse@fadjma.sn', password=PASSWORD, first_name='Awa')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/auth/profile/')
+        return response, [query['sql'] for query in queries.captured_queries if 'users_user' in query['sql']]
+
+    def test_second_request_does_not_read_the_user(self):
+        response, reads = self.profile()
+        self.assertEqual((response.status_code, len(reads)), (200, 1))
+        response, reads = self.profile()
+        self.assertEqual((response.status_code, reads), (200, []))
+        self.assertEqual(response.data['first_name'], 'Awa')
+
+    def test_saved_user_is_read_again(self):
+        self.profile()
+        self.user.first_name = 'Fatou'
+        self.user.save()
+        response, reads = self.profile()
+        self.assertEqual((response.data['first_name'], len(reads)), ('Fatou', 1))
+
+    def test_deactivated_user_is_refused(self):
+        self.profile()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.profile()[0].status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_zero_ttl_disables_the_cache(self):
+        self.profile()
+        self.assertEqual(len(self.profile()[1]), 1)
+
+
+class BlacklistFilterTests(TestCase):
+    """Refresh tokens révoqués refusés, même quand la révocation vient d'un autre processus"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='caisse@fadjma.sn', password=PASSWORD)
+        self.client = APIClient()
+        # Filtre neuf, construit dans le fil du test (les threads ne voient pas sa transaction)
+        self.filter = blacklist.BlacklistFilter()
+        patches = [
+            mock.patch.object(blacklist, 'blacklist_filter', self.filter),
+            mock.patch.object(self.filter, 'rebuild_in_background', return_value=False),
+            mock.patch.object(self.filter, 'sync_in_background', return_value=False),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/refresh/', {'refresh': str(token)}, format='json')
+
+    def revoke_elsewhere(self, token):
+        """Comme un autre processus: ligne BlacklistedToken sans passer par ce filtre"""
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+
+    def test_token_revoked_by_another_process_is_rejected_after_sync(self):
+        token = RefreshToken.for_user(self.user)
+        self.filter._rebuild()
+        self.revoke_elsewhere(token)
+        self.assertTrue(self.filter._sync())
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_absent_token_is_answered_by_the_filter(self):
+        self.filter._rebuild()
+        token = RefreshToken.for_user(self.user)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.filter.might_contain(token['jti']))
+
+    @override_settings(BLACKLIST_FILTER_SYNC_SECONDS=0)
+    def test_sync_is_scheduled_in_the_background(self):
+        self.filter._rebuild()
+        with self.assertNumQueries(0):
+            self.filter.might_contain('absent')
+        self.filter.sync_in_background.assert_called_once_with()
+        self.filter.rebuild_in_background.assert_not_called()
+
+    def test_rotated_token_cannot_be_reused(self):
+        token = RefreshToken.for_user(self.user)
+        self.filter._rebuild()
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], str(token))
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_checks_go_to_the_database_before_the_first_build(self):
+        token = RefreshToken.for_user(self.user)
+        self.revoke_elsewhere(token)
+        self.assertTrue(self.filter.might_contain(token['jti']))
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+class LoginThrottleTests(TestCase):
+    """Seaux à jetons de la connexion: par IP d'abord, puis par compte"""
+
+    def setUp(self):
+        caches['throttle'].clear()
+        self.user = User.objects.create_user(email='victime@fadjma.sn', password=PASSWORD)
+        self.client = APIClient()
+
+    def login(self, email, password='mauvais', ip='10.0.0.1', **headers):
+        return self.client.post(
+            '/api/auth/login/', {'email': email, 'password': password}, format='json', REMOTE_ADDR=ip, **headers
+        )
+
+    @throttle_rates(login_ip='3/min')
+    def test_forwarded_for_is_ignored_without_trusted_proxy(self):
+        for attempt in range(3):
+            response = self.login(f'inconnu{attempt}@fadjma.sn', HTTP_X_FORWARDED_FOR=f'192.0.2.{attempt}')
+            self.assertEqual(response.status_code, 401)
+        response = self.login('inconnu9@fadjma.sn', HTTP_X_FORWARDED_FOR='192.0.2.99')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @throttle_rates(login_account='2/min')
+    def test_account_bucket_spans_addresses(self):
+        for attempt in range(2):
+            self.assertEqual(self.login(self.user.email, ip=f'10.0.0.{attempt + 1}').status_code, 401)
+        self.assertEqual(self.login(self.user.email, ip='10.0.0.50').status_code, 429)
+
+    @throttle_rates(login_ip='1/min', login_account='2/min')
+    def test_refused_address_does_not_drain_the_account(self):
+        self.assertEqual(self.login(self.user.email, ip='203.0.113.7').status_code, 401)
+        for _ in range(3):
+            self.assertEqual(self.login(self.user.email, ip='203.0.113.7').status_code, 429)
+        # Le compte garde un jeton pour son propriétaire
+        response = self.login(self.user.email, password=PASSWORD, ip='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,108 @@
+"""
+Limitation de débit des routes d'authentification par seaux à jetons.
+
+Chaque clé (adresse IP, compte) dispose d'un seau de N jetons qui se remplit
+au rythme du taux configuré (REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], format
+DRF « 5/min »): les rafales courtes passent, un débit soutenu est plafonné.
+
+Les seaux vivent dans le cache 'throttle' (LocMem par défaut: partagé par les
+threads d'un processus). Le contrôle a lieu dans APIView.initial(), avant la
+validation du serializer: une requête refusée ne coûte ni hachage de mot de
+passe ni requête en base.
+
+Les seaux sont consultés dans l'ordre de throttle_classes et une requête
+refusée par l'un ne consomme pas les suivants: placé avant le seau par compte,
+le seau par IP empêche une seule adresse de bloquer le compte d'un autre.
+"""
+import threading
+import time
+
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """'5/min' -> (5, 60); None -> (0, 1): pas de limite"""
+    if rate is None:
+        return 0, 1
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Seau à jetons générique; les sous-classes définissent scope et get_key()"""
+    scope = None
+    cache_alias = 'throttle'
+
+    def __init__(self):
+        self.capacity, duration = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(self.scope))
+        self.refill = self.capacity / duration if self.capacity else 0
+        self.wait_seconds = 0
+
+    def get_key(self, request, view):
+        raise NotImplementedError('get_key() doit être défini')
+
+    def allow_request(self, request, view):
+        if not self.capacity:
+            return True
+        if getattr(request, '_token_bucket_refused', False):
+            # Déjà refusée par un seau précédent: la réponse sera 429 sans entamer celui-ci
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        cache = caches[self.cache_alias]
+        cache_key = f'throttle:{self.scope}:{key}'
+        now = time.time()
+        with _lock:
+            tokens, updated = cache.get(cache_key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Conservé le temps de se remplir entièrement
+            cache.set(cache_key, (tokens, now), int(self.capacity / self.refill) + 1)
+        self.wait_seconds = 0 if allowed else (1 - tokens) / self.refill
+        if not allowed:
+            request._token_bucket_refused = True
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    """
+    Seau par adresse IP cliente: REMOTE_ADDR, ou X-Forwarded-For derrière
+    REST_FRAMEWORK['NUM_PROXIES'] mandataires de confiance (settings.NUM_PROXIES)
+    """
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class AccountThrottle(TokenBucketThrottle):
+    """Seau par compte visé (email du corps de requête), quelle que soit l'IP"""
+
+    def get_key(self, request, view):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not email:
+            return None
+        return str(email).strip().lower()
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginAccountThrottle(AccountThrottle):
+    scope = 'login_account'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'